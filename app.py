@@ -11,7 +11,12 @@ import os
 from werkzeug.security import generate_password_hash # For default admin setup
 
 from config import config # Import the config dictionary
+from cli import register_commands
 from models.db_pool import db_manager, DatabaseManager # Import db_manager instance and class
+from models.query_stats import init_query_instrumentation
+from utils.metrics import init_metrics
+from utils.profiler import init_profiler
+from utils.server_timing import init_server_timing
 # Import route blueprints (ensure these files exist and define blueprints correctly)
 from routes.auth import auth_bp # Assuming you have an auth blueprint
 from routes.students import students_bp
@@ -20,8 +25,11 @@ from routes.academic_years import academic_years_bp
 from routes.fees import fees_bp
 from routes.tc import tc_bp
 from routes.reports import reports_bp
+from routes.monitoring import monitoring_bp
 from utils.template_filters import format_datetime_filter, format_currency_filter, nl2br_filter # Import filters
 from utils.caching import init_app_cache # If you implement a more robust cache init
+from utils.http_caching import init_http_caching, conditional
+from utils.template_cache import FragmentCacheExtension, init_template_cache, warm_templates
 
 def create_app(config_name=None, init_db=True):
     """Application factory pattern."""
@@ -38,8 +46,9 @@ def create_app(config_name=None, init_db=True):
     # Initialize database manager with the app
     # The db_manager instance itself doesn't need init with app, 
     # but its methods like init_db_schema need app context.
-    # Connections are handled per-request using Flask's 'g'.
-    app.teardown_appcontext(db_manager.close_db) # Close DB connection at end of request/app_context
+    # Each request/app context checks out a pooled read-only connection (kept on Flask's 'g');
+    # writes go through the process's single writer connection (see models/db_pool.py).
+    app.teardown_appcontext(db_manager.close_db) # Return the read connection at end of request/app_context
 
     # Initialize database schema if it's the first run or DB doesn't exist
     # This check is performed within the app context during creation.
@@ -58,11 +67,18 @@ def create_app(config_name=None, init_db=True):
                     app.logger.error(f"Failed to initialize database or setup admin: {e}", exc_info=True)
             else:
                 app.logger.info(f"Database found at {app.config['DATABASE_PATH']}.")
+                db_manager.migrate(app) # Bring older databases up to the current schema
                 _setup_default_admin_if_needed(app) # Check admin even if DB exists
 
     # Initialize caching if you have a sophisticated cache manager
     if 'init_app_cache' in globals():
         init_app_cache(app)
+    init_http_caching(app) # ETag salt for conditional GETs
+    init_server_timing(app) # Server-Timing header (db, cache, templates, total); first so 'total' covers the other hooks
+    init_query_instrumentation(app) # Per-request query count / DB time logging
+    init_metrics(app) # Request latency metrics, exported at /metrics
+    init_profiler(app) # Opt-in sampling profiler, profiles listed at /monitoring/profiles
+
 
     # Register blueprints
     app.register_blueprint(auth_bp, url_prefix='/auth') # Example for auth
@@ -72,11 +88,15 @@ def create_app(config_name=None, init_db=True):
     app.register_blueprint(fees_bp, url_prefix='/fees')
     app.register_blueprint(tc_bp, url_prefix='/tc')
     app.register_blueprint(reports_bp, url_prefix='/reports')
+    app.register_blueprint(monitoring_bp) # Serves /metrics
+    register_commands(app) # flask tc-bench, ...
 
     # Register custom template filters
     app.jinja_env.filters['datetime'] = format_datetime_filter
     app.jinja_env.filters['currency'] = format_currency_filter
     app.jinja_env.filters['nl2br'] = nl2br_filter
+    app.jinja_env.add_extension(FragmentCacheExtension) # {% cache %} ... {% endcache %} blocks
+    init_template_cache(app) # On-disk bytecode cache for compiled templates
     
     # --- Favicon Route ---
     # Serve the favicon to prevent 404 errors in browser logs
@@ -87,6 +107,7 @@ def create_app(config_name=None, init_db=True):
 
     # --- Base Routes ---
     @app.route('/')
+    @conditional('students', 'courses', 'academic_years', 'transfer_certificates')
     def index():
         if session.get('admin_logged_in'):
             # Fetch dashboard stats if user is logged in
@@ -169,6 +190,10 @@ def create_app(config_name=None, init_db=True):
             current_year=datetime.now().year
         )
 
+    # Precompile templates now (after filters/extensions are registered) so first requests are fast
+    if app.config.get('TEMPLATE_WARMUP_ON_STARTUP'):
+        warm_templates(app)
+
     return app
 
 def _setup_default_admin_if_needed(app_instance):
@@ -0,0 +1,20 @@
+# asgi.py
+"""
+ASGI entry point: the app behind utils/asgi_bridge.AsgiBridge, for an ASGI server.
+
+    gunicorn -k uvicorn.workers.UvicornWorker --workers 4 --bind 0.0.0.0:5001 asgi:app
+    uvicorn asgi:app --host 0.0.0.0 --port 5001 # Single process, e.g. development
+
+Keep-alive connections and slow downloads then wait on the event loop instead of
+holding a worker; wsgi.py remains the entry point for plain gunicorn sync workers.
+uvicorn is not in requirements.txt: install it where this mode is used.
+
+Prefer gunicorn's process management to `uvicorn --workers`: with the latter every
+response took ~40 ms longer in benchmarks/concurrency.py (headers and body leave in
+separate TCP writes, and the Nagle delay was not disabled on the shared socket).
+"""
+
+from app import create_app
+from utils.asgi_bridge import AsgiBridge
+
+app = AsgiBridge(create_app())
@@ -0,0 +1,184 @@
+# benchmarks/concurrency.py
+"""
+Connection concurrency: gunicorn sync workers (wsgi.py) against the ASGI mode (asgi.py
+under gunicorn's uvicorn workers).
+
+At each of --levels, that many clients download the admission register CSV while
+reading it at --read-kbps (a clerk on a slow link, an abandoned browser tab), and
+--api-clients clerks call the JSON APIs (next admission number preview, typeahead, the
+dashboard chart data) back to back. For every server and level it reports the API
+throughput and latency, API requests that failed or timed out, and finished downloads.
+
+With sync workers each slow download holds a worker until the client has read it all,
+so API latency climbs once downloads outnumber workers; in ASGI mode a download only
+takes a thread while the next chunk is produced.
+
+Usage:
+    python -m benchmarks.concurrency --db benchmarks/data/bench_50k.db --workers 4 --levels 0,4,16,64
+    python -m benchmarks.concurrency --db benchmarks/data/bench_50k.db --servers asgi --levels 0,64,256 --output asgi.json
+
+Needs gunicorn and uvicorn installed (see asgi.py).
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import shutil
+import tempfile
+import time
+
+from benchmarks.loadtest import Dataset, HttpError, HttpSession, Results, _run_operation, spawn_server
+from utils.metrics import percentile
+
+API_MIX = {'next_admission_no': 40, 'typeahead': 40, 'student_distribution': 20}
+CHUNK_BYTES = 16 * 1024
+
+
+async def _slow_download(args, cookies, path):
+    """One download on its own connection, read at args.read_kbps; returns True if it completed with 200."""
+    reader, writer = await asyncio.open_connection(args.host, args.port)
+    try:
+        request = (f"GET {path} HTTP/1.1\r\nHost: {args.host}:{args.port}\r\nConnection: close\r\n"
+                   f"Cookie: {'; '.join(f'{k}={v}' for k, v in cookies.items())}\r\n\r\n")
+        writer.write(request.encode('latin-1'))
+        await writer.drain()
+        status_line = await reader.readline()
+        ok = status_line.split(b' ')[1:2] == [b'200']
+        pause = CHUNK_BYTES / (args.read_kbps * 1024)
+        while await reader.read(CHUNK_BYTES):
+            await asyncio.sleep(pause)
+        return ok
+    finally:
+        writer.close()
+
+
+async def _downloader(args, cookies, path, deadline, finished):
+    while time.monotonic() < deadline:
+        try:
+            if await _slow_download(args, cookies, path):
+                finished.append(1)
+        except (ConnectionError, OSError):
+            await asyncio.sleep(0.1)
+
+
+async def _api_clerk(clerk_id, args, dataset, results, deadline):
+    rng = random.Random(args.seed + clerk_id)
+    operations, weights = zip(*API_MIX.items())
+    session = HttpSession(args.host, args.port)
+    try:
+        await asyncio.wait_for(session.login(args.username, args.password), args.timeout)
+    except (HttpError, ConnectionError, OSError, asyncio.TimeoutError) as e:
+        results.record('login', 0.0, error=type(e).__name__) # e.g. every sync worker busy with a download
+        await session.close()
+        return
+    while time.monotonic() < deadline:
+        operation = rng.choices(operations, weights)[0]
+        started = time.perf_counter()
+        try:
+            error = await asyncio.wait_for(_run_operation(session, operation, dataset, rng, None), args.timeout)
+        except asyncio.TimeoutError:
+            error = 'timeout'
+            await session.close() # The response may still arrive; start over on a new connection
+        except (ConnectionError, OSError, asyncio.IncompleteReadError, ValueError) as e:
+            error = f"connection_{type(e).__name__}"
+        results.record(operation, (time.perf_counter() - started) * 1000, error)
+    await session.close()
+
+
+async def run_level(args, dataset, slow_clients):
+    """API latency with slow_clients downloads in flight; returns a report row."""
+    session = HttpSession(args.host, args.port)
+    await session.login(args.username, args.password)
+    await session.close()
+    path = f"/reports/admission-register/download-csv?academic_year_id={dataset.academic_year_id}"
+    if args.full_register:
+        path = "/reports/admission-register/download-csv"
+
+    results, finished = Results(), []
+    deadline = time.monotonic() + args.duration
+    downloaders = [asyncio.ensure_future(_downloader(args, session.cookies, path, deadline, finished))
+                   for _ in range(slow_clients)]
+    await asyncio.sleep(min(1.0, args.duration / 4)) # Let the downloads take their workers first
+    started = time.monotonic()
+    await asyncio.gather(*(_api_clerk(i, args, dataset, results, deadline) for i in range(args.api_clients)))
+    elapsed = time.monotonic() - started
+    for task in downloaders:
+        task.cancel()
+    await asyncio.gather(*downloaders, return_exceptions=True)
+
+    latencies = [ms for operation, values in results.latencies.items() if operation != 'login' for ms in values]
+    errors = {}
+    for per_op in results.errors.values():
+        for name, count in per_op.items():
+            errors[name] = errors.get(name, 0) + count
+    return {
+        'slow_clients': slow_clients,
+        'api_requests': len(latencies),
+        'api_throughput_rps': round(len(latencies) / elapsed, 2) if elapsed else 0,
+        'p50_ms': round(percentile(latencies, 50), 1) if latencies else None,
+        'p95_ms': round(percentile(latencies, 95), 1) if latencies else None,
+        'p99_ms': round(percentile(latencies, 99), 1) if latencies else None,
+        'api_errors': errors,
+        'downloads_finished': len(finished),
+    }
+
+
+def print_report(report):
+    print(f"\n{'server':<6} {'slow':>5} {'api reqs':>9} {'rps':>8} {'p50':>9} {'p95':>9} {'p99':>9} {'downloads':>10}  errors")
+    for server, rows in report['servers'].items():
+        for row in rows:
+            latency = [f"{row[key]}ms" if row[key] is not None else '-' for key in ('p50_ms', 'p95_ms', 'p99_ms')]
+            errors = ", ".join(f"{name}={count}" for name, count in row['api_errors'].items())
+            print(f"{server:<6} {row['slow_clients']:>5} {row['api_requests']:>9} {row['api_throughput_rps']:>8} "
+                  f"{latency[0]:>9} {latency[1]:>9} {latency[2]:>9} {row['downloads_finished']:>10}  {errors}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare connection concurrency of the sync and ASGI deployments.")
+    parser.add_argument('--db', required=True, help="Seeded database (benchmarks.generate_data); each server gets a copy.")
+    parser.add_argument('--servers', default='sync,asgi', help="Comma-separated: sync (gunicorn sync workers), asgi (uvicorn workers + asgi.py).")
+    parser.add_argument('--levels', default='0,4,16,64', help="Comma-separated numbers of slow downloads in flight.")
+    parser.add_argument('--workers', type=int, default=4, help="Worker processes for both servers.")
+    parser.add_argument('--threads', type=int, help="gunicorn --threads / ASGI_THREADS (defaults: 1 / config).")
+    parser.add_argument('--api-clients', type=int, default=8, help="Clerks calling the JSON APIs.")
+    parser.add_argument('--duration', type=float, default=20, help="Seconds per level.")
+    parser.add_argument('--read-kbps', type=float, default=64, help="Read rate of each slow download.")
+    parser.add_argument('--full-register', action='store_true', help="Download the whole register instead of one year.")
+    parser.add_argument('--timeout', type=float, default=10, help="Seconds before an API request counts as timed out.")
+    parser.add_argument('--port', type=int, default=5091)
+    parser.add_argument('--username', default='admin')
+    parser.add_argument('--password', default='admin123ChangeMe')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--output', help="Also write the report as JSON to this path.")
+    args = parser.parse_args()
+    args.host = '127.0.0.1'
+    levels = [int(level) for level in args.levels.split(',')]
+
+    dataset = Dataset(args.db)
+    report = {'servers': {}, 'config': {key: getattr(args, key) for key in (
+        'levels', 'workers', 'threads', 'api_clients', 'duration', 'read_kbps', 'full_register', 'timeout')}}
+    for server in args.servers.split(','):
+        args.server = server
+        workdir = tempfile.mkdtemp(prefix='satcms_concurrency_')
+        db_copy = f"{workdir}/concurrency.db"
+        shutil.copyfile(args.db, db_copy)
+        process = spawn_server(args, db_copy)
+        try:
+            rows = report['servers'][server] = []
+            for slow_clients in levels:
+                print(f"{server}: {slow_clients} slow downloads, {args.api_clients} API clerks for {args.duration}s")
+                rows.append(asyncio.run(run_level(args, dataset, slow_clients)))
+        finally:
+            process.terminate()
+            process.wait(timeout=30)
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    print_report(report)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
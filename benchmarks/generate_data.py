@@ -0,0 +1,232 @@
+# benchmarks/generate_data.py
+"""
+Synthetic dataset generator for benchmarks and load tests.
+
+Creates a fresh SQLite database from db/schema.sql and db/migrations, and fills courses, academic years,
+fee structures, students, fee payments and transfer certificates with realistic,
+constraint-valid data. Output is deterministic for a given scale and seed.
+
+Usage:
+    python -m benchmarks.generate_data --scale 50k --output benchmarks/data/bench_50k.db
+"""
+
+import argparse
+import math
+import os
+import random
+import sqlite3
+import sys
+import time
+from datetime import date, timedelta
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+
+SCALES = {'1k': 1_000, '50k': 50_000, '500k': 500_000}
+BATCH_SIZE = 5_000
+
+FIRST_YEAR = 2012 # Starting year of the oldest academic year
+NUM_ACADEMIC_YEARS = 12
+STANDARD_SLOT_SIZE = 900 # Max students per course and year for 2-char codes (serial limit is 999)
+SPECIAL_SLOT_SIZE = 90 # Max students per course and year for 3-char codes (serial limit is 99)
+NUM_SPECIAL_COURSES = 2
+TC_RATIO = 0.12 # Share of students in finished batches who have left with a TC
+
+MALE_NAMES = ['Ravi', 'Suresh', 'Ramesh', 'Mahesh', 'Venkata', 'Srinivas', 'Kiran', 'Arjun', 'Rahul', 'Sai',
+              'Praveen', 'Naveen', 'Harsha', 'Vamsi', 'Karthik', 'Anil', 'Sunil', 'Rajesh', 'Ganesh', 'Mohan',
+              'Abdul', 'Imran', 'John', 'David', 'Prakash', 'Vijay', 'Ajay', 'Teja', 'Charan', 'Manoj']
+FEMALE_NAMES = ['Lakshmi', 'Priya', 'Divya', 'Sravani', 'Anusha', 'Keerthi', 'Swathi', 'Bhavana', 'Sneha', 'Kavya',
+                'Harika', 'Madhuri', 'Pooja', 'Ramya', 'Sowmya', 'Deepika', 'Ayesha', 'Fathima', 'Mary', 'Sandhya',
+                'Meghana', 'Navya', 'Sirisha', 'Tejaswi', 'Yamini', 'Pavani', 'Haritha', 'Jyothi', 'Revathi', 'Usha']
+SURNAMES = ['Reddy', 'Naidu', 'Rao', 'Sharma', 'Chowdary', 'Varma', 'Goud', 'Yadav', 'Shaik', 'Kumar',
+            'Raju', 'Setty', 'Pillai', 'Iyer', 'Murthy', 'Prasad', 'Babu', 'Khan', 'Thomas', 'Gupta']
+TOWNS = ['Tirupati', 'Chittoor', 'Nellore', 'Kadapa', 'Kurnool', 'Anantapur', 'Guntur', 'Vijayawada', 'Ongole', 'Madanapalle']
+RELIGIONS = ['Hindu', 'Hindu', 'Hindu', 'Muslim', 'Christian']
+CASTES = ['OC', 'BC-A', 'BC-B', 'BC-D', 'SC', 'ST']
+MOTHER_TONGUES = ['Telugu', 'Telugu', 'Telugu', 'Tamil', 'Urdu', 'Kannada']
+PAYMENT_METHODS = ['Cash', 'Online', 'Cheque', 'DD', 'Card', 'UPI', 'Bank Transfer']
+SUBJECTS = [('Commerce', 'BCOM'), ('Computer Science', 'BSC'), ('Mathematics', 'BSC'), ('Physics', 'BSC'),
+            ('Chemistry', 'BSC'), ('Economics', 'BA'), ('History', 'BA'), ('English', 'BA'),
+            ('Business Administration', 'BBA'), ('Computer Applications', 'BCA')]
+
+
+def _course_codes(rng, count, length):
+    letters = 'ABCDEFGHIJKLMNOPQRSTUVWXYZ'
+    codes = set()
+    while len(codes) < count:
+        codes.add(''.join(rng.choice(letters) for _ in range(length)))
+    return sorted(codes)
+
+
+def _random_date(rng, start: date, end: date) -> date:
+    return start + timedelta(days=rng.randint(0, max((end - start).days, 0)))
+
+
+def create_database(path: str):
+    """Creates an empty database with the application schema and all migrations applied."""
+    from models.migrations import upgrade
+    if os.path.exists(path):
+        os.remove(path)
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    db = sqlite3.connect(path)
+    with open(os.path.join(PROJECT_ROOT, 'db', 'schema.sql'), 'r', encoding='utf-8') as f:
+        db.executescript(f.read())
+    db.commit()
+    upgrade(path, log=lambda message: None)
+    return db
+
+
+def generate(path: str, num_students: int, seed: int = 42) -> dict:
+    """Fills a new database at `path` with `num_students` students and related rows. Returns row counts."""
+    rng = random.Random(seed)
+    db = create_database(path)
+    db.execute('PRAGMA foreign_keys = ON')
+    # Bulk-load settings: the file is disposable until generation finishes.
+    db.execute('PRAGMA synchronous = OFF')
+    db.execute('PRAGMA journal_mode = MEMORY')
+
+    # Academic years: one per starting year so admission numbers (YYYY + code + serial) stay unique.
+    academic_years = []
+    for offset in range(NUM_ACADEMIC_YEARS):
+        start = FIRST_YEAR + offset
+        duration = 3 if offset % 4 else 2
+        cursor = db.execute("INSERT INTO academic_years (academic_year) VALUES (?)", (f"{start}-{start + duration}",))
+        academic_years.append((cursor.lastrowid, start, start + duration))
+
+    # Courses: enough standard courses to fit everyone, plus a few special-format (3-char code) ones.
+    special_capacity = NUM_SPECIAL_COURSES * NUM_ACADEMIC_YEARS * SPECIAL_SLOT_SIZE
+    standard_needed = max(num_students - special_capacity, 0)
+    num_standard = max(4, math.ceil(standard_needed / (NUM_ACADEMIC_YEARS * STANDARD_SLOT_SIZE)))
+    courses = [] # (id, is_special)
+    for code in _course_codes(rng, num_standard, 2):
+        subject, degree = rng.choice(SUBJECTS)
+        cursor = db.execute(
+            "INSERT INTO courses (course_name, course_full_name, course_code, type, year, is_special_format) VALUES (?, ?, ?, ?, ?, 0)",
+            (f"{degree} {subject} {code}", f"Bachelor of {subject} ({code})", code, rng.choice(['PA', 'R', 'SF', 'SS']), 2020))
+        courses.append((cursor.lastrowid, code, False))
+    for code in _course_codes(rng, NUM_SPECIAL_COURSES, 3):
+        subject, degree = rng.choice(SUBJECTS)
+        cursor = db.execute(
+            "INSERT INTO courses (course_name, course_full_name, course_code, type, year, is_special_format) VALUES (?, ?, ?, ?, ?, 1)",
+            (f"{degree} {subject} {code}", f"Bachelor of {subject} ({code})", code, 'SF', 2020))
+        courses.append((cursor.lastrowid, code, True))
+
+    # Fee structure for every course and year.
+    fee_structures = {}
+    for course_id, _code, is_special in courses:
+        for ay_id, _start, _end in academic_years:
+            total_fee = rng.randrange(15_000, 90_000, 500) * (2 if is_special else 1)
+            cursor = db.execute("INSERT INTO fee_structure (course_id, academic_year_id, total_fee) VALUES (?, ?, ?)",
+                                (course_id, ay_id, total_fee))
+            fee_structures[(course_id, ay_id)] = (cursor.lastrowid, total_fee)
+
+    # Spread students over (course, year) slots; the most recent year is left half empty for imports.
+    slots = [(course, ay) for course in courses for ay in academic_years]
+    capacities = [(SPECIAL_SLOT_SIZE if course[2] else STANDARD_SLOT_SIZE) // (2 if ay == academic_years[-1] else 1)
+                  for course, ay in slots]
+    total_capacity = sum(capacities)
+    if num_students > total_capacity:
+        raise ValueError(f"Cannot fit {num_students} students into {total_capacity} admission serials.")
+    fill_ratio = num_students / total_capacity
+    per_slot = [int(capacity * fill_ratio) for capacity in capacities]
+    for i in range(num_students - sum(per_slot)):
+        per_slot[i % len(per_slot)] += 1 # Hand out the remainder
+
+    today = date.today()
+    student_rows, payment_rows, tc_rows = [], [], []
+    counts = {'students': 0, 'student_fee_payments': 0, 'transfer_certificates': 0}
+    next_student_id = 1
+    tc_serials = {}
+
+    def flush():
+        db.executemany(
+            """INSERT INTO students (id, course_id, academic_year_id, is_manual_admission_no, admission_no, serial_no, type,
+                   student_name, surname, father_name, mother_name, gender, address1, address2, town, state, dob, age,
+                   phone_no, email, nationality, religion, caste, mother_tongue, previous_college, date_of_admission,
+                   date_of_leaving, aadhar_no, fee_structure_id, starting_year, ending_year, conduct)
+               VALUES (?, ?, ?, 0, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)""",
+            student_rows)
+        db.executemany(
+            """INSERT INTO student_fee_payments (student_id, fee_structure_id, amount_paid, payment_date, transaction_id, payment_method)
+               VALUES (?, ?, ?, ?, ?, ?)""", payment_rows)
+        db.executemany(
+            "INSERT INTO transfer_certificates (student_id, issue_date, tc_number, promotion_status) VALUES (?, ?, ?, ?)",
+            tc_rows)
+        counts['students'] += len(student_rows)
+        counts['student_fee_payments'] += len(payment_rows)
+        counts['transfer_certificates'] += len(tc_rows)
+        student_rows.clear(); payment_rows.clear(); tc_rows.clear()
+
+    for ((course_id, code, is_special), (ay_id, start_year, end_year)), slot_count in zip(slots, per_slot):
+        fee_structure_id, total_fee = fee_structures[(course_id, ay_id)]
+        for serial in range(1, slot_count + 1):
+            student_id = next_student_id
+            next_student_id += 1
+            gender = rng.choice(['Male', 'Female'])
+            name = rng.choice(MALE_NAMES if gender == 'Male' else FEMALE_NAMES)
+            surname = rng.choice(SURNAMES)
+            admitted = _random_date(rng, date(start_year, 6, 1), date(start_year, 8, 31))
+            dob = _random_date(rng, date(start_year - 21, 1, 1), date(start_year - 17, 12, 31))
+            age = admitted.year - dob.year - ((admitted.month, admitted.day) < (dob.month, dob.day))
+            admission_no = f"{start_year}{code}{serial:02d}" if is_special else f"{start_year}{code}{serial:03d}"
+
+            left = None
+            if date(end_year, 4, 30) < today and rng.random() < TC_RATIO:
+                left = _random_date(rng, date(end_year, 3, 1), date(end_year, 5, 31))
+                tc_serials[left.year] = tc_serials.get(left.year, 0) + 1
+                tc_rows.append((student_id, left.isoformat(), f"TC/{left.year}/{tc_serials[left.year]:04d}", 'Promoted'))
+
+            student_rows.append((
+                student_id, course_id, ay_id, admission_no, serial, rng.choice(['New Admission'] * 9 + ['Readmission']),
+                name, surname, f"{rng.choice(MALE_NAMES)} {surname}", f"{rng.choice(FEMALE_NAMES)} {surname}", gender,
+                f"{rng.randint(1, 999)}-{rng.randint(1, 99)}, Main Road", 'Near Bus Stand', rng.choice(TOWNS), 'Andhra Pradesh',
+                dob.isoformat(), age, f"9{rng.randint(100000000, 999999999)}",
+                f"{name.lower()}.{surname.lower()}{student_id}@example.com", 'Indian', rng.choice(RELIGIONS),
+                rng.choice(CASTES), rng.choice(MOTHER_TONGUES), 'Govt Junior College', admitted.isoformat(),
+                left.isoformat() if left else None, f"{rng.randint(10**11, 10**12 - 1)}", fee_structure_id,
+                start_year, end_year, 'Good'))
+
+            # 0-3 instalments, never more than the total fee.
+            remaining = total_fee
+            paid_on = admitted
+            for instalment in range(rng.choice([0, 1, 1, 2, 2, 3])):
+                amount = remaining if instalment == 2 else round(remaining * rng.uniform(0.3, 0.7), -2)
+                if amount <= 0:
+                    break
+                remaining -= amount
+                paid_on = min(paid_on + timedelta(days=rng.randint(0, 120)), today)
+                method = rng.choice(PAYMENT_METHODS)
+                transaction_id = None if method == 'Cash' else f"TXN{student_id:07d}{instalment}"
+                payment_rows.append((student_id, fee_structure_id, amount, paid_on.isoformat(), transaction_id, method))
+
+            if len(student_rows) >= BATCH_SIZE:
+                flush()
+    flush()
+    db.commit()
+    db.execute('PRAGMA journal_mode = DELETE')
+    db.execute('ANALYZE')
+    db.close()
+
+    counts.update(courses=len(courses), academic_years=len(academic_years), fee_structure=len(fee_structures))
+    return counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate a synthetic SATCMS database for benchmarks.")
+    parser.add_argument('--scale', default='1k', help=f"One of {', '.join(SCALES)} or a student count.")
+    parser.add_argument('--output', help="Database path (default: benchmarks/data/bench_<scale>.db).")
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    num_students = SCALES.get(args.scale) or int(args.scale)
+    output = args.output or os.path.join(PROJECT_ROOT, 'benchmarks', 'data', f"bench_{args.scale}.db")
+    started = time.perf_counter()
+    counts = generate(output, num_students, seed=args.seed)
+    print(f"Generated {output} in {time.perf_counter() - started:.1f}s:")
+    for table, count in counts.items():
+        print(f"  {table:<24} {count:>9,}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,86 @@
+# benchmarks/import_budget.py
+"""
+Import-time budget check for worker boot and `flask` CLI start-up.
+
+Imports the app module in fresh interpreters with `python -X importtime`, and fails
+(exit code 1) when:
+- the median cumulative import time is over the budget, or
+- a document library (python-docx, docx2pdf, num2words, pywin32) was imported. Those
+  are loaded on first TC/report generation (utils/pdf_utils.py), so a worker or a CLI
+  command must start on machines without the Office stack.
+
+Usage:
+    python -m benchmarks.import_budget
+    python -m benchmarks.import_budget --budget-ms 400 --runs 5 --top 20
+"""
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+DEFAULT_BUDGET_MS = 1000
+DEFAULT_RUNS = 3
+# Top-level packages that must not be imported at start-up
+DEFERRED_PACKAGES = ('docx', 'docx2pdf', 'num2words', 'pythoncom', 'pywintypes', 'win32com', 'utils.pdf_utils')
+
+
+def measure_imports(module):
+    """
+    Imports module in a fresh interpreter; returns {module name: (self us, cumulative us)}
+    from the -X importtime report (first occurrence of each module only).
+    """
+    completed = subprocess.run([sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+                               cwd=PROJECT_ROOT, capture_output=True, text=True)
+    if completed.returncode != 0:
+        raise RuntimeError(f"import {module} failed:\n{completed.stderr[-2000:]}")
+    timings = {}
+    for line in completed.stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        timings.setdefault(name.strip(), (int(self_us), int(cumulative_us)))
+    return timings
+
+
+def _is_deferred(name):
+    return any(name == package or name.startswith(package + '.') for package in DEFERRED_PACKAGES)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check the import time of the app against a budget.")
+    parser.add_argument('--module', default='app', help="Module to import (default: app).")
+    parser.add_argument('--budget-ms', type=float, default=DEFAULT_BUDGET_MS)
+    parser.add_argument('--runs', type=int, default=DEFAULT_RUNS, help="Fresh interpreters to time; the median is used.")
+    parser.add_argument('--top', type=int, default=15, help="Slowest modules (by self time) to list.")
+    args = parser.parse_args()
+
+    runs = [measure_imports(args.module) for _ in range(args.runs)]
+    totals_ms = [timings[args.module][1] / 1000 for timings in runs]
+    median_ms = statistics.median(totals_ms)
+    last = runs[-1]
+
+    print(f"import {args.module}: median {median_ms:.1f}ms over {args.runs} runs "
+          f"({', '.join(f'{t:.1f}' for t in totals_ms)}), budget {args.budget_ms:.0f}ms, {len(last)} modules")
+    print(f"\n{'self ms':>9} {'cumul. ms':>10}  module")
+    for name, (self_us, cumulative_us) in sorted(last.items(), key=lambda item: item[1][0], reverse=True)[:args.top]:
+        print(f"{self_us / 1000:>9.1f} {cumulative_us / 1000:>10.1f}  {name}")
+
+    failures = []
+    deferred = sorted(name for name in last if _is_deferred(name))
+    if deferred:
+        failures.append(f"document libraries imported at start-up: {', '.join(deferred)}")
+    if median_ms > args.budget_ms:
+        failures.append(f"median import time {median_ms:.1f}ms is over the {args.budget_ms:.0f}ms budget")
+    for failure in failures:
+        print(f"\nFAIL: {failure}")
+    if not failures:
+        print("\nOK")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == '__main__':
+    main()
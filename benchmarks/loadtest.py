@@ -0,0 +1,428 @@
+# benchmarks/loadtest.py
+"""
+Admission-day load test.
+
+Simulates many clerks working at once against a running server (normally gunicorn on
+a database from benchmarks/generate_data.py): searching students, previewing and
+assigning admission numbers, adding students and recording fee payments. Uses a small
+built-in asyncio HTTP/1.1 client, so no extra packages are needed.
+
+Reports throughput, p50/p95/p99 latency per operation and the rate of SQLITE_BUSY
+("database is locked") and unique-constraint errors, so write-path regressions show
+up before the admission season.
+
+Usage:
+    # Start gunicorn on a copy of the seeded database and run 40 clerks for 60 seconds
+    python -m benchmarks.loadtest --db benchmarks/data/bench_50k.db --spawn --workers 4 --users 40 --duration 60
+
+    # Or target a server that is already running
+    python -m benchmarks.loadtest --db benchmarks/data/bench_50k.db --url http://127.0.0.1:5001
+
+    # The same load against the ASGI mode (asgi.py under uvicorn) instead of gunicorn sync workers
+    python -m benchmarks.loadtest --db benchmarks/data/bench_50k.db --spawn --server asgi --workers 4 --users 40
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import re
+import shutil
+import socket
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import date
+from urllib.parse import urlencode, urlsplit
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+
+from utils.metrics import percentile # Standard library only; the app itself is not imported
+
+# Operation mix for admission day: {operation: weight}
+DEFAULT_MIX = {
+    'search_students': 30,
+    'next_admission_no': 25,
+    'add_student': 15,
+    'record_payment': 15,
+    'view_student': 10,
+    'dashboard': 5,
+}
+
+CSRF_INPUT_RE = re.compile(r'name="csrf_token"\s+value="([^"]+)"')
+CSRF_META_RE = re.compile(r'<meta name="csrf-token" content="([^"]+)"')
+BUSY_MARKERS = (b'database is locked', b'SQLITE_BUSY', b'database table is locked')
+UNIQUE_MARKERS = (b'UNIQUE constraint failed', b'already exists')
+
+
+class HttpError(Exception):
+    pass
+
+
+class HttpSession:
+    """One clerk's keep-alive HTTP/1.1 connection with a cookie jar."""
+
+    def __init__(self, host, port):
+        self.host, self.port = host, port
+        self.cookies = {}
+        self.csrf_token = None
+        self._reader = self._writer = None
+
+    async def _connect(self):
+        self._reader, self._writer = await asyncio.open_connection(self.host, self.port)
+
+    async def close(self):
+        if self._writer:
+            self._writer.close()
+            try:
+                await self._writer.wait_closed()
+            except (ConnectionError, OSError):
+                pass
+            self._writer = None
+
+    async def request(self, method, path, form=None, headers=None):
+        """Sends one request and returns (status, headers, body). Reconnects once if the server closed the socket."""
+        body = urlencode(form).encode('utf-8') if form is not None else b''
+        lines = [f"{method} {path} HTTP/1.1", f"Host: {self.host}:{self.port}", "Connection: keep-alive",
+                 f"Content-Length: {len(body)}"]
+        if form is not None:
+            lines.append("Content-Type: application/x-www-form-urlencoded")
+        if self.cookies:
+            lines.append("Cookie: " + "; ".join(f"{k}={v}" for k, v in self.cookies.items()))
+        for name, value in (headers or {}).items():
+            lines.append(f"{name}: {value}")
+        payload = ("\r\n".join(lines) + "\r\n\r\n").encode('latin-1') + body
+
+        for attempt in (1, 2):
+            try:
+                if self._writer is None:
+                    await self._connect()
+                self._writer.write(payload)
+                await self._writer.drain()
+                return await self._read_response()
+            except (ConnectionError, asyncio.IncompleteReadError, OSError):
+                await self.close()
+                if attempt == 2:
+                    raise
+
+    async def _read_response(self):
+        status_line = await self._reader.readline()
+        if not status_line:
+            raise ConnectionResetError("Server closed the connection")
+        status = int(status_line.split()[1])
+        headers = {}
+        set_cookies = []
+        while True:
+            line = (await self._reader.readline()).decode('latin-1').rstrip('\r\n')
+            if not line:
+                break
+            name, _, value = line.partition(':')
+            name, value = name.strip().lower(), value.strip()
+            if name == 'set-cookie':
+                set_cookies.append(value)
+            headers[name] = value
+
+        if headers.get('transfer-encoding', '').lower() == 'chunked':
+            body = bytearray()
+            while True:
+                size = int((await self._reader.readline()).split(b';')[0], 16)
+                if size == 0:
+                    await self._reader.readline()
+                    break
+                body += await self._reader.readexactly(size)
+                await self._reader.readline()
+            body = bytes(body)
+        elif 'content-length' in headers:
+            body = await self._reader.readexactly(int(headers['content-length']))
+        else:
+            body = await self._reader.read()
+            await self.close()
+
+        for cookie in set_cookies:
+            name, _, value = cookie.split(';', 1)[0].partition('=')
+            self.cookies[name.strip()] = value.strip()
+        if headers.get('connection', '').lower() == 'close':
+            await self.close()
+        return status, headers, body
+
+    async def login(self, username, password):
+        status, _, body = await self.request('GET', '/auth/login')
+        match = CSRF_INPUT_RE.search(body.decode('utf-8', 'replace'))
+        form = {'username': username, 'password': password}
+        if match:
+            form['csrf_token'] = match.group(1)
+        status, headers, _ = await self.request('POST', '/auth/login', form=form)
+        if status != 302 or '/auth/login' in headers.get('location', ''):
+            raise HttpError(f"Login failed for {username} (status {status})")
+        _, _, body = await self.request('GET', '/')
+        match = CSRF_META_RE.search(body.decode('utf-8', 'replace'))
+        self.csrf_token = match.group(1) if match else None
+
+
+class Dataset:
+    """Ids and names sampled from the seeded database, used to build realistic requests."""
+
+    def __init__(self, db_path):
+        db = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True)
+        self.course_ids = [row[0] for row in db.execute("SELECT id FROM courses WHERE is_special_format = 0")]
+        # New admissions go into the most recent academic year (left half empty by the generator).
+        self.academic_year_id, academic_year = db.execute(
+            "SELECT id, academic_year FROM academic_years ORDER BY academic_year DESC LIMIT 1").fetchone()
+        self.admission_year = int(academic_year.split('-')[0])
+        self.student_ids = [row[0] for row in db.execute(
+            "SELECT id FROM students WHERE fee_structure_id IS NOT NULL ORDER BY RANDOM() LIMIT 5000")]
+        self.name_prefixes = [row[0][:3] for row in db.execute("SELECT DISTINCT student_name FROM students LIMIT 200")]
+        db.close()
+        if not self.student_ids or not self.course_ids:
+            raise SystemExit(f"{db_path} has no students/courses; generate one with benchmarks.generate_data first.")
+
+
+class Results:
+    def __init__(self):
+        self.latencies = {} # {operation: [ms, ...]}
+        self.errors = {} # {operation: {error_class: count}}
+
+    def record(self, operation, elapsed_ms, error=None):
+        self.latencies.setdefault(operation, []).append(elapsed_ms)
+        if error:
+            per_op = self.errors.setdefault(operation, {})
+            per_op[error] = per_op.get(error, 0) + 1
+
+
+def _classify(status, body, ok_statuses):
+    """Returns None for success, otherwise an error class."""
+    if any(marker in body for marker in BUSY_MARKERS):
+        return 'sqlite_busy'
+    if status in ok_statuses:
+        return None
+    if any(marker in body for marker in UNIQUE_MARKERS):
+        return 'unique_violation'
+    if status >= 500:
+        return 'http_5xx'
+    return f'http_{status}'
+
+
+async def _run_operation(session, operation, dataset, rng, counter):
+    if operation == 'search_students':
+        query = urlencode({'search': rng.choice(dataset.name_prefixes)})
+        status, _, body = await session.request('GET', f'/students/list?{query}')
+        return _classify(status, body, (200,))
+    if operation == 'next_admission_no':
+        query = urlencode({'course_id': rng.choice(dataset.course_ids), 'academic_year_id': dataset.academic_year_id})
+        status, _, body = await session.request('GET', f'/students/api/next-admission-no?{query}')
+        return _classify(status, body, (200,))
+    if operation == 'typeahead':
+        query = urlencode({'q': rng.choice(dataset.name_prefixes)})
+        status, _, body = await session.request('GET', f'/students/api/typeahead?{query}')
+        return _classify(status, body, (200,))
+    if operation == 'student_distribution':
+        status, _, body = await session.request('GET', f'/reports/api/student-distribution/{dataset.academic_year_id}')
+        return _classify(status, body, (200,))
+    if operation == 'view_student':
+        status, _, body = await session.request('GET', f'/students/view/{rng.choice(dataset.student_ids)}')
+        return _classify(status, body, (200,))
+    if operation == 'dashboard':
+        status, _, body = await session.request('GET', '/')
+        return _classify(status, body, (200,))
+    if operation == 'add_student':
+        serial = next(counter)
+        form = {
+            'student_name': f"Load{serial}", 'surname': 'Test', 'father_name': f"Father {serial}",
+            'gender': rng.choice(['Male', 'Female']), 'dob': f"15-06-{dataset.admission_year - 18}",
+            'date_of_admission': f"01-07-{dataset.admission_year}", 'course_id': rng.choice(dataset.course_ids),
+            'academic_year_id': dataset.academic_year_id, 'type': 'New Admission', 'nationality': 'Indian',
+        }
+        headers = {'X-Requested-With': 'XMLHttpRequest'}
+        if session.csrf_token:
+            headers['X-CSRFToken'] = session.csrf_token
+        status, _, body = await session.request('POST', '/students/add', form=form, headers=headers)
+        return _classify(status, body, (200,))
+    if operation == 'record_payment':
+        form = {'amount': rng.choice([500, 1000, 2500, 5000]), 'payment_date': date.today().isoformat(),
+                'payment_method': rng.choice(['Cash', 'UPI', 'Online']), 'remarks': 'load test'}
+        if form['payment_method'] != 'Cash':
+            form['transaction_id'] = f"LOAD{os.getpid()}{next(counter)}"
+        if session.csrf_token:
+            form['csrf_token'] = session.csrf_token
+        status, _, body = await session.request('POST', f'/fees/record-payment/{rng.choice(dataset.student_ids)}', form=form)
+        return _classify(status, body, (302,))
+    raise ValueError(f"Unknown operation {operation}")
+
+
+async def _clerk(clerk_id, args, dataset, mix, results, deadline, counter):
+    rng = random.Random(args.seed + clerk_id)
+    await asyncio.sleep(rng.uniform(0, args.ramp_up)) # Clerks arrive gradually
+    session = HttpSession(args.host, args.port)
+    try:
+        await session.login(args.username, args.password)
+    except (HttpError, ConnectionError, OSError) as e:
+        results.record('login', 0.0, error=type(e).__name__)
+        await session.close()
+        return
+
+    operations, weights = zip(*mix.items())
+    while time.monotonic() < deadline:
+        operation = rng.choices(operations, weights)[0]
+        started = time.perf_counter()
+        try:
+            error = await _run_operation(session, operation, dataset, rng, counter)
+        except (ConnectionError, OSError, asyncio.IncompleteReadError, ValueError) as e:
+            error = f"connection_{type(e).__name__}"
+        results.record(operation, (time.perf_counter() - started) * 1000, error)
+        if args.think_time:
+            await asyncio.sleep(rng.expovariate(1 / args.think_time))
+    await session.close()
+
+
+def summarise(results, elapsed):
+    report = {'elapsed_s': round(elapsed, 2), 'operations': {}}
+    total_requests = total_busy = total_unique = total_errors = 0
+    for operation, latencies in sorted(results.latencies.items()):
+        errors = results.errors.get(operation, {})
+        error_count = sum(errors.values())
+        report['operations'][operation] = {
+            'requests': len(latencies),
+            'throughput_rps': round(len(latencies) / elapsed, 2),
+            'p50_ms': round(percentile(latencies, 50), 1),
+            'p95_ms': round(percentile(latencies, 95), 1),
+            'p99_ms': round(percentile(latencies, 99), 1),
+            'error_rate': round(error_count / len(latencies), 4),
+            'errors': errors,
+        }
+        total_requests += len(latencies)
+        total_errors += error_count
+        total_busy += errors.get('sqlite_busy', 0)
+        total_unique += errors.get('unique_violation', 0)
+    report['total'] = {
+        'requests': total_requests,
+        'throughput_rps': round(total_requests / elapsed, 2) if elapsed else 0,
+        'error_rate': round(total_errors / total_requests, 4) if total_requests else 0,
+        'sqlite_busy_rate': round(total_busy / total_requests, 4) if total_requests else 0,
+        'unique_violation_rate': round(total_unique / total_requests, 4) if total_requests else 0,
+    }
+    return report
+
+
+def print_report(report):
+    print(f"\n{'operation':<20} {'reqs':>7} {'rps':>8} {'p50':>8} {'p95':>8} {'p99':>8} {'errors':>8}  detail")
+    for operation, stats in report['operations'].items():
+        detail = ", ".join(f"{name}={count}" for name, count in stats['errors'].items())
+        print(f"{operation:<20} {stats['requests']:>7} {stats['throughput_rps']:>8} {stats['p50_ms']:>7}ms "
+              f"{stats['p95_ms']:>7}ms {stats['p99_ms']:>7}ms {stats['error_rate']:>8.2%}  {detail}")
+    total = report['total']
+    print(f"\nTotal: {total['requests']} requests in {report['elapsed_s']}s = {total['throughput_rps']} req/s, "
+          f"errors {total['error_rate']:.2%} (SQLITE_BUSY {total['sqlite_busy_rate']:.2%}, "
+          f"unique violations {total['unique_violation_rate']:.2%})")
+
+
+def _wait_for_port(host, port, timeout):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            with socket.create_connection((host, port), timeout=0.5):
+                return True
+        except OSError:
+            time.sleep(0.2)
+    return False
+
+
+def spawn_server(args, db_copy):
+    """
+    Starts gunicorn on a copy of the seeded database and returns the process: sync workers
+    (args.server 'sync') or uvicorn workers running asgi.py ('asgi'). With args.gunicorn_config
+    (e.g. gunicorn.conf.py) the profile decides the worker class, workers and threads unless
+    args.workers/args.threads are given. args.threads is gunicorn's --threads or ASGI_THREADS.
+    """
+    env = dict(os.environ, FLASK_CONFIG='production', DATABASE_PATH=db_copy,
+               SECRET_KEY=os.environ.get('SECRET_KEY', 'loadtest-secret-key'))
+    config_file = getattr(args, 'gunicorn_config', None)
+    command = [sys.executable, '-m', 'gunicorn', '--bind', f"{args.host}:{args.port}", '--log-level', 'warning']
+    if config_file:
+        command += ['--config', config_file]
+    if args.workers or not config_file:
+        command += ['--workers', str(args.workers or 4)]
+    if args.server == 'asgi':
+        if args.threads:
+            env['ASGI_THREADS'] = str(args.threads)
+        if config_file:
+            env['GUNICORN_WORKER_CLASS'] = 'uvicorn.workers.UvicornWorker'
+        else:
+            command += ['--worker-class', 'uvicorn.workers.UvicornWorker']
+        command.append('asgi:app')
+    else:
+        if args.threads or not config_file:
+            command += ['--threads', str(args.threads or 1)]
+        command.append('app:create_app()' if not config_file else 'wsgi:app')
+    process = subprocess.Popen(command, cwd=PROJECT_ROOT, env=env)
+    if not _wait_for_port(args.host, args.port, timeout=30):
+        process.terminate()
+        raise SystemExit("gunicorn did not start listening within 30 seconds.")
+    return process
+
+
+async def run(args):
+    dataset = Dataset(args.db)
+    mix = DEFAULT_MIX if not args.mix else json.loads(args.mix)
+    results = Results()
+    counter = iter(range(1, 10**9))
+    started = time.monotonic()
+    deadline = started + args.ramp_up + args.duration
+    await asyncio.gather(*(_clerk(i, args, dataset, mix, results, deadline, counter) for i in range(args.users)))
+    return summarise(results, time.monotonic() - started)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Simulate admission-day traffic against SATCMS.")
+    parser.add_argument('--db', required=True, help="Seeded database (benchmarks.generate_data); used to pick realistic ids.")
+    parser.add_argument('--url', default='http://127.0.0.1:5001', help="Server to test.")
+    parser.add_argument('--spawn', action='store_true', help="Start a server on a temporary copy of --db.")
+    parser.add_argument('--server', choices=('sync', 'asgi'), default='sync',
+                        help="Workers started by --spawn: gunicorn sync workers or uvicorn workers with asgi.py.")
+    parser.add_argument('--gunicorn-config', help="gunicorn config file for --spawn, e.g. gunicorn.conf.py (the production profile).")
+    parser.add_argument('--workers', type=int, help="Worker processes when --spawn is used (default 4, or the config's).")
+    parser.add_argument('--threads', type=int, help="Threads per worker when --spawn is used (gunicorn default 1, ASGI_THREADS for asgi).")
+    parser.add_argument('--users', type=int, default=20, help="Concurrent clerks.")
+    parser.add_argument('--duration', type=float, default=30, help="Seconds of steady load after ramp-up.")
+    parser.add_argument('--ramp-up', type=float, default=5, help="Seconds over which clerks log in.")
+    parser.add_argument('--think-time', type=float, default=0.5, help="Mean pause between a clerk's actions (0 = none).")
+    parser.add_argument('--mix', help='Operation weights as JSON, e.g. \'{"add_student": 50, "search_students": 50}\'.')
+    parser.add_argument('--username', default='admin')
+    parser.add_argument('--password', default='admin123ChangeMe')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--output', help="Also write the report as JSON to this path.")
+    args = parser.parse_args()
+
+    target = urlsplit(args.url)
+    args.host, args.port = target.hostname, target.port or 80
+
+    server = workdir = None
+    if args.spawn:
+        workdir = tempfile.mkdtemp(prefix='satcms_load_')
+        db_copy = os.path.join(workdir, 'load.db')
+        shutil.copyfile(args.db, db_copy) # The test writes; keep the seeded file pristine
+        args.db = db_copy
+        server = spawn_server(args, db_copy)
+    try:
+        print(f"Load test: {args.users} clerks for {args.duration}s (+{args.ramp_up}s ramp-up) against {args.url}")
+        report = asyncio.run(run(args))
+    finally:
+        if server:
+            server.terminate()
+            server.wait(timeout=30)
+        if workdir:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    report['config'] = {key: getattr(args, key) for key in ('users', 'duration', 'ramp_up', 'think_time', 'server', 'gunicorn_config', 'workers', 'threads', 'spawn')}
+    print_report(report)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
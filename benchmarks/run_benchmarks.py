@@ -0,0 +1,236 @@
+# benchmarks/run_benchmarks.py
+"""
+Endpoint benchmark harness.
+
+Runs the key pages through the Flask test client against a copy of a generated
+database (see benchmarks/generate_data.py) and writes a JSON report, so results can be
+compared across commits.
+
+Usage:
+    python -m benchmarks.run_benchmarks --db benchmarks/data/bench_50k.db
+    python -m benchmarks.run_benchmarks --compare results/old.json results/new.json
+
+By default the in-memory caches are cleared before every iteration, so the numbers show
+the uncached (query + render) cost; pass --warm-cache to measure cached responses.
+"""
+
+import argparse
+import io
+import json
+import os
+import platform
+import shutil
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+
+from utils.metrics import percentile
+
+DEFAULT_ITERATIONS = 10
+BULK_IMPORT_ROWS = 100
+
+
+def _git_commit():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], cwd=PROJECT_ROOT,
+                                       stderr=subprocess.DEVNULL, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def create_benchmark_app(db_path):
+    """Builds the app against db_path with settings suited to timing (no CSRF, quiet logs, warmed templates)."""
+    from config import config, TestingConfig
+
+    class BenchmarkConfig(TestingConfig):
+        DATABASE_PATH = db_path
+        CACHE_TYPE = 'SimpleCache'
+        JINJA_BYTECODE_CACHE_DIR = None
+        TEMPLATE_WARMUP_ON_STARTUP = True # Keep template compilation out of the measurements
+        LOG_REQUEST_QUERY_SUMMARY = False
+        NPLUSONE_DETECTION = False
+        SLOW_QUERY_THRESHOLD_MS = None
+
+    config['benchmark'] = BenchmarkConfig
+    from app import create_app
+    app = create_app('benchmark')
+    app.logger.setLevel('ERROR')
+    return app
+
+
+def _bulk_import_csv(db_path, batch):
+    """A CSV of new students for the most recent academic year (left half empty by the generator)."""
+    db = sqlite3.connect(db_path)
+    course_name = db.execute("SELECT course_name FROM courses WHERE is_special_format = 0 ORDER BY id LIMIT 1").fetchone()[0]
+    academic_year = db.execute("SELECT academic_year FROM academic_years ORDER BY academic_year DESC LIMIT 1").fetchone()[0]
+    db.close()
+    start_year = academic_year.split('-')[0]
+    lines = ["student_name,surname,father_name,mother_name,dob,gender,mobile_no,email,address,course_name,"
+             "academic_year,date_of_admission,type,nationality,religion,caste,category"]
+    for i in range(BULK_IMPORT_ROWS):
+        lines.append(f"Bench{batch}x{i},Import,Father {i},Mother {i},15-03-{int(start_year) - 18},Male,98765{i:05d},"
+                     f"bench{batch}.{i}@example.com,\"1-2, Main Road\",{course_name},{academic_year},"
+                     f"01-07-{start_year},New Admission,Indian,Hindu,OC,OC")
+    return "\n".join(lines).encode('utf-8')
+
+
+def _scenarios(db_path):
+    """(name, method, url, request-kwargs factory) for every benchmarked endpoint."""
+    db = sqlite3.connect(db_path)
+    first_course = db.execute("SELECT id FROM courses ORDER BY id LIMIT 1").fetchone()[0]
+    latest_year = db.execute("SELECT id FROM academic_years ORDER BY academic_year DESC LIMIT 1").fetchone()[0]
+    common_name = db.execute("SELECT student_name FROM students GROUP BY student_name ORDER BY COUNT(*) DESC LIMIT 1").fetchone()
+    db.close()
+    search_term = common_name[0] if common_name else 'a'
+
+    def no_body(_iteration):
+        return {}
+
+    def bulk_body(iteration):
+        return {'data': {'csv_file': (io.BytesIO(_bulk_import_csv(db_path, iteration)), 'students.csv')},
+                'content_type': 'multipart/form-data'}
+
+    return [
+        ('dashboard', 'GET', '/', no_body),
+        ('students_list', 'GET', '/students/list', no_body),
+        ('students_list_last_page', 'GET', '/students/list?page=200', no_body),
+        ('students_search', 'GET', f'/students/list?search={search_term}', no_body),
+        ('students_filtered', 'GET', f'/students/list?course_id={first_course}&academic_year_id={latest_year}', no_body),
+        ('fee_summary', 'GET', '/fees/summary', no_body),
+        ('fee_summary_filtered', 'GET', f'/fees/summary?course_id={first_course}', no_body),
+        ('admission_register_csv', 'GET', f'/reports/admission-register/download-csv?academic_year_id={latest_year}', no_body),
+        ('bulk_import', 'POST', '/students/bulk_import', bulk_body),
+    ]
+
+
+def run(db_path, iterations=DEFAULT_ITERATIONS, warm_cache=False, only=None):
+    """Runs every scenario against a temporary copy of db_path and returns the report dict."""
+    workdir = tempfile.mkdtemp(prefix='satcms_bench_')
+    work_db = os.path.join(workdir, 'bench.db')
+    shutil.copyfile(db_path, work_db) # Bulk import writes; keep the seeded file pristine
+
+    try:
+        app = create_benchmark_app(work_db)
+        from utils.caching import clear_cache
+        from models.query_stats import count_queries
+
+        client = app.test_client()
+        with client.session_transaction() as session:
+            session['admin_logged_in'] = True
+            session['username'] = 'benchmark'
+            session['admin_id'] = 1
+
+        results = {}
+        for name, method, url, make_kwargs in _scenarios(work_db):
+            if only and name not in only:
+                continue
+            timings, query_counts, sizes, statuses = [], [], [], set()
+            for iteration in range(iterations + 1): # Iteration 0 is a discarded warm-up
+                if not warm_cache:
+                    clear_cache()
+                kwargs = make_kwargs(iteration)
+                with count_queries() as queries:
+                    started = time.perf_counter()
+                    response = client.open(url, method=method, **kwargs)
+                    data = response.get_data()
+                    elapsed_ms = (time.perf_counter() - started) * 1000
+                if iteration == 0:
+                    continue
+                timings.append(elapsed_ms)
+                query_counts.append(len(queries))
+                sizes.append(len(data))
+                statuses.add(response.status_code)
+
+            results[name] = {
+                'method': method,
+                'url': url,
+                'iterations': iterations,
+                'status_codes': sorted(statuses),
+                'min_ms': round(min(timings), 2),
+                'median_ms': round(statistics.median(timings), 2),
+                'mean_ms': round(statistics.mean(timings), 2),
+                'p95_ms': round(percentile(timings, 95), 2),
+                'max_ms': round(max(timings), 2),
+                'queries': round(statistics.mean(query_counts), 1),
+                'response_bytes': int(statistics.mean(sizes)),
+            }
+            print(f"  {name:<26} median {results[name]['median_ms']:>9.2f}ms  p95 {results[name]['p95_ms']:>9.2f}ms  "
+                  f"{results[name]['queries']:>6} queries  status {results[name]['status_codes']}")
+
+        db = sqlite3.connect(db_path)
+        row_counts = {table: db.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+                      for table in ('students', 'student_fee_payments', 'transfer_certificates', 'courses', 'academic_years')}
+        db.close()
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    return {
+        'meta': {
+            'timestamp': datetime.now().isoformat(timespec='seconds'),
+            'git_commit': _git_commit(),
+            'database': os.path.abspath(db_path),
+            'row_counts': row_counts,
+            'iterations': iterations,
+            'warm_cache': warm_cache,
+            'python': platform.python_version(),
+            'sqlite': sqlite3.sqlite_version,
+            'platform': platform.platform(),
+        },
+        'results': results,
+    }
+
+
+def compare(base_path, new_path):
+    """Prints the median/p95 change per scenario between two reports."""
+    with open(base_path, 'r', encoding='utf-8') as f:
+        base = json.load(f)
+    with open(new_path, 'r', encoding='utf-8') as f:
+        new = json.load(f)
+    print(f"{'scenario':<26} {'base median':>12} {'new median':>12} {'change':>8} {'base q':>7} {'new q':>7}")
+    for name, result in new['results'].items():
+        old = base['results'].get(name)
+        if not old:
+            print(f"{name:<26} {'-':>12} {result['median_ms']:>12.2f}")
+            continue
+        change = (result['median_ms'] - old['median_ms']) / old['median_ms'] * 100 if old['median_ms'] else 0.0
+        print(f"{name:<26} {old['median_ms']:>12.2f} {result['median_ms']:>12.2f} {change:>+7.1f}% "
+              f"{old['queries']:>7} {result['queries']:>7}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark key SATCMS endpoints.")
+    parser.add_argument('--db', help="Database generated by benchmarks.generate_data.")
+    parser.add_argument('--iterations', type=int, default=DEFAULT_ITERATIONS)
+    parser.add_argument('--warm-cache', action='store_true', help="Keep in-memory caches between iterations.")
+    parser.add_argument('--only', nargs='*', help="Run only these scenarios.")
+    parser.add_argument('--output', help="Report path (default: benchmarks/results/<timestamp>_<commit>.json).")
+    parser.add_argument('--compare', nargs=2, metavar=('BASE', 'NEW'), help="Compare two reports and exit.")
+    args = parser.parse_args()
+
+    if args.compare:
+        compare(*args.compare)
+        return
+    if not args.db:
+        parser.error("--db is required (generate one with: python -m benchmarks.generate_data)")
+
+    print(f"Benchmarking {args.db} ({args.iterations} iterations, cache {'warm' if args.warm_cache else 'cleared'}):")
+    report = run(args.db, iterations=args.iterations, warm_cache=args.warm_cache, only=args.only)
+    output = args.output or os.path.join(
+        PROJECT_ROOT, 'benchmarks', 'results',
+        f"{datetime.now():%Y%m%d_%H%M%S}_{report['meta']['git_commit'] or 'nogit'}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2)
+    print(f"Report written to {output}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,104 @@
+# benchmarks/server_profiles.py
+"""
+Throughput of the gunicorn server profiles under the admission-day load test.
+
+Starts each profile on a fresh copy of the seeded database, runs benchmarks.loadtest
+against it with the same clerks and operation mix, and prints throughput, error rates
+and per-operation p95 side by side:
+
+- single-sync: `gunicorn wsgi:app`, the former Dockerfile command (one sync worker);
+- production: gunicorn.conf.py (gthread workers/threads sized to the CPUs, preload);
+- production-asgi: gunicorn.conf.py with uvicorn workers and asgi.py (needs uvicorn).
+
+Usage:
+    python -m benchmarks.server_profiles --db benchmarks/data/bench_50k.db --users 40 --duration 60
+    python -m benchmarks.server_profiles --db benchmarks/data/bench_50k.db --profiles single-sync,production --output profiles.json
+
+Measured on 1 CPU with 50k students, 30 s per profile (req/s, then p95 of add_student /
+search_students):
+
+    40 clerks, 0.5 s think time    single-sync      39.3 req/s   241 ms / 236 ms
+                                   production       44.4 req/s   155 ms / 206 ms
+                                   production-asgi  40.6 req/s  1187 ms / 497 ms
+    20 clerks, no think time       single-sync      56.2 req/s   397 ms / 401 ms
+                                   production       61.8 req/s   368 ms / 412 ms
+                                   production-asgi  55.0 req/s   448 ms / 604 ms
+
+On the same machine, two workers (CPUs + 1) gave 36.7 req/s with a 2.6 s add_student p95
+(writers waiting on each other across processes), which is why the profile stays at one
+worker per CPU.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import shutil
+import tempfile
+
+from benchmarks.loadtest import print_report, run, spawn_server
+
+PROFILES = {
+    'single-sync': {'server': 'sync', 'gunicorn_config': None, 'workers': 1, 'threads': 1},
+    'production': {'server': 'sync', 'gunicorn_config': 'gunicorn.conf.py', 'workers': None, 'threads': None},
+    'production-asgi': {'server': 'asgi', 'gunicorn_config': 'gunicorn.conf.py', 'workers': None, 'threads': None},
+}
+
+
+def print_comparison(reports):
+    operations = sorted({operation for report in reports.values() for operation in report['operations']})
+    print(f"\n{'profile':<16} {'req/s':>8} {'errors':>7}  " + " ".join(f"{operation[:14]:>14}" for operation in operations))
+    for name, report in reports.items():
+        p95 = [f"{report['operations'][operation]['p95_ms']}ms" if operation in report['operations'] else '-'
+               for operation in operations]
+        print(f"{name:<16} {report['total']['throughput_rps']:>8} {report['total']['error_rate']:>7.2%}  "
+              + " ".join(f"{value:>14}" for value in p95))
+    print("(per-operation columns are p95 latency)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare gunicorn server profiles under the admission-day load test.")
+    parser.add_argument('--db', required=True, help="Seeded database (benchmarks.generate_data); each profile gets a copy.")
+    parser.add_argument('--profiles', default=','.join(PROFILES), help=f"Comma-separated, from: {', '.join(PROFILES)}.")
+    parser.add_argument('--users', type=int, default=20, help="Concurrent clerks.")
+    parser.add_argument('--duration', type=float, default=30, help="Seconds of steady load per profile.")
+    parser.add_argument('--ramp-up', type=float, default=2)
+    parser.add_argument('--think-time', type=float, default=0, help="Mean pause between a clerk's actions (0 = none).")
+    parser.add_argument('--mix', help="Operation weights as JSON (default: benchmarks.loadtest.DEFAULT_MIX).")
+    parser.add_argument('--port', type=int, default=5092)
+    parser.add_argument('--username', default='admin')
+    parser.add_argument('--password', default='admin123ChangeMe')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--verbose', action='store_true', help="Print each profile's full load test report.")
+    parser.add_argument('--output', help="Also write the reports as JSON to this path.")
+    args = parser.parse_args()
+    args.host = '127.0.0.1'
+    seeded_db = args.db
+
+    reports = {}
+    for name in args.profiles.split(','):
+        for key, value in PROFILES[name].items():
+            setattr(args, key, value)
+        workdir = tempfile.mkdtemp(prefix='satcms_profile_')
+        args.db = os.path.join(workdir, 'profile.db')
+        shutil.copyfile(seeded_db, args.db) # The load test writes; every profile starts from the same data
+        print(f"{name}: {args.users} clerks for {args.duration}s")
+        server = spawn_server(args, args.db)
+        try:
+            reports[name] = asyncio.run(run(args))
+        finally:
+            server.terminate()
+            server.wait(timeout=120)
+            shutil.rmtree(workdir, ignore_errors=True)
+        reports[name]['config'] = dict(PROFILES[name], users=args.users, duration=args.duration, cpus=os.cpu_count())
+        if args.verbose:
+            print_report(reports[name])
+
+    print_comparison(reports)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(reports, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
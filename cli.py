@@ -0,0 +1,170 @@
+# cli.py
+"""
+Flask CLI commands for maintenance and diagnostics (registered in create_app).
+
+    flask --app app db upgrade
+    flask --app app db status
+    flask --app app db advise-indexes
+    flask --app app tc-bench --count 50 --no-pdf
+"""
+
+import logging
+import shutil
+import statistics
+import tempfile
+import time
+from datetime import date
+
+import click
+from flask import current_app
+from flask.cli import AppGroup, with_appcontext
+
+from utils.metrics import percentile
+
+
+db_cli = AppGroup('db', help="Schema migrations (db/migrations, see models/migrations.py).")
+
+
+@db_cli.command('upgrade')
+@click.option('--target', type=int, help="Stop after this migration version.")
+@click.option('--batch-size', type=int, help="Rowid range per transaction for batched steps (default: MIGRATION_BATCH_SIZE).")
+@click.option('--pause-ms', type=int, help="Pause between batches (default: MIGRATION_BATCH_PAUSE_MS).")
+def db_upgrade_command(target, batch_size, pause_ms):
+    """Applies pending migrations, including background ones. Safe to re-run after an interruption."""
+    from models.migrations import upgrade, MigrationError
+    try:
+        applied = upgrade(current_app.config['DATABASE_PATH'], current_app.config['MIGRATIONS_DIR'], target=target,
+                          batch_size=batch_size or current_app.config['MIGRATION_BATCH_SIZE'],
+                          pause_ms=current_app.config['MIGRATION_BATCH_PAUSE_MS'] if pause_ms is None else pause_ms,
+                          log=click.echo)
+    except MigrationError as e:
+        raise click.ClickException(str(e))
+    click.echo(f"Applied {len(applied)} migration(s)." if applied else "Database is up to date.")
+
+
+@db_cli.command('status')
+def db_status_command():
+    """Lists migrations with their state (applied, pending, in progress)."""
+    from models.migrations import status
+    for row in status(current_app.config['DATABASE_PATH'], current_app.config['MIGRATIONS_DIR']):
+        applied = f"  {row['applied_at']} UTC, {row['duration_ms']}ms" if row['applied_at'] else ""
+        click.echo(f"{row['label']:<40} {row['state']}{' [background]' if row['background'] else ''}{applied}")
+        for step in row['progress']:
+            click.echo(f"    {step}")
+
+
+@db_cli.command('unlock')
+def db_unlock_command():
+    """Releases the migration lock left by a run that was killed."""
+    from models.migrations import release_lock
+    click.echo("Lock released." if release_lock(current_app.config['DATABASE_PATH']) else "No lock was held.")
+
+
+@db_cli.command('advise-indexes')
+@click.option('--min-rows', default=1000, show_default=True, help="Report full scans only of tables at least this big.")
+@click.option('--verbose', is_flag=True, help="List every page requested.")
+def db_advise_indexes_command(min_rows, verbose):
+    """Runs the app's queries and reports full scans and temp B-trees, with index suggestions."""
+    from models.index_advisor import collect_app_queries, analyse
+    from models.db_pool import db_manager
+    click.echo(f"Running the app's queries against {current_app.config['DATABASE_PATH']}...")
+    query_stats = collect_app_queries(current_app._get_current_object(), log=click.echo if verbose else lambda _: None)
+    findings = analyse(db_manager.get_db(), query_stats, min_rows=min_rows)
+    click.echo(f"{len(query_stats)} distinct statements, {len(findings)} finding(s).")
+
+    suggestions = {}
+    for finding in findings:
+        click.echo(f"\n[{finding.kind}] {finding.table}: {finding.detail}")
+        click.echo(f"  ran {finding.count}x, {finding.total_ms}ms: {finding.sql[:200]}{'...' if len(finding.sql) > 200 else ''}")
+        if finding.suggestion:
+            click.echo(f"  suggestion: {finding.suggestion}")
+            suggestions.setdefault(finding.suggestion, 0)
+            suggestions[finding.suggestion] += 1
+    if suggestions:
+        click.echo("\nSuggested indexes (most frequent first; check them, then ship them as a migration in db/migrations):")
+        for suggestion, hits in sorted(suggestions.items(), key=lambda item: -item[1]):
+            click.echo(f"  {suggestion}  -- {hits} finding(s)")
+
+
+@click.command('tc-bench')
+@click.option('--count', default=20, show_default=True, help="Number of certificates to render.")
+@click.option('--pdf/--no-pdf', 'convert_pdf', default=True, show_default=True,
+              help="Convert to PDF (needs MS Word via docx2pdf); --no-pdf times the DOCX phases only.")
+@click.option('--template', help="TC template to use instead of TC_TEMPLATE_PATH.")
+@click.option('--keep-files', is_flag=True, help="Keep the rendered files instead of deleting them.")
+@with_appcontext
+def tc_bench_command(count, convert_pdf, template, keep_files):
+    """
+    Renders COUNT transfer certificates for sample students and reports per-phase percentiles.
+
+    Files are written to a temporary directory, and the TC insert is timed inside a
+    transaction that is rolled back, so the database is left unchanged.
+    """
+    from models.db_pool import db_manager, get_student_by_id
+    from utils.date_utils import convert_date_to_words
+    from utils.metrics import PhaseTimer
+    from utils.pdf_utils import TCGenerator
+
+    rows = db_manager.execute_query(
+        "SELECT id FROM students WHERE id NOT IN (SELECT student_id FROM transfer_certificates) ORDER BY id LIMIT ?",
+        (count,), fetch_all=True)
+    if not rows:
+        raise click.ClickException("No students without a TC found; generate some data first.")
+    student_ids = [row['id'] for row in rows]
+
+    output_dir = tempfile.mkdtemp(prefix='satcms_tc_bench_')
+    generator = TCGenerator(template_path=template)
+    generator.output_path_base = output_dir
+    logging.getLogger('utils.pdf_utils').setLevel(logging.WARNING) # One info line per phase would drown the report
+    today = date.today().strftime('%Y-%m-%d')
+
+    timers, failures = [], 0
+    click.echo(f"Rendering {count} TCs (template: {generator.template_path or 'built-in default'}, "
+               f"PDF conversion {'on' if convert_pdf else 'off'}) into {output_dir}")
+    try:
+        for i in range(count):
+            student = dict(get_student_by_id(student_ids[i % len(student_ids)]))
+            tc_data = {
+                'tc_number': f"BENCH/{i + 1:04d}",
+                'issue_date': today,
+                'date_of_leaving': today,
+                'conduct': student.get('conduct') or 'Good',
+                'promotion_status': 'Promoted',
+                'notes': '',
+                'dob_in_words': convert_date_to_words(student['dob'], input_format='%Y-%m-%d') if student.get('dob') else 'N/A',
+            }
+            timer = PhaseTimer('tc_bench')
+            started = time.perf_counter()
+            try:
+                generator.generate_tc_files(student, tc_data, timer=timer, convert_pdf=convert_pdf)
+                with timer.phase('db_insert'), db_manager.get_write_cursor(commit=False) as cursor:
+                    cursor.execute("INSERT INTO transfer_certificates (student_id, tc_number, issue_date, notes, promotion_status) "
+                                   "VALUES (?, ?, ?, ?, ?)", (student['id'], tc_data['tc_number'], today, '', 'Promoted'))
+                    cursor.execute("UPDATE students SET date_of_leaving = ?, conduct = ? WHERE id = ?",
+                                   (today, tc_data['conduct'], student['id']))
+            except Exception as e:
+                failures += 1
+                click.echo(f"  TC {i + 1} for student {student['id']} failed: {e}", err=True)
+                continue
+            timer.phases['total'] = time.perf_counter() - started
+            timers.append(timer)
+    finally:
+        if keep_files:
+            click.echo(f"Files kept in {output_dir}")
+        else:
+            shutil.rmtree(output_dir, ignore_errors=True)
+
+    if not timers:
+        raise click.ClickException("Every TC failed to render.")
+    click.echo(f"\n{'phase':<10} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'max ms':>9} {'mean ms':>9}")
+    for phase in timers[0].phases:
+        values = [t.phases[phase] * 1000 for t in timers if phase in t.phases]
+        click.echo(f"{phase:<10} {percentile(values, 50):>9.2f} {percentile(values, 95):>9.2f} "
+                   f"{percentile(values, 99):>9.2f} {max(values):>9.2f} {statistics.mean(values):>9.2f}")
+    click.echo(f"\n{len(timers)} rendered, {failures} failed.")
+
+
+def register_commands(app):
+    """Adds the CLI commands to the app."""
+    app.cli.add_command(db_cli)
+    app.cli.add_command(tc_bench_command)
@@ -15,7 +15,16 @@ class Config:
     SECRET_KEY = os.environ.get('SECRET_KEY') or secrets.token_hex(32)
 
     # Database settings
-    DATABASE_PATH = os.path.join(os.path.dirname(__file__), 'college.db')
+    DATABASE_PATH = os.environ.get('DATABASE_PATH') or os.path.join(os.path.dirname(__file__), 'college.db')
+    # Prepared statements cached per SQLite connection (sqlite3 default: 128); covers the
+    # filter/order variants of the registered queries in models/queries.py
+    SQLITE_CACHED_STATEMENTS = int(os.environ.get('SQLITE_CACHED_STATEMENTS', 512))
+    # Connections (models/db_pool.py): requests read through a pool of read-only connections,
+    # writes are serialised on one writer connection per process (WAL journal)
+    DB_READ_POOL_SIZE = int(os.environ.get('DB_READ_POOL_SIZE', 8)) # Idle read connections kept per process
+    DB_BUSY_TIMEOUT_MS = 2000 # SQLite's own wait for another process's write lock
+    DB_WRITE_RETRIES = 5 # Further BEGIN IMMEDIATE attempts once that wait has run out
+    DB_WRITE_RETRY_BACKOFF_MS = 50 # First retry delay, doubled after each attempt (with jitter)
 
     # Security settings
     WTF_CSRF_ENABLED = True
@@ -41,6 +50,10 @@ class Config:
     STUDENTS_PER_PAGE = 25
     RECORDS_PER_PAGE = 20
 
+    # Duplicate admission warnings (utils/duplicate_detection.py)
+    DUPLICATE_MATCH_THRESHOLD = 0.75 # Similarity (0-1) from which an existing student is reported
+    DUPLICATE_MAX_RESULTS = 5
+
     # TC Generation settings
     TC_TEMPLATE_PATH = os.path.join(os.path.dirname(__file__), 'templates', 'tc_template.docx')
     TC_OUTPUT_PATH = os.path.join(os.path.dirname(__file__), 'static', 'uploads', 'tc_generated')
@@ -72,6 +85,54 @@ class Config:
     CACHE_REDIS_DB = 0
     CACHE_REDIS_PASSWORD = None
     CACHE_DEFAULT_TIMEOUT = 300 # Default cache timeout in seconds (5 minutes)
+    MEMORY_CACHE_MAX_ENTRIES = int(os.environ.get('MEMORY_CACHE_MAX_ENTRIES', 1024)) # In-process @cached store (utils/caching.py)
+    FRAGMENT_CACHE_ENABLED = True # {% cache %} blocks in templates (utils/template_cache.py)
+    FRAGMENT_CACHE_MAX_ENTRIES = 256 # Rendered fragments kept per worker (least recently used go first)
+
+    # Query instrumentation (models/query_stats.py)
+    QUERY_INSTRUMENTATION_ENABLED = True
+    SLOW_QUERY_THRESHOLD_MS = int(os.environ.get('SLOW_QUERY_THRESHOLD_MS', 200)) # Logged with EXPLAIN QUERY PLAN
+    LOG_REQUEST_QUERY_SUMMARY = False # Log query count and DB time for every request
+    NPLUSONE_DETECTION = False # Log queries repeated within one request/job (N+1 patterns)
+    NPLUSONE_THRESHOLD = 5 # Repetitions of the same query allowed before it is reported
+
+    # Metrics settings (/metrics, Prometheus text format)
+    METRICS_ENABLED = True
+    # Shared directory for per-worker snapshots, so /metrics sums all gunicorn workers (None = this process only)
+    METRICS_DIR = os.environ.get('METRICS_DIR')
+    METRICS_FLUSH_INTERVAL = 5 # Seconds between snapshot writes per worker
+    METRICS_AUTH_TOKEN = os.environ.get('METRICS_AUTH_TOKEN') # Bearer token for scrapers; admins can always read /metrics
+    # Let unauthenticated requests from 127.0.0.1/::1 read /metrics (off: behind a local proxy every client is localhost)
+    METRICS_ALLOW_LOCALHOST = os.environ.get('METRICS_ALLOW_LOCALHOST', 'false').lower() in ['true', '1', 't']
+
+    # Schema migrations (models/migrations.py): applied on startup, background ones with `flask db upgrade`
+    MIGRATIONS_DIR = os.path.join(os.path.dirname(__file__), 'db', 'migrations')
+    MIGRATION_BATCH_SIZE = 5000 # Rowid range per transaction in batched backfills
+    MIGRATION_BATCH_PAUSE_MS = 50 # Pause between batches so request writers are not starved
+
+    # Request profiler (utils/profiler.py): admins send "X-Profile: 1", or a share of requests is sampled
+    PROFILER_ENABLED = os.environ.get('PROFILER_ENABLED', 'false').lower() in ['true', '1', 't']
+    PROFILER_SAMPLE_RATE = float(os.environ.get('PROFILER_SAMPLE_RATE', 0.0)) # 0.0-1.0
+    PROFILER_INTERVAL_MS = 1.0 # Stack sampling interval
+    PROFILER_MAX_PROFILES = 50 # Older profiles are deleted
+    PROFILE_DIR = os.path.join(os.path.dirname(__file__), 'instance', 'profiles')
+
+    # Server-Timing response header (utils/server_timing.py): 'off', 'admins' (logged-in admins only) or 'all'
+    SERVER_TIMING = os.environ.get('SERVER_TIMING', 'admins').lower()
+
+    # Template compilation settings
+    # Compiled templates are kept on disk so restarted workers skip recompiling them (None disables it)
+    JINJA_BYTECODE_CACHE_DIR = os.environ.get('JINJA_BYTECODE_CACHE_DIR') or os.path.join(os.path.dirname(__file__), 'instance', 'jinja_cache')
+    # Compile every template while the app boots instead of on first use
+    TEMPLATE_WARMUP_ON_STARTUP = os.environ.get('TEMPLATE_WARMUP_ON_STARTUP', 'false').lower() in ['true', '1', 't']
+
+    # ASGI deployment (asgi.py, utils/asgi_bridge.py): thread pools per worker process
+    ASGI_THREADS = int(os.environ.get('ASGI_THREADS', 8)) # Requests being processed at once
+    ASGI_DOCUMENT_THREADS = int(os.environ.get('ASGI_DOCUMENT_THREADS', 2)) # PDF/DOCX generation, kept off the request threads
+    ASGI_DOCUMENT_ENDPOINTS = {
+        'reports.admission_register', 'reports.fee_collection_report', 'reports.tc_issued_report',
+        'tc.generate_tc', 'fees.download_fee_history',
+    }
 
     @staticmethod
     def init_app(app):
@@ -86,6 +147,10 @@ class Config:
 class DevelopmentConfig(Config):
     """Development configuration"""
     DEBUG = True
+    LOG_REQUEST_QUERY_SUMMARY = True
+    NPLUSONE_DETECTION = True
+    PROFILER_ENABLED = True
+    SERVER_TIMING = 'all'
     # For stable CSRF tokens during development with auto-reload
     SECRET_KEY = 'dev_secret_this_is_not_for_production_!@#' # Replace with your own static key
     HOST = '0.0.0.0'  # Use '0.0.0.0' to be accessible on your network
@@ -97,6 +162,7 @@ class ProductionConfig(Config):
     DEBUG = False
     TESTING = False
     SESSION_COOKIE_SECURE = True  # Enable in production with HTTPS
+    TEMPLATE_WARMUP_ON_STARTUP = os.environ.get('TEMPLATE_WARMUP_ON_STARTUP', 'true').lower() in ['true', '1', 't']
 
 class TestingConfig(Config):
     """Testing configuration"""
@@ -104,6 +170,7 @@ class TestingConfig(Config):
     DATABASE_PATH = os.path.join(os.path.dirname(__file__), 'test_college.db')
     WTF_CSRF_ENABLED = False # Disable CSRF for easier testing
     SECRET_KEY = 'test_secret_key' # Use a fixed secret key for testing
+    JINJA_BYTECODE_CACHE_DIR = None # Always compile templates from source in tests
 
 # Dictionary to hold different config environments
 config = {
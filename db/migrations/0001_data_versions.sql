@@ -0,0 +1,102 @@
+-- 0001_data_versions.sql - Per-table change counters for SATCMS
+-- Every write to a tracked table bumps its version through the triggers below, so any
+-- worker can tell whether cached pages, fragments or ETags built from a table are stale
+-- with a single cheap SELECT. Idempotent, so it also applies to databases that predate it.
+
+CREATE TABLE IF NOT EXISTS data_versions (
+    table_name TEXT PRIMARY KEY,
+    version INTEGER NOT NULL DEFAULT 0,
+    updated_at TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP /* UTC, 'YYYY-MM-DD HH:MM:SS' */
+);
+
+INSERT OR IGNORE INTO data_versions (table_name) VALUES
+    ('courses'),
+    ('academic_years'),
+    ('students'),
+    ('fee_structure'),
+    ('student_fee_payments'),
+    ('transfer_certificates');
+
+-- Triggers: courses
+CREATE TRIGGER IF NOT EXISTS trg_courses_insert_version AFTER INSERT ON courses
+BEGIN
+    UPDATE data_versions SET version = version + 1, updated_at = CURRENT_TIMESTAMP WHERE table_name = 'courses';
+END;
+CREATE TRIGGER IF NOT EXISTS trg_courses_update_version AFTER UPDATE ON courses
+BEGIN
+    UPDATE data_versions SET version = version + 1, updated_at = CURRENT_TIMESTAMP WHERE table_name = 'courses';
+END;
+CREATE TRIGGER IF NOT EXISTS trg_courses_delete_version AFTER DELETE ON courses
+BEGIN
+    UPDATE data_versions SET version = version + 1, updated_at = CURRENT_TIMESTAMP WHERE table_name = 'courses';
+END;
+
+-- Triggers: academic_years
+CREATE TRIGGER IF NOT EXISTS trg_academic_years_insert_version AFTER INSERT ON academic_years
+BEGIN
+    UPDATE data_versions SET version = version + 1, updated_at = CURRENT_TIMESTAMP WHERE table_name = 'academic_years';
+END;
+CREATE TRIGGER IF NOT EXISTS trg_academic_years_update_version AFTER UPDATE ON academic_years
+BEGIN
+    UPDATE data_versions SET version = version + 1, updated_at = CURRENT_TIMESTAMP WHERE table_name = 'academic_years';
+END;
+CREATE TRIGGER IF NOT EXISTS trg_academic_years_delete_version AFTER DELETE ON academic_years
+BEGIN
+    UPDATE data_versions SET version = version + 1, updated_at = CURRENT_TIMESTAMP WHERE table_name = 'academic_years';
+END;
+
+-- Triggers: students
+CREATE TRIGGER IF NOT EXISTS trg_students_insert_version AFTER INSERT ON students
+BEGIN
+    UPDATE data_versions SET version = version + 1, updated_at = CURRENT_TIMESTAMP WHERE table_name = 'students';
+END;
+CREATE TRIGGER IF NOT EXISTS trg_students_update_version AFTER UPDATE ON students
+BEGIN
+    UPDATE data_versions SET version = version + 1, updated_at = CURRENT_TIMESTAMP WHERE table_name = 'students';
+END;
+CREATE TRIGGER IF NOT EXISTS trg_students_delete_version AFTER DELETE ON students
+BEGIN
+    UPDATE data_versions SET version = version + 1, updated_at = CURRENT_TIMESTAMP WHERE table_name = 'students';
+END;
+
+-- Triggers: fee_structure
+CREATE TRIGGER IF NOT EXISTS trg_fee_structure_insert_version AFTER INSERT ON fee_structure
+BEGIN
+    UPDATE data_versions SET version = version + 1, updated_at = CURRENT_TIMESTAMP WHERE table_name = 'fee_structure';
+END;
+CREATE TRIGGER IF NOT EXISTS trg_fee_structure_update_version AFTER UPDATE ON fee_structure
+BEGIN
+    UPDATE data_versions SET version = version + 1, updated_at = CURRENT_TIMESTAMP WHERE table_name = 'fee_structure';
+END;
+CREATE TRIGGER IF NOT EXISTS trg_fee_structure_delete_version AFTER DELETE ON fee_structure
+BEGIN
+    UPDATE data_versions SET version = version + 1, updated_at = CURRENT_TIMESTAMP WHERE table_name = 'fee_structure';
+END;
+
+-- Triggers: student_fee_payments
+CREATE TRIGGER IF NOT EXISTS trg_student_fee_payments_insert_version AFTER INSERT ON student_fee_payments
+BEGIN
+    UPDATE data_versions SET version = version + 1, updated_at = CURRENT_TIMESTAMP WHERE table_name = 'student_fee_payments';
+END;
+CREATE TRIGGER IF NOT EXISTS trg_student_fee_payments_update_version AFTER UPDATE ON student_fee_payments
+BEGIN
+    UPDATE data_versions SET version = version + 1, updated_at = CURRENT_TIMESTAMP WHERE table_name = 'student_fee_payments';
+END;
+CREATE TRIGGER IF NOT EXISTS trg_student_fee_payments_delete_version AFTER DELETE ON student_fee_payments
+BEGIN
+    UPDATE data_versions SET version = version + 1, updated_at = CURRENT_TIMESTAMP WHERE table_name = 'student_fee_payments';
+END;
+
+-- Triggers: transfer_certificates
+CREATE TRIGGER IF NOT EXISTS trg_transfer_certificates_insert_version AFTER INSERT ON transfer_certificates
+BEGIN
+    UPDATE data_versions SET version = version + 1, updated_at = CURRENT_TIMESTAMP WHERE table_name = 'transfer_certificates';
+END;
+CREATE TRIGGER IF NOT EXISTS trg_transfer_certificates_update_version AFTER UPDATE ON transfer_certificates
+BEGIN
+    UPDATE data_versions SET version = version + 1, updated_at = CURRENT_TIMESTAMP WHERE table_name = 'transfer_certificates';
+END;
+CREATE TRIGGER IF NOT EXISTS trg_transfer_certificates_delete_version AFTER DELETE ON transfer_certificates
+BEGIN
+    UPDATE data_versions SET version = version + 1, updated_at = CURRENT_TIMESTAMP WHERE table_name = 'transfer_certificates';
+END;
@@ -0,0 +1,49 @@
+# db/migrations/0002_query_indexes.py
+"""
+Indexes for the app's filter and sort keys.
+
+Chosen from `flask db advise-indexes` (models/index_advisor.py) on a 50k-student
+database: each one removes a full scan or a temp B-tree sort from the queries listed.
+A background migration: the builds take the write lock once per index on large tables,
+so they run with `flask db upgrade`, not at app start (gunicorn preloads the app in the
+master). CREATE INDEX IF NOT EXISTS also covers databases where some were created by hand.
+"""
+
+BACKGROUND = True
+
+
+def upgrade(m):
+    # Fee history per student (WHERE student_id = ? ORDER BY payment_date) and the per-student
+    # SUM(amount_paid) of fee_summary and the fee summary report, which otherwise build an
+    # automatic index on every run. amount_paid makes it covering for the sums.
+    m.create_index('idx_student_fee_payments_student_date', 'student_fee_payments',
+                   ['student_id', 'payment_date', 'amount_paid'])
+
+    # manage_fee_payments (ORDER BY payment_date DESC, id DESC, start/end date filters) and
+    # the fee collection report (ORDER BY payment_date); the rowid completes the sort key.
+    m.create_index('idx_student_fee_payments_payment_date', 'student_fee_payments', 'payment_date')
+
+    # Deleting or re-pointing a fee structure (ON DELETE RESTRICT check)
+    m.create_index('idx_student_fee_payments_fee_structure', 'student_fee_payments', 'fee_structure_id')
+
+    # list_students without filters: ORDER BY surname, student_name LIMIT/OFFSET reads the
+    # page straight from the index instead of sorting every student.
+    m.create_index('idx_students_surname_name', 'students', ['surname', 'student_name'])
+
+    # Academic-year filters without a course (idx_students_course_acad_serial starts with course_id)
+    m.create_index('idx_students_academic_year', 'students', ['academic_year_id', 'course_id'])
+
+    # Dashboard "recent admissions" (ORDER BY date_of_admission DESC LIMIT 5)
+    m.create_index('idx_students_date_of_admission', 'students', 'date_of_admission')
+
+    # Fee structure reassignment (UPDATE students ... WHERE fee_structure_id = ?) and the
+    # ON DELETE SET NULL action when a fee structure is removed
+    m.create_index('idx_students_fee_structure', 'students', 'fee_structure_id')
+
+    # TC issued report (ORDER BY issue_date, tc_number)
+    m.create_index('idx_transfer_certificates_issue_date', 'transfer_certificates', ['issue_date', 'tc_number'])
+
+    # Without statistics the planner prefers any equality index and drives the joins above from
+    # academic_years, losing the sort order these indexes provide; sqlite_stat1 lets it weigh
+    # them (under 0.1s for 50k students).
+    m.execute("ANALYZE")
@@ -1,5 +1,6 @@
 import sqlite3
 import os
+from models.migrations import upgrade, MigrationError
 
 SCHEMA_PATH = os.path.join("db", "schema.sql")
 DATABASE_PATH = "college.db"
@@ -18,8 +19,9 @@ def initialize_database():
         cursor.executescript(schema_sql)
         conn.commit()
         conn.close()
-        print("✅ Database initialized successfully at:", DATABASE_PATH)
-    except sqlite3.Error as e:
+        applied = upgrade(DATABASE_PATH, log=print) # Everything added to the schema since schema.sql
+        print("✅ Database initialized successfully at:", DATABASE_PATH, f"({len(applied)} migrations applied)")
+    except (sqlite3.Error, MigrationError) as e:
         print("❌ Failed to initialize database:", e)
 
 if __name__ == "__main__":
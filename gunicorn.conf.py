@@ -0,0 +1,92 @@
+# gunicorn.conf.py
+"""
+Production gunicorn profile (the Dockerfile uses it):
+
+    gunicorn --config gunicorn.conf.py wsgi:app
+
+    # ASGI mode (asgi.py), same profile with uvicorn workers
+    GUNICORN_WORKER_CLASS=uvicorn.workers.UvicornWorker gunicorn --config gunicorn.conf.py asgi:app
+
+- One worker per CPU this process may use. Pages are CPU-bound Python, and extra
+  processes cost more than they give here: writers in different processes wait for
+  SQLite's file lock (busy_timeout) instead of the in-process writer lock, and each
+  process rebuilds its own search/duplicate indexes after a write. Two threads per
+  worker keep a PDF conversion or a slow client from blocking the worker; more threads
+  only queued on the GIL (higher p95 for the same throughput).
+- preload_app loads the app once in the master and forks the workers from it. The
+  master closes its SQLite connections before each fork and the worker resets its pool
+  and metrics after it (models/db_pool.DatabaseManager.dispose, utils/metrics.reset_metrics).
+- With METRICS_DIR set, an exiting worker writes its final metrics snapshot and the master
+  then folds it into the archive and removes the file (utils/metrics.retire_snapshots), so
+  recycled workers don't leave a snapshot per PID behind.
+- Workers are recycled after max_requests so memory held by python-docx and the PDF
+  pipeline cannot grow without bound; the jitter keeps them from restarting together.
+- Report and TC PDFs can take tens of seconds, so timeout and graceful_timeout leave room
+  for a conversion to finish instead of killing it half-way (recycling, reloads, deploys).
+
+Every value can be overridden with the GUNICORN_* environment variable next to it.
+Measured with benchmarks/server_profiles.py (see its docstring).
+"""
+
+import os
+
+
+def _available_cpus():
+    try:
+        return len(os.sched_getaffinity(0)) # CPUs this process may run on (container cpusets)
+    except AttributeError: # Not available on macOS/Windows
+        return os.cpu_count() or 1
+
+
+bind = os.environ.get('GUNICORN_BIND', '0.0.0.0:5001')
+worker_class = os.environ.get('GUNICORN_WORKER_CLASS', 'gthread')
+workers = int(os.environ.get('GUNICORN_WORKERS', _available_cpus()))
+threads = int(os.environ.get('GUNICORN_THREADS', 2)) # gthread only; uvicorn workers use ASGI_THREADS
+
+preload_app = os.environ.get('GUNICORN_PRELOAD', 'true').lower() in ['true', '1', 't']
+max_requests = int(os.environ.get('GUNICORN_MAX_REQUESTS', 2000))
+max_requests_jitter = int(os.environ.get('GUNICORN_MAX_REQUESTS_JITTER', 200))
+
+# A sync worker is killed after `timeout` seconds in one request; gthread/uvicorn workers
+# only when they stop responding, so this is mainly a hung-worker limit.
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 120))
+graceful_timeout = int(os.environ.get('GUNICORN_GRACEFUL_TIMEOUT', 90)) # In-flight PDFs finish before a worker exits
+keepalive = int(os.environ.get('GUNICORN_KEEPALIVE', 5)) # Browsers reuse the connection for the page's AJAX calls
+
+# Worker heartbeat files in memory: a container's /tmp on overlayfs can stall the heartbeat
+if os.path.isdir('/dev/shm'):
+    worker_tmp_dir = '/dev/shm'
+
+accesslog = os.environ.get('GUNICORN_ACCESS_LOG') # e.g. '-' for stdout; off by default
+loglevel = os.environ.get('GUNICORN_LOG_LEVEL', 'info')
+
+
+def pre_fork(server, worker):
+    """In the master: close the connections opened while loading the app (migrations, admin check)."""
+    from models.db_pool import db_manager
+    db_manager.dispose()
+
+
+def post_fork(server, worker):
+    """In the new worker: start with an empty connection pool and zeroed metrics."""
+    from models.db_pool import db_manager
+    from utils.metrics import reset_metrics
+    db_manager.dispose()
+    reset_metrics()
+
+
+def worker_exit(server, worker):
+    """In the exiting worker: write its final metrics so the requests since the last flush count."""
+    from utils.metrics import flush_metrics
+    flush_metrics(os.environ.get('METRICS_DIR'), force=True)
+
+
+def child_exit(server, worker):
+    """In the master, after a worker exited: retire its metrics snapshot into the archive."""
+    from utils.metrics import retire_snapshots
+    retire_snapshots(os.environ.get('METRICS_DIR'), [worker.pid])
+
+
+def when_ready(server):
+    server.log.info(f"SATCMS: {workers} {worker_class} workers x {threads} threads, preload={preload_app}, "
+                    f"max_requests={max_requests}+{max_requests_jitter}, timeout={timeout}s")
@@ -1,58 +1,314 @@
 import sqlite3
+import queue
+import random
 import threading
+import time
 from contextlib import contextmanager
+from urllib.request import pathname2url
 from flask import current_app, g
 import os
 from utils.caching import cache_manager, cached # Import both cache_manager and the simple 'cached' decorator
+from models.identity_map import IdentityMap, clear_identity_maps
+from models.query_stats import InstrumentedCursor
+from models.migrations import upgrade
+from models.queries import ALL_STUDENTS, ADMISSION_REGISTER, FEE_PAYMENTS_REPORT, TC_ISSUED_REPORT
+from models.records import AdmissionRegisterRecord, FeePaymentReportRecord, TcIssuedRecord
+from utils.metrics import inc_counter, inc_gauge, observe
+
+# Lookup used by the student identity map; includes the names templates and reports expect.
+STUDENT_BY_ID_QUERY = """
+    SELECT s.*, c.course_name, c.course_full_name, c.course_code, ay.academic_year
+    FROM students s
+    JOIN courses c ON s.course_id = c.id
+    JOIN academic_years ay ON s.academic_year_id = ay.id
+    WHERE s.id = ?
+"""
+
+def _is_busy(error: sqlite3.OperationalError) -> bool:
+    message = str(error).lower()
+    return 'locked' in message or 'busy' in message
+
+
+class _Database:
+    """
+    Connections of this process to one database file:
+    - a pool of read-only connections (mode=ro), one checked out per request/app context;
+    - a single writer connection, used by one thread at a time under write_lock. Each write
+      block runs in BEGIN IMMEDIATE, so it holds SQLite's write lock from its first statement
+      and never fails half-way with "database is locked".
+    The journal is switched to WAL, in which readers see the last committed data while a
+    write is in progress instead of waiting for it.
+    """
+
+    def __init__(self, path: str, config):
+        self.path = path
+        self.pid = os.getpid()
+        self.cached_statements = config.get('SQLITE_CACHED_STATEMENTS', 128)
+        self.busy_timeout_ms = config.get('DB_BUSY_TIMEOUT_MS', 2000)
+        self.read_pool = queue.LifoQueue(maxsize=config.get('DB_READ_POOL_SIZE', 8)) # Most recently used first: warmest statement cache
+        self.write_lock = threading.RLock()
+        self.writer = self._connect(self.path, readonly=False)
+        self.writer.execute('PRAGMA journal_mode = WAL') # Persistent: stored in the database file
+
+    def _connect(self, path: str, readonly: bool):
+        connection = sqlite3.connect(
+            f"file:{pathname2url(os.path.abspath(path))}?mode=ro" if readonly else path,
+            uri=readonly,
+            detect_types=sqlite3.PARSE_DECLTYPES,
+            # Prepared statements kept per connection; room for every registered query variant (models/queries.py)
+            cached_statements=self.cached_statements,
+            check_same_thread=False, # Pooled: used by one thread at a time, not always the same one
+            isolation_level='' if readonly else None, # The writer's transactions are explicit (BEGIN IMMEDIATE)
+        )
+        connection.row_factory = sqlite3.Row  # Enable column access by name
+        connection.execute(f'PRAGMA busy_timeout = {int(self.busy_timeout_ms)}')
+        # Enable foreign key constraints
+        connection.execute('PRAGMA foreign_keys = ON')
+        inc_counter('satcms_db_connections_opened_total')
+        inc_gauge('satcms_db_connections_open')
+        return connection
+
+    def acquire_reader(self):
+        try:
+            return self.read_pool.get_nowait()
+        except queue.Empty:
+            return self._connect(self.path, readonly=True)
+
+    def release_reader(self, connection):
+        if connection.in_transaction:
+            connection.rollback()
+        try:
+            self.read_pool.put_nowait(connection)
+        except queue.Full: # More concurrent requests than DB_READ_POOL_SIZE; keep the pool at its size
+            connection.close()
+            inc_gauge('satcms_db_connections_open', value=-1)
+
+    def close(self):
+        """Closes the writer and the idle read connections (not ones checked out by a request)."""
+        with self.write_lock:
+            self.writer.close()
+            inc_gauge('satcms_db_connections_open', value=-1)
+        while True:
+            try:
+                self.read_pool.get_nowait().close()
+            except queue.Empty:
+                break
+            inc_gauge('satcms_db_connections_open', value=-1)
+
 
 class DatabaseManager:
-    """Database connection manager with connection pooling"""
+    """Database connection manager: pooled read-only connections and one serialised writer per process"""
     
     def __init__(self):
-        self._local = threading.local()
+        self._local = threading.local() # write_depth: write blocks open on this thread
+        self._databases = {} # {database path: _Database}
+        self._databases_lock = threading.Lock()
+        self._inherited = [] # Connections of a parent process, kept referenced so they are never closed here
+        # Request-scoped identity maps, e.g. db_manager.courses.get(course_id)
+        self.students = IdentityMap(self, 'students', STUDENT_BY_ID_QUERY)
+        self.courses = IdentityMap(self, 'courses', "SELECT * FROM courses WHERE id = ?")
+        self.academic_years = IdentityMap(self, 'academic_years', "SELECT * FROM academic_years WHERE id = ?")
+
+    def _database(self) -> _Database:
+        """Connections for the current app's DATABASE_PATH (opened again in a forked worker)."""
+        path = current_app.config['DATABASE_PATH']
+        database = self._databases.get(path)
+        if database is None or database.pid != os.getpid():
+            with self._databases_lock:
+                database = self._databases.get(path)
+                if database is None or database.pid != os.getpid():
+                    database = self._databases[path] = _Database(path, current_app.config)
+        return database
+
+    def dispose(self):
+        """
+        Closes this process's connections and drops the ones inherited from a parent
+        process, so the next request opens fresh ones. gunicorn.conf.py calls it around
+        fork with preload_app: the master closes what it opened while loading the app,
+        and each worker starts with an empty pool. Inherited connections are not closed:
+        SQLite handles must not be used across fork, not even to close them (closing
+        could checkpoint or remove the WAL the parent is still using).
+        """
+        with self._databases_lock:
+            databases, self._databases = self._databases, {}
+        for database in databases.values():
+            if database.pid == os.getpid():
+                database.close()
+            else:
+                self._inherited.append(database)
+
+    def _in_write(self) -> bool:
+        return getattr(self._local, 'write_depth', 0) > 0
     
     def get_db(self):
-        """Get database connection for current thread"""
+        """
+        Connection for the current request/app context: a pooled read-only connection,
+        or the writer connection inside a write block (so the block reads its own writes).
+        """
+        if self._in_write():
+            return self._database().writer
         if not hasattr(g, 'db'):
-            g.db = sqlite3.connect(
-                current_app.config['DATABASE_PATH'],
-                detect_types=sqlite3.PARSE_DECLTYPES
-            )
-            g.db.row_factory = sqlite3.Row  # Enable column access by name
-            # Enable foreign key constraints
-            g.db.execute('PRAGMA foreign_keys = ON')
+            g.db = self._database().acquire_reader()
         return g.db
     
     def close_db(self, error=None):
-        """Close database connection"""
+        """Return the request's read connection to the pool"""
         db = g.pop('db', None)
         if db is not None:
-            db.close()
+            self._database().release_reader(db)
+
+    def _cursor(self, db):
+        if current_app.config.get('QUERY_INSTRUMENTATION_ENABLED', True):
+            return db.cursor(factory=InstrumentedCursor) # Times each statement, see models/query_stats.py
+        return db.cursor()
+
+    def _begin_immediate(self, writer):
+        """BEGIN IMMEDIATE, retried with backoff while another process holds the write lock."""
+        retries = current_app.config.get('DB_WRITE_RETRIES', 5)
+        backoff_ms = current_app.config.get('DB_WRITE_RETRY_BACKOFF_MS', 50)
+        for attempt in range(retries + 1):
+            try:
+                writer.execute('BEGIN IMMEDIATE')
+                return
+            except sqlite3.OperationalError as e:
+                if not _is_busy(e) or attempt == retries:
+                    raise
+                inc_counter('satcms_db_write_busy_retries_total')
+                current_app.logger.warning(f"Database busy, retrying write ({attempt + 1}/{retries}): {e}")
+                time.sleep(backoff_ms * (2 ** attempt) * random.uniform(0.5, 1.5) / 1000)
+
+    @contextmanager
+    def transaction(self, immediate=True):
+        """
+        Unit of work on the writer connection: everything written in the block is committed
+        together when it ends (one commit, so one fsync) and rolled back if it raises.
+
+        immediate=True takes SQLite's write lock up front (BEGIN IMMEDIATE, retried while another
+        process holds it). immediate=False begins a deferred transaction, which only takes the
+        lock at its first write: for blocks that mostly read and may not write at all.
+
+        Blocks nested in it (including execute_query(..., commit=True) and get_db_cursor(commit=True)
+        calls) run in a SAVEPOINT: an exception escaping a nested block undoes only that block,
+        and what it wrote is committed with the outermost one. Reads through db_manager inside
+        the block see its uncommitted writes.
+
+            with db_manager.transaction() as cursor:
+                cursor.execute("INSERT ...")
+                for row in rows:
+                    try:
+                        with db_manager.transaction():
+                            ... # A failing row is undone; the others are kept
+                    except ValueError:
+                        ...
+        """
+        with self._write_block(immediate=immediate) as cursor:
+            yield cursor
+
+    @contextmanager
+    def get_write_cursor(self, commit=True):
+        """
+        Cursor for a write block (see transaction()); with commit=False the block is always
+        rolled back, for dry runs and benchmarks.
+        """
+        with self._write_block(immediate=True, commit=commit) as cursor:
+            yield cursor
+
+    @contextmanager
+    def _write_block(self, immediate, commit=True):
+        """Write blocks in this process run one at a time, on the writer connection."""
+        database = self._database()
+        writer = database.writer
+        started = time.perf_counter()
+        with database.write_lock:
+            depth = getattr(self._local, 'write_depth', 0)
+            if depth == 0:
+                if immediate:
+                    self._begin_immediate(writer)
+                else:
+                    writer.execute('BEGIN DEFERRED')
+                observe('satcms_db_write_wait_seconds', time.perf_counter() - started)
+                finish = ['COMMIT' if commit else 'ROLLBACK']
+                undo = ['ROLLBACK']
+            else:
+                savepoint = f'sp_{depth}'
+                writer.execute(f'SAVEPOINT {savepoint}')
+                undo = [f'ROLLBACK TO {savepoint}', f'RELEASE {savepoint}']
+                finish = [f'RELEASE {savepoint}'] if commit else undo
+            self._local.write_depth = depth + 1
+            cursor = self._cursor(writer)
+            changes_before = writer.total_changes
+            try:
+                yield cursor
+                for statement in finish:
+                    writer.execute(statement)
+            except BaseException:
+                if writer.in_transaction: # SQLite may already have rolled back (e.g. disk full)
+                    for statement in undo:
+                        writer.execute(statement)
+                raise
+            finally:
+                self._local.write_depth = depth
+                cursor.close()
+                if writer.total_changes != changes_before:
+                    # Rows were written; memoised lookups for this request may be stale now.
+                    clear_identity_maps()
+                    g.pop('_data_versions', None)
     
     @contextmanager
     def get_db_cursor(self, commit=False):
-        """Context manager for database operations"""
+        """
+        Context manager for database operations.
+        commit=True: a write block on the writer connection (see transaction()).
+        commit=False: reads, on the request's read-only connection.
+        """
+        if commit:
+            with self.get_write_cursor() as cursor:
+                yield cursor
+            return
         db = self.get_db()
-        cursor = db.cursor()
+        cursor = self._cursor(db)
         try:
             yield cursor
-            if commit:
-                db.commit()
-        except Exception as e:
-            db.rollback()
-            raise e
         finally:
             cursor.close()
     
     def init_db(self, app):
         """Initializes the database schema."""
         with app.app_context():
-            db = self.get_db()
+            database = self._database()
             schema_path = os.path.join(current_app.root_path, 'db', 'schema.sql')
-            with open(schema_path, 'r', encoding="utf-8") as f:
-                db.executescript(f.read())
-            db.commit()
+            with open(schema_path, 'r', encoding="utf-8") as f, database.write_lock:
+                database.writer.executescript(f.read())
             current_app.logger.info("Database schema initialized.")
+        self.migrate(app)
+
+    def migrate(self, app):
+        """
+        Applies pending schema migrations (db/migrations, see models/migrations.py).
+        Background migrations (long backfills, index builds) are left to `flask db upgrade`.
+        """
+        applied = upgrade(app.config['DATABASE_PATH'], app.config['MIGRATIONS_DIR'], include_background=False,
+                          batch_size=app.config['MIGRATION_BATCH_SIZE'], pause_ms=app.config['MIGRATION_BATCH_PAUSE_MS'],
+                          log=app.logger.info)
+        if applied:
+            app.logger.info(f"Applied migrations: {', '.join(applied)}")
+
+    def get_data_versions(self):
+        """
+        Returns {table_name: (version, updated_at)} for all tracked tables.
+        Read once per request; writes made through get_db_cursor() force a re-read.
+        """
+        versions = g.get('_data_versions')
+        if versions is None:
+            rows = self.execute_query("SELECT table_name, version, updated_at FROM data_versions", fetch_all=True)
+            versions = {row['table_name']: (row['version'], row['updated_at']) for row in rows}
+            g._data_versions = versions
+        return versions
+
+    def data_version_token(self, tables):
+        """Returns a short string that changes whenever any of the given tables is written to."""
+        versions = self.get_data_versions()
+        return ".".join(f"{table}:{versions.get(table, (0, None))[0]}" for table in sorted(tables))
 
     def execute_query(self, query, args=(), fetch_one=False, fetch_all=False, commit=False):
         """Execute a database query"""
@@ -68,8 +324,29 @@ class DatabaseManager:
             current_app.logger.error(f"Database error: {e} - Query: {query} - Args: {args}")
             raise # Re-raise the exception to be handled by Flask's error handlers or caller
 
+    def fetch_records(self, record_type, query, args=()):
+        """
+        Runs a read query and returns its rows as record_type instances (models/records.py).
+        The query must select the record's fields, in order; the records are built straight
+        from the row tuples, without a sqlite3.Row or a dict per row.
+        """
+        try:
+            with self.get_db_cursor() as cursor:
+                cursor.execute(query, args)
+                record_type.check_columns(cursor.description)
+                cursor.row_factory = lambda _cursor, row: record_type(*row)
+                return cursor.fetchall()
+        except sqlite3.Error as e:
+            current_app.logger.error(f"Database error: {e} - Query: {query} - Args: {args}")
+            raise
+
+    @cached(timeout=60, cache_key_prefix="dashboard_",
+            depends_on=('students', 'courses', 'academic_years', 'transfer_certificates'))
     def get_dashboard_stats(self):
-        """Returns a dictionary of dashboard statistics, including chart data."""
+        """
+        Returns a dictionary of dashboard statistics, including chart data.
+        Cached briefly (with stampede protection) since every counter opens the dashboard at once.
+        """
         stats = {}
         
         # Basic counts
@@ -139,151 +416,48 @@ def execute_db(query, args=(), commit=True):
 
 # Specific queries for common data
 def get_student_by_id(student_id):
-    """Get student details by ID, including course and academic year names."""
-    query = """
-        SELECT s.*, c.course_name, c.course_full_name, c.course_code, ay.academic_year
-        FROM students s
-        JOIN courses c ON s.course_id = c.id
-        JOIN academic_years ay ON s.academic_year_id = ay.id
-        WHERE s.id = ?
-    """
-    return db_manager.execute_query(query, (student_id,), fetch_one=True)
+    """Get student details by ID, including course and academic year names (memoised per request)."""
+    return db_manager.students.get(student_id)
 
 def get_courses():
     """Get all courses, cached for 1 hour."""
     query = "SELECT * FROM courses ORDER BY course_name"
-    return cached(timeout=3600)(db_manager.execute_query)(query, fetch_all=True)
+    return cached(timeout=3600, depends_on=('courses',))(db_manager.execute_query)(query, fetch_all=True)
 
 def get_academic_years():
     """Get all academic years, cached for 1 hour."""
     query = "SELECT * FROM academic_years ORDER BY academic_year DESC"
-    return cached(timeout=3600)(db_manager.execute_query)(query, fetch_all=True)
+    return cached(timeout=3600, depends_on=('academic_years',))(db_manager.execute_query)(query, fetch_all=True)
 
-def get_all_students(course_id=None, academic_year_id=None, order_by="s.admission_no ASC"):
+def get_all_students(course_id=None, academic_year_id=None, order_by="admission_no"):
     """
     Fetches all students with optional filters for course and academic year,
     and allows specifying an order.
     Returns comprehensive student data including course and academic year names.
+    order_by is one of the ALL_STUDENTS orders in models/queries.py (by name, or its SQL);
+    anything else raises ValueError.
     """
-    base_query = """
-        SELECT s.*, c.course_name, c.course_full_name, c.course_code, ay.academic_year
-        FROM students s
-        JOIN courses c ON s.course_id = c.id
-        JOIN academic_years ay ON s.academic_year_id = ay.id
-    """
-    conditions = []
-    params = []
-
-    if course_id is not None:
-        conditions.append("s.course_id = ?")
-        params.append(course_id)
-    
-    if academic_year_id is not None:
-        conditions.append("s.academic_year_id = ?")
-        params.append(academic_year_id)
-
-    if conditions:
-        base_query += " WHERE " + " AND ".join(conditions)
-    
-    if order_by:
-        base_query += f" ORDER BY {order_by}" # Be cautious with unvalidated order_by strings
-
-    return db_manager.execute_query(base_query, tuple(params), fetch_all=True)
+    sql, params = ALL_STUDENTS.build(order=ALL_STUDENTS.resolve_order(order_by),
+                                     course_id=course_id, academic_year_id=academic_year_id)
+    return db_manager.execute_query(sql, params, fetch_all=True)
 
 def get_students_for_admission_register(course_id=None, academic_year_id=None):
     """
-    Fetches student data specifically for the Admission Register, including TC info.
-    """
-    base_query = """
-        SELECT
-            s.*, -- All student fields
-            c.course_name, c.course_code, c.type AS course_type, -- Course details
-            ay.academic_year, -- Academic year
-            tc.tc_number, tc.issue_date AS tc_issue_date -- TC details (aliased to avoid conflict)
-        FROM students s
-        JOIN courses c ON s.course_id = c.id
-        JOIN academic_years ay ON s.academic_year_id = ay.id
-        LEFT JOIN transfer_certificates tc ON s.id = tc.student_id
+    Fetches student data specifically for the Admission Register, as AdmissionRegisterRecords.
     """
-    conditions = []
-    params = []
-
-    if course_id is not None:
-        conditions.append("s.course_id = ?")
-        params.append(course_id)
-    
-    if academic_year_id is not None:
-        conditions.append("s.academic_year_id = ?")
-        params.append(academic_year_id)
-
-    if conditions:
-        base_query += " WHERE " + " AND ".join(conditions)
-    
-    base_query += " ORDER BY s.admission_no ASC" # Or other preferred order for the register
-    return db_manager.execute_query(base_query, tuple(params), fetch_all=True)
+    sql, params = ADMISSION_REGISTER.build(course_id=course_id, academic_year_id=academic_year_id)
+    return db_manager.fetch_records(AdmissionRegisterRecord, sql, params)
 
 def get_fee_payments_for_report(course_id=None, academic_year_id=None):
     """
     Fetches individual fee payment records for reporting, with optional filters.
     """
-    query = """
-    SELECT
-        p.payment_date,
-        p.amount_paid,
-        p.transaction_id,
-        p.payment_method,
-        s.admission_no,
-        s.student_name,
-        c.course_name,
-        ay.academic_year
-    FROM student_fee_payments p
-    JOIN students s ON p.student_id = s.id
-    JOIN courses c ON s.course_id = c.id
-    JOIN academic_years ay ON s.academic_year_id = ay.id
-    WHERE 1=1
-    """
-    params = []
-    if course_id is not None:
-        query += " AND s.course_id = ?"
-        params.append(course_id)
-    if academic_year_id is not None:
-        query += " AND s.academic_year_id = ?"
-        params.append(academic_year_id)
-
-    query += " ORDER BY p.payment_date ASC, s.admission_no ASC"
-    return db_manager.execute_query(query, tuple(params), fetch_all=True)
+    sql, params = FEE_PAYMENTS_REPORT.build(course_id=course_id, academic_year_id=academic_year_id)
+    return db_manager.fetch_records(FeePaymentReportRecord, sql, params)
 
 def get_tc_issued_for_report(course_id=None, academic_year_id=None):
     """
-    Fetches TC issued records for reporting, with optional date filters.
-    """
-    query = """
-        SELECT
-            tc.tc_number,
-            tc.issue_date,
-            s.student_name,
-            s.admission_no,
-            s.date_of_leaving,
-            s.date_of_admission, -- Added date_of_admission
-            c.course_name,
-            ay.academic_year
-        FROM transfer_certificates tc
-        JOIN students s ON tc.student_id = s.id
-        JOIN courses c ON s.course_id = c.id
-        JOIN academic_years ay ON s.academic_year_id = ay.id
+    Fetches TC issued records for reporting, with optional course and academic year filters.
     """
-    conditions = []
-    params = []
-
-    if course_id: # Added course filter
-        conditions.append("s.course_id = ?")
-        params.append(course_id)
-    if academic_year_id: # Added academic year filter
-        conditions.append("s.academic_year_id = ?")
-        params.append(academic_year_id)
-
-    if conditions:
-        query += " WHERE " + " AND ".join(conditions)
-    
-    query += " ORDER BY tc.issue_date ASC, tc.tc_number ASC"
-    return db_manager.execute_query(query, tuple(params), fetch_all=True)
\ No newline at end of file
+    sql, params = TC_ISSUED_REPORT.build(course_id=course_id or None, academic_year_id=academic_year_id or None)
+    return db_manager.fetch_records(TcIssuedRecord, sql, params)
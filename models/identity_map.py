@@ -0,0 +1,55 @@
+# models/identity_map.py
+"""
+Request-scoped identity map for rows looked up by primary key.
+
+A single request often asks for the same course, academic year or student several
+times (the route, then admission number generation, then the template helpers).
+Each IdentityMap memoises `get(id)` results on Flask's `g`, so the row is fetched
+once per request. The maps are cleared by DatabaseManager whenever a write is made
+on the request's connection, so a lookup after a write always sees fresh data.
+"""
+
+from flask import g
+
+_G_ATTR = '_identity_maps'
+
+
+class IdentityMap:
+    """Memoises single-row lookups by id for the lifetime of the current request."""
+
+    def __init__(self, db_manager, name: str, query: str):
+        """
+        Args:
+            db_manager: The DatabaseManager used to run the lookup query.
+            name (str): Name of the map (usually the table name), used as the storage key on `g`.
+            query (str): SQL selecting one row, with a single `?` placeholder for the id.
+        """
+        self._db_manager = db_manager
+        self.name = name
+        self.query = query
+
+    def _store(self) -> dict:
+        maps = g.setdefault(_G_ATTR, {})
+        return maps.setdefault(self.name, {})
+
+    def get(self, row_id):
+        """Returns the row with the given id (or None), querying the database at most once per request."""
+        if row_id is None:
+            return None
+        store = self._store()
+        if row_id not in store:
+            store[row_id] = self._db_manager.execute_query(self.query, (row_id,), fetch_one=True)
+        return store[row_id]
+
+    def invalidate(self, row_id=None):
+        """Forgets one memoised row, or every row of this map if no id is given."""
+        store = self._store()
+        if row_id is None:
+            store.clear()
+        else:
+            store.pop(row_id, None)
+
+
+def clear_identity_maps():
+    """Drops every memoised row for the current request (called after writes)."""
+    g.pop(_G_ATTR, None)
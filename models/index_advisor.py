@@ -0,0 +1,235 @@
+# models/index_advisor.py
+"""
+Index advisor: finds the app's queries that SQLite cannot answer from an index.
+
+Used by `flask db advise-indexes`. It
+1. drives the app's queries: every argument-free GET page (plus the id pages, with the
+   first id of each table), the list pages again with their filters and search, and the
+   report data functions that are otherwise only reached through POSTs;
+2. takes every distinct statement from the query statistics (models/query_stats.py) and
+   runs EXPLAIN QUERY PLAN on it (with NULL for each parameter: plans in SQLite do not
+   depend on parameter values here);
+3. reports full scans of tables with at least min_rows rows, temp B-trees (sorts and
+   groupings the planner could not take from an index) and automatic indexes, with an
+   index suggestion built from the statement's WHERE/JOIN/ORDER BY columns.
+
+Suggestions are a starting point; the indexes that ship are in db/migrations.
+Pages are fetched with caching off so every query really runs. Nothing is written.
+"""
+
+import re
+from collections import namedtuple
+
+from models.query_stats import get_query_stats, reset_query_stats
+
+DEFAULT_MIN_ROWS = 1000
+
+# GET endpoints that are not pages (downloads of generated files, metrics, auth)
+SKIP_ENDPOINTS = {
+    'static', 'favicon', 'auth.logout', 'logout_redirect', 'login_redirect', 'setup_admin_redirect',
+    'tc.download_tc', 'reports.fee_collection_report_file', 'fees.download_fee_history',
+    'monitoring.metrics', 'monitoring.list_request_profiles', 'monitoring.download_request_profile',
+}
+
+# URL argument -> table its sample value is taken from
+SAMPLE_ID_TABLES = {
+    'student_id': 'students', 'course_id': 'courses', 'year_id': 'academic_years',
+    'academic_year_id': 'academic_years', 'structure_id': 'fee_structure', 'payment_id': 'student_fee_payments',
+}
+
+# Filter combinations of the list pages ({course_id}, {academic_year_id}, {search} are filled in)
+FILTERED_PAGES = (
+    '/students/list?search={search}',
+    '/students/list?course_id={course_id}',
+    '/students/list?course_id={course_id}&academic_year_id={academic_year_id}',
+    '/students/list?page=50',
+    '/fees/summary?course_id={course_id}',
+    '/fees/summary?academic_year_id={academic_year_id}',
+    '/fees/summary?search_student={search}',
+    '/fees/manage-payments?course_id={course_id}',
+    '/fees/manage-payments?start_date=2024-01-01&end_date=2024-12-31',
+    '/fees/manage-payments?search_student={search}',
+    '/tc/select-student?course_id={course_id}&academic_year_id={academic_year_id}',
+    '/students/api/typeahead?q={search}',
+    '/reports/admission-register/download-csv?academic_year_id={academic_year_id}',
+)
+
+Finding = namedtuple('Finding', 'kind table detail sql count total_ms suggestion')
+
+_ALIAS_RE = re.compile(r"\b(?:from|join)\s+(\w+)(?:\s+(?:as\s+)?(?!on\b|where\b|join\b|left\b|inner\b|group\b|order\b|limit\b)(\w+))?", re.IGNORECASE)
+_EQ_PARAM_RE = re.compile(r"\b(?:(\w+)\.)?(\w+)\s*=\s*\?") # Alias is '' for unqualified columns
+_RANGE_PARAM_RE = re.compile(r"\b(?:(\w+)\.)?(\w+)\s*(?:>=|<=|>|<)\s*\?")
+_JOIN_RE = re.compile(r"\b(\w+)\.(\w+)\s*=\s*(\w+)\.(\w+)")
+_ORDER_BY_RE = re.compile(r"\border\s+by\s+(.+?)(?:\blimit\b|;|$)", re.IGNORECASE | re.DOTALL)
+_STRING_RE = re.compile(r"'(?:[^']|'')*'")
+_PLAN_TABLE_RE = re.compile(r"^(?:SCAN|SEARCH) (\w+)")
+
+
+def _report_queries():
+    """Report data functions reached only through POSTs (PDF generation), with and without filters."""
+    from models.db_pool import (get_all_students, get_students_for_admission_register,
+                                get_fee_payments_for_report, get_tc_issued_for_report)
+    return (get_all_students, get_students_for_admission_register, get_fee_payments_for_report, get_tc_issued_for_report)
+
+
+def _first_id(db, table):
+    row = db.execute(f"SELECT MIN(id) FROM {table}").fetchone()
+    return row[0] if row and row[0] is not None else 1
+
+
+def collect_app_queries(app, log=print):
+    """Runs the app's pages and report queries once each; returns get_query_stats() for them."""
+    from utils.caching import clear_cache
+    from models.db_pool import db_manager
+
+    with app.app_context():
+        db = db_manager.get_db()
+        samples = {argument: _first_id(db, table) for argument, table in SAMPLE_ID_TABLES.items()}
+        common_name = db.execute("SELECT student_name FROM students GROUP BY student_name "
+                                 "ORDER BY COUNT(*) DESC LIMIT 1").fetchone()
+        samples['search'] = common_name[0] if common_name else 'a'
+
+    urls = []
+    with app.test_request_context():
+        from flask import url_for
+        for rule in app.url_map.iter_rules():
+            if 'GET' not in rule.methods or rule.endpoint in SKIP_ENDPOINTS:
+                continue
+            if all(argument in samples for argument in rule.arguments):
+                urls.append(url_for(rule.endpoint, **{argument: samples[argument] for argument in rule.arguments}))
+    urls.extend(page.format(**samples) for page in FILTERED_PAGES)
+
+    reset_query_stats()
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session['admin_logged_in'] = True
+        session['username'] = 'index-advisor'
+        session['admin_id'] = 1
+    for url in urls:
+        clear_cache()
+        status = client.get(url).status_code
+        log(f"  GET {url} -> {status}")
+
+    with app.app_context():
+        for function in _report_queries():
+            for filters in ({}, {'course_id': samples['course_id']},
+                            {'course_id': samples['course_id'], 'academic_year_id': samples['academic_year_id']}):
+                function(**filters)
+        log(f"  {len(_report_queries())} report queries, with and without filters")
+    return get_query_stats()
+
+
+def _placeholder_count(sql):
+    return _STRING_RE.sub("''", sql).count('?')
+
+
+def _suggest_index(sql, table, kind):
+    """
+    CREATE INDEX suggestion for table: its equality columns, then (for a joined table) its
+    join columns, one range column and the leading ORDER BY columns that belong to it.
+    A temp B-tree only needs the equality and ORDER BY columns.
+    """
+    aliases = {}
+    tables_in_order = []
+    for name, alias in _ALIAS_RE.findall(sql):
+        aliases[(alias or name).lower()] = name.lower()
+        tables_in_order.append(name.lower())
+    mine = {alias for alias, name in aliases.items() if name == table.lower()} | {table.lower()}
+    if len(tables_in_order) == 1:
+        mine.add('') # Single-table statement: unqualified columns are this table's
+    # The first FROM table drives the loop; only tables joined to it are looked up by join column
+    joined = kind != 'temp b-tree' and bool(tables_in_order) and tables_in_order[0] != table.lower()
+
+    columns = []
+    def add(column):
+        if column != 'id' and column not in columns:
+            columns.append(column)
+
+    for alias, column in _EQ_PARAM_RE.findall(sql):
+        if alias.lower() in mine:
+            add(column.lower())
+    for left_alias, left_column, right_alias, right_column in _JOIN_RE.findall(sql) if joined else ():
+        if left_alias.lower() in mine and right_alias.lower() not in mine:
+            add(left_column.lower())
+        elif right_alias.lower() in mine and left_alias.lower() not in mine:
+            add(right_column.lower())
+    for alias, column in _RANGE_PARAM_RE.findall(sql)[:1] if kind != 'temp b-tree' else (): # Only one range column is usable
+        if alias.lower() in mine:
+            add(column.lower())
+    order_by = _ORDER_BY_RE.search(sql)
+    if order_by:
+        for term in order_by.group(1).split(','):
+            parts = term.strip().split()
+            if not parts:
+                break
+            alias, column = parts[0].split('.', 1) if '.' in parts[0] else ('', parts[0])
+            if alias.lower() not in mine:
+                break # Only a leading run of this table's columns can come from its index
+            add(column.lower())
+    if not columns:
+        return None
+    return f"CREATE INDEX idx_{table}_{'_'.join(columns)} ON {table} ({', '.join(columns)});"
+
+
+def _sort_table(sql, detail, aliases, single_table):
+    """
+    Table of the first ORDER BY / GROUP BY column, which an index would have to supply.
+    None when it is a computed column (e.g. ORDER BY a COUNT), which no index can provide.
+    """
+    clause = 'group' if 'GROUP BY' in detail else 'order'
+    match = re.search(rf"\b{clause}\s+by\s+(?:(\w+)\.)?(\w+)", sql, re.IGNORECASE)
+    if not match:
+        return None
+    if match.group(1):
+        return aliases.get(match.group(1).lower())
+    return single_table if len(set(aliases.values())) == 1 else None
+
+
+def explain(db, sql):
+    """EXPLAIN QUERY PLAN rows (id, parent, detail) for sql, binding NULL to every parameter."""
+    return [(row[0], row[1], row[3]) for row in db.execute(f"EXPLAIN QUERY PLAN {sql}", [None] * _placeholder_count(sql))]
+
+
+def analyse(db, query_stats, min_rows=DEFAULT_MIN_ROWS):
+    """Findings for the given get_query_stats() rows, heaviest statements first."""
+    row_counts = {}
+    def rows_in(table):
+        if table not in row_counts:
+            try:
+                row_counts[table] = db.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+            except Exception:
+                row_counts[table] = 0
+        return row_counts[table]
+
+    findings = []
+    for stats in query_stats:
+        sql = stats['example']
+        if not sql.lower().startswith(('select', 'with')):
+            continue
+        try:
+            plan = explain(db, sql)
+        except Exception as e:
+            findings.append(Finding('not explained', None, str(e), sql, stats['count'], round(stats['total_ms'], 1), None))
+            continue
+        aliases = {(alias or name).lower(): name.lower() for name, alias in _ALIAS_RE.findall(sql)}
+        last_table = None
+        for _, _, detail in plan:
+            match = _PLAN_TABLE_RE.match(detail)
+            if match:
+                last_table = aliases.get(match.group(1).lower(), match.group(1).lower())
+            table = last_table
+            if detail.startswith('SCAN ') and ' USING ' not in detail:
+                kind = 'full scan'
+            elif 'AUTOMATIC' in detail:
+                kind = 'automatic index'
+            elif detail.startswith('USE TEMP B-TREE'):
+                kind = 'temp b-tree'
+                table = _sort_table(sql, detail, aliases, last_table)
+            else:
+                continue
+            if not table or rows_in(table) < min_rows:
+                continue # Scanning or sorting a small table (courses, academic years) is cheap
+            findings.append(Finding(kind, table, detail, sql, stats['count'], round(stats['total_ms'], 1),
+                                    _suggest_index(sql, table, kind)))
+    findings.sort(key=lambda finding: finding.total_ms, reverse=True)
+    return findings
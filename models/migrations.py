@@ -0,0 +1,351 @@
+# models/migrations.py
+"""
+Versioned schema migrations for the SQLite database.
+
+A new database is created from db/schema.sql (the baseline); everything added to the
+schema after that lives in db/migrations/ as NNNN_description.sql or NNNN_description.py
+and is applied in version order. Applied versions are recorded in schema_migrations with
+a checksum, so `flask db status` can point out migration files edited after they ran.
+Migrations also run against databases created before they existed, so they must be safe
+to apply to any earlier schema (CREATE ... IF NOT EXISTS, m.add_column(), ...).
+
+- .sql migrations run in one BEGIN IMMEDIATE transaction together with their
+  schema_migrations row: they are applied completely or not at all.
+- .py migrations define upgrade(m) and get a MigrationContext. By default they also run
+  in one transaction. Modules that set BACKGROUND = True (index builds, FTS or summary
+  tables, backfills on large tables) run outside a transaction instead: each statement
+  commits on its own, and m.batched() walks a table in short rowid-range transactions,
+  saving its position in schema_migration_progress after every batch and pausing between
+  batches, so the app's writers never wait long and an interrupted run resumes where it
+  stopped. Background migrations are skipped when the app starts; apply them with
+  `flask db upgrade`.
+
+Only one process migrates at a time: the others wait for schema_migrations_lock.
+"""
+
+import hashlib
+import importlib.util
+import logging
+import os
+import re
+import socket
+import sqlite3
+import time
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MIGRATIONS_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'db', 'migrations')
+DEFAULT_BATCH_SIZE = 5000 # Rows (rowid range) per batch transaction
+DEFAULT_BATCH_PAUSE_MS = 50 # Sleep between batches so request writers get the lock
+DEFAULT_LOCK_WAIT = 30 # Seconds to wait for another process's migration run
+BUSY_TIMEOUT_MS = 30000
+
+MIGRATION_FILE_RE = re.compile(r'^(\d{4})_([a-z0-9_]+)\.(sql|py)$')
+
+BOOKKEEPING_SQL = """
+CREATE TABLE IF NOT EXISTS schema_migrations (
+    version INTEGER PRIMARY KEY,
+    name TEXT NOT NULL,
+    checksum TEXT NOT NULL,
+    applied_at TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    duration_ms REAL
+);
+CREATE TABLE IF NOT EXISTS schema_migration_progress (
+    version INTEGER NOT NULL,
+    step TEXT NOT NULL,
+    last_rowid INTEGER NOT NULL,
+    rows_done INTEGER NOT NULL DEFAULT 0,
+    updated_at TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (version, step)
+);
+CREATE TABLE IF NOT EXISTS schema_migrations_lock (
+    id INTEGER PRIMARY KEY CHECK (id = 1),
+    owner TEXT NOT NULL,
+    acquired_at TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+"""
+
+
+class MigrationError(Exception):
+    """A migration file is invalid or failed to apply."""
+
+
+class Migration:
+    """One file in the migrations directory."""
+
+    def __init__(self, version: int, name: str, path: str):
+        self.version = version
+        self.name = name
+        self.path = path
+        self.kind = os.path.splitext(path)[1][1:] # 'sql' or 'py'
+        with open(path, 'rb') as f:
+            self.source = f.read()
+        self.checksum = hashlib.sha256(self.source).hexdigest()[:16]
+        self._module = None
+
+    @property
+    def module(self):
+        if self._module is None and self.kind == 'py':
+            spec = importlib.util.spec_from_file_location(f"satcms_migration_{self.version:04d}", self.path)
+            self._module = importlib.util.module_from_spec(spec)
+            spec.loader.exec_module(self._module)
+            if not callable(getattr(self._module, 'upgrade', None)):
+                raise MigrationError(f"{os.path.basename(self.path)} does not define upgrade(m)")
+        return self._module
+
+    @property
+    def background(self) -> bool:
+        return self.kind == 'py' and bool(getattr(self.module, 'BACKGROUND', False))
+
+    @property
+    def label(self) -> str:
+        return f"{self.version:04d}_{self.name}"
+
+
+class MigrationContext:
+    """The `m` argument of a Python migration's upgrade(m)."""
+
+    def __init__(self, conn, migration: Migration, in_transaction: bool, batch_size: int, pause_ms: int, log):
+        self.conn = conn
+        self.migration = migration
+        self.in_transaction = in_transaction
+        self.batch_size = batch_size
+        self.pause_ms = pause_ms
+        self.log = log
+
+    def execute(self, sql: str, params=()):
+        """Runs one statement; in a background migration it is committed straight away."""
+        if self.in_transaction:
+            return self.conn.execute(sql, params)
+        self.conn.execute("BEGIN IMMEDIATE")
+        try:
+            cursor = self.conn.execute(sql, params)
+            self.conn.execute("COMMIT")
+            return cursor
+        except Exception:
+            self.conn.execute("ROLLBACK")
+            raise
+
+    def table_exists(self, table: str) -> bool:
+        return self.conn.execute("SELECT 1 FROM sqlite_master WHERE type IN ('table', 'view') AND name = ?",
+                                 (table,)).fetchone() is not None
+
+    def column_exists(self, table: str, column: str) -> bool:
+        return any(row[1] == column for row in self.conn.execute(f"PRAGMA table_info({table})"))
+
+    def add_column(self, table: str, column: str, definition: str):
+        """ALTER TABLE ... ADD COLUMN unless the column exists (only rewrites the schema, not the rows)."""
+        if not self.column_exists(table, column):
+            self.execute(f"ALTER TABLE {table} ADD COLUMN {column} {definition}")
+
+    def create_index(self, name: str, table: str, columns, unique: bool = False, where: str = None):
+        """
+        CREATE INDEX IF NOT EXISTS. SQLite builds an index in a single statement, so writers
+        wait for the whole build; on big tables do it in a background migration.
+        """
+        columns = [columns] if isinstance(columns, str) else list(columns)
+        sql = (f"CREATE {'UNIQUE ' if unique else ''}INDEX IF NOT EXISTS {name} ON {table} ({', '.join(columns)})"
+               + (f" WHERE {where}" if where else ""))
+        started = time.perf_counter()
+        self.execute(sql)
+        self.log(f"  index {name} on {table} ready ({(time.perf_counter() - started) * 1000:.0f}ms)")
+
+    def batched(self, step: str, table: str, sql: str, batch_size: int = None) -> int:
+        """
+        Runs sql once per rowid range of table, each range in its own short transaction.
+        sql selects its rows with `rowid > :start AND rowid <= :end` (or the table's INTEGER
+        PRIMARY KEY), e.g. INSERT INTO x SELECT ... FROM students WHERE id > :start AND id <= :end.
+
+        Progress is saved per step after every batch, so a re-run resumes after the last
+        committed range. Rows written after the run started are not visited; create the
+        triggers that keep the target in sync before the backfill. Returns rows changed.
+        """
+        if self.in_transaction:
+            raise MigrationError(f"{self.migration.label}: m.batched() needs BACKGROUND = True")
+        batch_size = batch_size or self.batch_size
+        version = self.migration.version
+        row = self.conn.execute("SELECT last_rowid, rows_done FROM schema_migration_progress WHERE version = ? AND step = ?",
+                                (version, step)).fetchone()
+        last_rowid, rows_done = row if row else (0, 0)
+        max_rowid = self.conn.execute(f"SELECT MAX(rowid) FROM {table}").fetchone()[0] or 0
+        if row:
+            self.log(f"  {step}: resuming after rowid {last_rowid} ({rows_done} rows done)")
+
+        batches = 0
+        while last_rowid < max_rowid:
+            end = last_rowid + batch_size
+            self.conn.execute("BEGIN IMMEDIATE")
+            try:
+                changed = self.conn.execute(sql, {'start': last_rowid, 'end': end}).rowcount
+                rows_done += max(changed, 0)
+                self.conn.execute(
+                    """INSERT INTO schema_migration_progress (version, step, last_rowid, rows_done, updated_at)
+                       VALUES (?, ?, ?, ?, CURRENT_TIMESTAMP)
+                       ON CONFLICT (version, step) DO UPDATE SET
+                           last_rowid = excluded.last_rowid, rows_done = excluded.rows_done, updated_at = excluded.updated_at""",
+                    (version, step, end, rows_done))
+                self.conn.execute("COMMIT")
+            except Exception:
+                self.conn.execute("ROLLBACK")
+                raise
+            last_rowid = end
+            batches += 1
+            if batches % 20 == 0:
+                self.log(f"  {step}: {min(last_rowid, max_rowid)}/{max_rowid} rowids, {rows_done} rows")
+            if self.pause_ms:
+                time.sleep(self.pause_ms / 1000)
+        self.log(f"  {step}: done, {rows_done} rows")
+        return rows_done
+
+
+def discover_migrations(migrations_dir: str = DEFAULT_MIGRATIONS_DIR) -> list:
+    """Migration files in version order."""
+    migrations = {}
+    if not os.path.isdir(migrations_dir):
+        return []
+    for filename in sorted(os.listdir(migrations_dir)):
+        match = MIGRATION_FILE_RE.match(filename)
+        if not match:
+            continue
+        version = int(match.group(1))
+        if version in migrations:
+            raise MigrationError(f"Duplicate migration version {version:04d}: "
+                                 f"{os.path.basename(migrations[version].path)} and {filename}")
+        migrations[version] = Migration(version, match.group(2), os.path.join(migrations_dir, filename))
+    return [migrations[version] for version in sorted(migrations)]
+
+
+def _connect(db_path: str):
+    conn = sqlite3.connect(db_path, isolation_level=None) # Transactions are explicit (BEGIN IMMEDIATE)
+    conn.execute(f"PRAGMA busy_timeout = {BUSY_TIMEOUT_MS}")
+    conn.execute("PRAGMA foreign_keys = ON")
+    conn.executescript(BOOKKEEPING_SQL)
+    return conn
+
+
+def _applied(conn) -> dict:
+    return {row[0]: {'checksum': row[1], 'applied_at': row[2], 'duration_ms': row[3]}
+            for row in conn.execute("SELECT version, checksum, applied_at, duration_ms FROM schema_migrations")}
+
+
+def _acquire_lock(conn, owner: str, wait: float) -> bool:
+    deadline = time.monotonic() + wait
+    while True:
+        try:
+            conn.execute("INSERT INTO schema_migrations_lock (id, owner) VALUES (1, ?)", (owner,))
+            return True
+        except sqlite3.IntegrityError:
+            if time.monotonic() >= deadline:
+                return False
+            time.sleep(0.5)
+
+
+def _apply(conn, migration: Migration, batch_size: int, pause_ms: int, log):
+    started = time.perf_counter()
+    record = "INSERT INTO schema_migrations (version, name, checksum, duration_ms) VALUES (?, ?, ?, ?)"
+    if migration.background:
+        migration.module.upgrade(MigrationContext(conn, migration, False, batch_size, pause_ms, log))
+        conn.execute(record, (migration.version, migration.name, migration.checksum,
+                              round((time.perf_counter() - started) * 1000, 1)))
+        conn.execute("DELETE FROM schema_migration_progress WHERE version = ?", (migration.version,))
+        return
+
+    try:
+        if migration.kind == 'sql':
+            # executescript() commits a transaction that is already open, so the script opens its own
+            conn.executescript("BEGIN IMMEDIATE;\n" + migration.source.decode('utf-8'))
+        else:
+            conn.execute("BEGIN IMMEDIATE")
+            migration.module.upgrade(MigrationContext(conn, migration, True, batch_size, pause_ms, log))
+        conn.execute(record, (migration.version, migration.name, migration.checksum,
+                              round((time.perf_counter() - started) * 1000, 1)))
+        conn.execute("COMMIT")
+    except Exception:
+        if conn.in_transaction:
+            conn.execute("ROLLBACK")
+        raise
+
+
+def upgrade(db_path: str, migrations_dir: str = DEFAULT_MIGRATIONS_DIR, target: int = None,
+            include_background: bool = True, batch_size: int = DEFAULT_BATCH_SIZE,
+            pause_ms: int = DEFAULT_BATCH_PAUSE_MS, lock_wait: float = DEFAULT_LOCK_WAIT, log=logger.info) -> list:
+    """
+    Applies pending migrations up to target (default: all). With include_background=False
+    (app start-up) background migrations, and everything after them, are left pending.
+    Returns the labels of the migrations applied.
+    """
+    migrations = [m for m in discover_migrations(migrations_dir) if target is None or m.version <= target]
+    conn = _connect(db_path)
+    owner = f"{socket.gethostname()}:{os.getpid()}"
+    try:
+        pending = [m for m in migrations if m.version not in _applied(conn)]
+        if not pending:
+            return []
+        if not _acquire_lock(conn, owner, lock_wait):
+            holder = conn.execute("SELECT owner, acquired_at FROM schema_migrations_lock").fetchone()
+            if holder and not include_background:
+                # App start-up while `flask db upgrade` runs (possibly a long backfill): don't block the worker
+                logger.warning(f"Migrations are being applied by {holder[0]}; starting without waiting.")
+                return []
+            raise MigrationError(f"Another migration run holds the lock ({holder[0]} since {holder[1]} UTC); "
+                                 f"if that process is gone, release it with `flask db unlock`.")
+        applied_now = []
+        try:
+            for migration in migrations:
+                if migration.version in _applied(conn): # Re-read: another process may have applied it while we waited
+                    continue
+                if migration.background and not include_background:
+                    remaining = [m.label for m in migrations if m.version >= migration.version and m.version not in _applied(conn)]
+                    logger.warning(f"Background migration {migration.label} is pending; run `flask db upgrade` "
+                                   f"(pending: {', '.join(remaining)}).")
+                    break
+                log(f"Applying migration {migration.label}{' (background)' if migration.background else ''}...")
+                try:
+                    _apply(conn, migration, batch_size, pause_ms, log)
+                except Exception as e:
+                    raise MigrationError(f"Migration {migration.label} failed: {e}") from e
+                applied_now.append(migration.label)
+        finally:
+            conn.execute("DELETE FROM schema_migrations_lock WHERE owner = ?", (owner,))
+        return applied_now
+    finally:
+        conn.close()
+
+
+def status(db_path: str, migrations_dir: str = DEFAULT_MIGRATIONS_DIR) -> list:
+    """One dict per migration file (and per applied version whose file is gone): label, state, applied_at, ..."""
+    conn = _connect(db_path)
+    try:
+        applied = _applied(conn)
+        progress = {}
+        for version, step, last_rowid, rows_done in conn.execute(
+                "SELECT version, step, last_rowid, rows_done FROM schema_migration_progress ORDER BY version, step"):
+            progress.setdefault(version, []).append(f"{step}: {rows_done} rows, up to rowid {last_rowid}")
+        rows = []
+        migrations = discover_migrations(migrations_dir)
+        for migration in migrations:
+            record = applied.get(migration.version)
+            if record is None:
+                state = 'in progress' if migration.version in progress else 'pending'
+            else:
+                state = 'applied' if record['checksum'] == migration.checksum else 'applied (file changed since)'
+            rows.append({'label': migration.label, 'state': state, 'background': migration.background,
+                         'applied_at': record and record['applied_at'], 'duration_ms': record and record['duration_ms'],
+                         'progress': progress.get(migration.version, [])})
+        known = {m.version for m in migrations}
+        for version in sorted(set(applied) - known):
+            rows.append({'label': f"{version:04d}", 'state': 'applied (file missing)', 'background': False,
+                         'applied_at': applied[version]['applied_at'], 'duration_ms': applied[version]['duration_ms'],
+                         'progress': []})
+        return rows
+    finally:
+        conn.close()
+
+
+def release_lock(db_path: str) -> bool:
+    """Removes a migration lock left behind by a process that died. Returns whether one was held."""
+    conn = _connect(db_path)
+    try:
+        return conn.execute("DELETE FROM schema_migrations_lock").rowcount > 0
+    finally:
+        conn.close()
@@ -0,0 +1,331 @@
+# models/queries.py
+"""
+Query registry: the app's filterable SELECTs, built from fixed parts.
+
+Routes used to append " AND ..." clauses and f-string column lists as they went, so the
+same page produced a differently worded statement for every filter combination and
+SQLite's per-connection statement cache kept re-preparing them. A registered Query
+renders its SQL from a declared set of filters and ORDER BY options instead:
+- filter clauses always appear in the order they were declared, so each combination of
+  active filters has exactly one SQL text (at most 2^filters x orders statements per
+  query, memoised after the first build);
+- inactive filters are left out rather than written as "(? IS NULL OR col = ?)", which
+  would keep one statement but stop SQLite from using the column's index;
+- ORDER BY only accepts one of the declared options, never caller text.
+
+INSERT/UPDATE statements are built by insert_statement()/update_statement(), which check
+column names against the table's schema and list them in schema order.
+"""
+
+import re
+from itertools import compress
+
+_IDENTIFIER_RE = re.compile(r"^[A-Za-z_][A-Za-z0-9_]*$")
+
+_registry = {}
+_table_columns = {}
+
+
+def _like(value):
+    """Parameters for a '(name LIKE ? OR admission_no LIKE ?)' search clause."""
+    return (f'%{value}%', f'%{value}%')
+
+
+class Query:
+    """A SELECT with optional filters, whitelisted orderings and optional pagination."""
+
+    def __init__(self, name: str, select: str, source: str, where: str = None, filters: dict = None,
+                 order_by: dict = None, default_order: str = None, group_by: str = None, count: str = "COUNT(*)"):
+        """
+        Args:
+            name (str): Registry name, e.g. 'students.list'.
+            select (str): Column list after SELECT.
+            source (str): FROM clause with its joins.
+            where (str): Condition that always applies (optional); its parameters are build()'s positional arguments.
+            filters (dict): {filter name: clause with ? placeholders} or {filter name: (clause, to_params)},
+                where to_params turns the filter value into the clause's parameters. Declaration order
+                is the order the clauses appear in.
+            order_by (dict): {order name: ORDER BY terms}.
+            default_order (str): Order used when none is given (the first one if omitted).
+            group_by (str): GROUP BY terms (optional).
+            count (str): Expression selected by count queries.
+        """
+        self.name = name
+        self.select = select.strip()
+        self.source = source.strip()
+        self.where = where
+        self.filters = {}
+        for filter_name, spec in (filters or {}).items():
+            clause, to_params = spec if isinstance(spec, tuple) else (spec, None)
+            self.filters[filter_name] = (clause, to_params or (lambda value: (value,)))
+        self.order_by = dict(order_by or {})
+        self.default_order = default_order or next(iter(self.order_by), None)
+        self.group_by = group_by
+        self.count = count
+        self._sql = {} # {(active filter flags, order, count, paginated): SQL text}
+
+    def __repr__(self):
+        return f"<Query {self.name}>"
+
+    @property
+    def max_statements(self) -> int:
+        """Upper bound of distinct SQL texts this query can produce (plain and paginated per order, one count)."""
+        return 2 ** len(self.filters) * (2 * max(1, len(self.order_by)) + 1)
+
+    def build(self, *args, order: str = None, limit: int = None, offset: int = None, count: bool = False, **filters):
+        """
+        Returns (sql, params): args (the parameters of `where`) followed by those of the active
+        filters. Filters whose value is None or '' are left out.
+        A limit adds LIMIT ? OFFSET ? (offset 0 if not given); count=True selects only self.count.
+
+        Raises:
+            ValueError: for a filter or order that was not declared.
+        """
+        unknown = set(filters) - set(self.filters)
+        if unknown:
+            raise ValueError(f"Unknown filter(s) for {self.name}: {', '.join(sorted(unknown))}")
+        order = order or self.default_order
+        if order is not None and order not in self.order_by:
+            raise ValueError(f"Unknown order for {self.name}: {order!r}")
+
+        active = tuple(filters.get(filter_name) not in (None, '') for filter_name in self.filters)
+        paginated = limit is not None and not count
+        key = (active, None if count else order, count, paginated)
+        sql = self._sql.get(key)
+        if sql is None:
+            sql = self._sql[key] = self._render(active, order, count, paginated)
+
+        params = list(args)
+        for (filter_name, (_, to_params)), is_active in zip(self.filters.items(), active):
+            if is_active:
+                params.extend(to_params(filters[filter_name]))
+        if paginated:
+            params.extend((limit, offset or 0))
+        return sql, tuple(params)
+
+    def _render(self, active, order, count, paginated) -> str:
+        conditions = [self.where] if self.where else []
+        conditions.extend(clause for clause, _ in compress(self.filters.values(), active))
+        parts = [f"SELECT {self.count if count else self.select}", f"FROM {self.source}"]
+        if conditions:
+            parts.append("WHERE " + " AND ".join(conditions))
+        if self.group_by:
+            parts.append(f"GROUP BY {self.group_by}")
+        if order is not None and not count:
+            parts.append(f"ORDER BY {self.order_by[order]}")
+        if paginated:
+            parts.append("LIMIT ? OFFSET ?")
+        return "\n".join(parts)
+
+    def resolve_order(self, order: str) -> str:
+        """
+        Order name for order, which may also be the SQL of a declared option (older callers
+        passed e.g. "s.admission_no ASC"). Raises ValueError for anything else.
+        """
+        if order in self.order_by:
+            return order
+        for order_name, terms in self.order_by.items():
+            if " ".join(order.split()).lower() == " ".join(terms.split()).lower():
+                return order_name
+        raise ValueError(f"Unknown order for {self.name}: {order!r}")
+
+
+def register(query: Query) -> Query:
+    """Adds query to the registry (names are unique) and returns it."""
+    if query.name in _registry:
+        raise ValueError(f"Query {query.name!r} is already registered")
+    _registry[query.name] = query
+    return query
+
+
+def get_query(name: str) -> Query:
+    """Registered query by name. Raises KeyError for unknown names."""
+    return _registry[name]
+
+
+def registered_queries() -> dict:
+    """{name: Query} of every registered query."""
+    return dict(_registry)
+
+
+def max_registered_statements() -> int:
+    """Distinct SQL texts the registered queries can produce; what SQLITE_CACHED_STATEMENTS should cover."""
+    return sum(query.max_statements for query in _registry.values())
+
+
+# ---------------------------------------------------------------------------
+# INSERT / UPDATE
+# ---------------------------------------------------------------------------
+
+def table_columns(table: str) -> tuple:
+    """Column names of table in schema order (read once per process; migrations run at startup)."""
+    columns = _table_columns.get(table)
+    if columns is None:
+        if not _IDENTIFIER_RE.match(table):
+            raise ValueError(f"Invalid table name: {table!r}")
+        from models.db_pool import db_manager
+        columns = tuple(row[1] for row in db_manager.get_db().execute(f"PRAGMA table_info({table})"))
+        if not columns:
+            raise ValueError(f"Unknown table: {table!r}")
+        _table_columns[table] = columns
+    return columns
+
+
+def _ordered_columns(table: str, data: dict) -> list:
+    columns = table_columns(table)
+    unknown = set(data) - set(columns)
+    if unknown:
+        raise ValueError(f"Unknown column(s) for {table}: {', '.join(sorted(unknown))}")
+    return [column for column in columns if column in data]
+
+
+def insert_statement(table: str, data: dict):
+    """(sql, params) inserting data ({column: value}) into table, columns in schema order."""
+    columns = _ordered_columns(table, data)
+    sql = f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))})"
+    return sql, tuple(data[column] for column in columns)
+
+
+def update_statement(table: str, data: dict, row_id):
+    """(sql, params) updating the given columns of the row with id row_id, columns in schema order."""
+    columns = _ordered_columns(table, data)
+    if not columns:
+        raise ValueError(f"Nothing to update in {table}")
+    sql = f"UPDATE {table} SET {', '.join(f'{column} = ?' for column in columns)} WHERE id = ?"
+    return sql, tuple(data[column] for column in columns) + (row_id,)
+
+
+# ---------------------------------------------------------------------------
+# Registered queries
+# ---------------------------------------------------------------------------
+
+_STUDENT_JOINS = """students s
+    JOIN courses c ON s.course_id = c.id
+    JOIN academic_years ay ON s.academic_year_id = ay.id"""
+
+_STUDENT_FILTERS = {
+    'course_id': "s.course_id = ?",
+    'academic_year_id': "s.academic_year_id = ?",
+}
+
+_STUDENT_SEARCH = ("(s.student_name LIKE ? OR s.admission_no LIKE ?)", _like)
+
+STUDENT_LIST = register(Query(
+    'students.list',
+    select="s.id, s.admission_no, s.student_name, s.surname, s.father_name, c.course_code, ay.academic_year",
+    source=_STUDENT_JOINS,
+    filters={'search': _STUDENT_SEARCH, **_STUDENT_FILTERS},
+    order_by={'surname': "s.surname ASC, s.student_name ASC"},
+    count="COUNT(s.id) AS count",
+))
+
+ALL_STUDENTS = register(Query(
+    'students.all',
+    select="s.*, c.course_name, c.course_full_name, c.course_code, ay.academic_year",
+    source=_STUDENT_JOINS,
+    filters=_STUDENT_FILTERS,
+    order_by={
+        'admission_no': "s.admission_no ASC",
+        'surname': "s.surname ASC, s.student_name ASC",
+        'student_name': "s.student_name ASC, s.surname ASC",
+        'date_of_admission': "s.date_of_admission ASC, s.admission_no ASC",
+        'course': "c.course_name ASC, s.admission_no ASC",
+    },
+))
+
+STUDENTS_WITHOUT_TC = register(Query(
+    'students.without_tc',
+    select="s.id, s.student_name, s.admission_no, c.course_name, ay.academic_year",
+    source=_STUDENT_JOINS,
+    where="s.id NOT IN (SELECT student_id FROM transfer_certificates)",
+    filters=_STUDENT_FILTERS,
+    order_by={'student_name': "s.student_name"},
+))
+
+# Report queries select exactly the fields of their record class (models/records.py), in order
+ADMISSION_REGISTER = register(Query(
+    'reports.admission_register',
+    select="""s.admission_no, s.student_name, s.father_name, s.address1, s.address2, s.address3, s.town,
+    s.phone_no, s.aadhar_no, s.caste, s.sub_caste, s.religion, s.dob, s.previous_college, s.old_tc_no_date,
+    s.date_of_admission, s.remarks""",
+    source=_STUDENT_JOINS,
+    filters=_STUDENT_FILTERS,
+    order_by={'admission_no': "s.admission_no ASC"},
+))
+
+TC_ISSUED_REPORT = register(Query(
+    'reports.tc_issued',
+    select="""tc.tc_number, tc.issue_date, s.student_name, s.admission_no, s.date_of_leaving,
+    s.date_of_admission, c.course_name, ay.academic_year""",
+    source="""transfer_certificates tc
+    JOIN students s ON tc.student_id = s.id
+    JOIN courses c ON s.course_id = c.id
+    JOIN academic_years ay ON s.academic_year_id = ay.id""",
+    filters=_STUDENT_FILTERS,
+    order_by={'issue_date': "tc.issue_date ASC, tc.tc_number ASC"},
+))
+
+_PAYMENT_JOINS = """student_fee_payments p
+    JOIN students s ON p.student_id = s.id
+    JOIN courses c ON s.course_id = c.id
+    JOIN academic_years ay ON s.academic_year_id = ay.id"""
+
+FEE_PAYMENTS_REPORT = register(Query(
+    'reports.fee_payments',
+    select="""p.payment_date, p.amount_paid, p.transaction_id, p.payment_method,
+    s.admission_no, s.student_name, c.course_name, ay.academic_year""",
+    source=_PAYMENT_JOINS,
+    filters=_STUDENT_FILTERS,
+    order_by={'payment_date': "p.payment_date ASC, s.admission_no ASC"},
+))
+
+FEE_PAYMENTS = register(Query(
+    'fees.payments',
+    select="p.*, s.student_name, s.admission_no, c.course_name, ay.academic_year",
+    source=_PAYMENT_JOINS,
+    filters={
+        'search': _STUDENT_SEARCH,
+        **_STUDENT_FILTERS,
+        'start_date': "p.payment_date >= ?",
+        'end_date': "p.payment_date <= ?",
+    },
+    order_by={'latest': "p.payment_date DESC, p.id DESC"},
+))
+
+STUDENT_FEE_PAYMENTS = register(Query(
+    'fees.student_payments',
+    select="*",
+    source="student_fee_payments",
+    where="student_id = ?",
+    filters={
+        'start_date': "payment_date >= ?",
+        'end_date': "payment_date <= ?",
+    },
+    order_by={'latest': "payment_date DESC"},
+))
+
+_FEE_SUMMARY_SOURCE = _STUDENT_JOINS + """
+    LEFT JOIN fee_structure fs ON s.fee_structure_id = fs.id
+    LEFT JOIN student_fee_payments p ON s.id = p.student_id"""
+_FEE_SUMMARY_GROUP_BY = "s.id, s.student_name, s.surname, s.admission_no, c.course_name, ay.academic_year, fs.total_fee"
+_FEE_SUMMARY_ORDER = {'course': "c.course_name, ay.academic_year, s.student_name, s.surname"}
+
+FEE_SUMMARY = register(Query(
+    'fees.summary',
+    select="""s.id AS student_id, s.student_name, s.surname, s.admission_no, c.course_name, ay.academic_year,
+    fs.total_fee, COALESCE(SUM(p.amount_paid), 0) AS total_paid""",
+    source=_FEE_SUMMARY_SOURCE,
+    filters={**_STUDENT_FILTERS, 'search': _STUDENT_SEARCH},
+    group_by=_FEE_SUMMARY_GROUP_BY,
+    order_by=_FEE_SUMMARY_ORDER,
+))
+
+FEE_SUMMARY_REPORT = register(Query(
+    'reports.fee_summary',
+    select="""s.id AS student_id, s.student_name, s.surname, s.admission_no, c.course_name, ay.academic_year,
+    COALESCE(fs.total_fee, 0) AS total_fee, COALESCE(SUM(p.amount_paid), 0) AS total_paid""",
+    source=_FEE_SUMMARY_SOURCE,
+    filters=_STUDENT_FILTERS,
+    group_by=_FEE_SUMMARY_GROUP_BY,
+    order_by=_FEE_SUMMARY_ORDER,
+))
@@ -0,0 +1,315 @@
+# models/query_stats.py
+"""
+Query instrumentation for the SQLite layer.
+
+Connections opened by DatabaseManager hand out InstrumentedCursor objects, so every
+statement run through execute_query() or a get_db_cursor() block is timed (execute
+plus fetches), its rows counted and its normalised fingerprint aggregated here.
+
+- Per-process aggregates by fingerprint: get_query_stats() / reset_query_stats().
+- Slow queries (SLOW_QUERY_THRESHOLD_MS) are logged with their EXPLAIN QUERY PLAN.
+- Per-request totals (query count, DB time) are kept on `g`, see get_request_query_summary().
+- N+1 detection (NPLUSONE_DETECTION, on in development): a fingerprint run more than
+  NPLUSONE_THRESHOLD times in one request or job is logged with the code that ran it.
+- count_queries() collects every statement run inside a block, for query budgets in tests.
+"""
+
+import os
+import re
+import sqlite3
+import threading
+import time
+import traceback
+from contextlib import contextmanager
+from functools import wraps
+from flask import current_app, g, request, has_app_context
+from utils.metrics import inc_counter, observe
+
+DEFAULT_SLOW_QUERY_THRESHOLD_MS = 200
+DEFAULT_NPLUSONE_THRESHOLD = 5 # Same fingerprint this many times in one request/job is fine; more is reported
+MAX_CALL_SITES = 3 # Distinct call sites remembered per fingerprint for N+1 reports
+
+_PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+_THIS_FILE = os.path.abspath(__file__)
+# Frames in these files are DB plumbing, not the code responsible for a query.
+_DB_LAYER_FILES = {_THIS_FILE, os.path.join(_PROJECT_ROOT, 'models', 'db_pool.py'),
+                   os.path.join(_PROJECT_ROOT, 'models', 'identity_map.py')}
+
+# Aggregated statistics: {'fingerprint': {'count', 'total_ms', 'max_ms', 'rows', 'example'}}
+_query_stats = {}
+_query_stats_lock = threading.Lock()
+
+# Active count_queries() collectors (lists of fingerprints), fed by every recorded query.
+_collectors = []
+
+# Normalisation rules, applied in order, turning literal values into placeholders.
+_COMMENT_RE = re.compile(r"--[^\n]*|/\*.*?\*/", re.DOTALL)
+_STRING_RE = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_RE = re.compile(r"(?<![\w.])-?\d+(?:\.\d+)?\b")
+_IN_LIST_RE = re.compile(r"\bin\s*\(\s*\?(?:\s*,\s*\?)*\s*\)", re.IGNORECASE)
+_VALUES_RE = re.compile(r"\bvalues\s*\(\s*\?(?:\s*,\s*\?)*\s*\)(?:\s*,\s*\(\s*\?(?:\s*,\s*\?)*\s*\))*", re.IGNORECASE)
+_WHITESPACE_RE = re.compile(r"\s+")
+
+
+def fingerprint_query(sql: str) -> str:
+    """
+    Normalises a SQL string so that queries differing only in literal values,
+    IN-list length or whitespace share one fingerprint.
+    """
+    normalised = _COMMENT_RE.sub(" ", sql)
+    normalised = _STRING_RE.sub("?", normalised)
+    normalised = _NUMBER_RE.sub("?", normalised)
+    normalised = _IN_LIST_RE.sub("IN (...)", normalised)
+    normalised = _VALUES_RE.sub("VALUES (...)", normalised)
+    return _WHITESPACE_RE.sub(" ", normalised).strip().lower()
+
+
+def _record(sql: str, duration_ms: float, rows: int):
+    fingerprint = fingerprint_query(sql)
+    with _query_stats_lock:
+        stats = _query_stats.get(fingerprint)
+        if stats is None:
+            stats = _query_stats[fingerprint] = {
+                'count': 0, 'total_ms': 0.0, 'max_ms': 0.0, 'rows': 0,
+                # Comments dropped: on one line a '--' comment would swallow the rest of the statement
+                'example': _WHITESPACE_RE.sub(" ", _COMMENT_RE.sub(" ", sql)).strip(),
+            }
+        stats['count'] += 1
+        stats['total_ms'] += duration_ms
+        stats['max_ms'] = max(stats['max_ms'], duration_ms)
+        stats['rows'] += rows
+
+    statement = fingerprint.split(" ", 1)[0] or 'other'
+    inc_counter('satcms_db_queries_total', {'statement': statement})
+    observe('satcms_db_query_duration_seconds', duration_ms / 1000, {'statement': statement})
+
+    for collector in list(_collectors):
+        collector.append(fingerprint)
+
+    if has_app_context():
+        g._query_count = g.get('_query_count', 0) + 1
+        g._query_time_ms = g.get('_query_time_ms', 0.0) + duration_ms
+        if current_app.config.get('NPLUSONE_DETECTION'):
+            _track_repeated_query(fingerprint)
+    return fingerprint
+
+
+def get_query_stats(sort_by: str = 'total_ms', limit: int = None) -> list:
+    """Returns the aggregated per-fingerprint statistics, heaviest first."""
+    with _query_stats_lock:
+        rows = [dict(stats, fingerprint=fp, avg_ms=stats['total_ms'] / stats['count'])
+                for fp, stats in _query_stats.items()]
+    rows.sort(key=lambda row: row[sort_by], reverse=True)
+    return rows[:limit] if limit else rows
+
+
+def reset_query_stats():
+    """Clears the aggregated statistics (e.g. before a benchmark run)."""
+    with _query_stats_lock:
+        _query_stats.clear()
+
+
+def get_request_query_summary() -> dict:
+    """Query count and total DB time (ms) for the current request or app context."""
+    return {
+        'queries': g.get('_query_count', 0),
+        'db_time_ms': round(g.get('_query_time_ms', 0.0), 2),
+    }
+
+
+# --- N+1 detection ---
+
+def _call_site() -> str:
+    """The innermost project frame outside the DB layer, i.e. the code that issued the query."""
+    for frame in reversed(traceback.extract_stack()):
+        filename = os.path.abspath(frame.filename)
+        if filename.startswith(_PROJECT_ROOT) and filename not in _DB_LAYER_FILES:
+            return f"{os.path.relpath(filename, _PROJECT_ROOT)}:{frame.lineno} in {frame.name}"
+    return "(unknown)"
+
+
+def _track_repeated_query(fingerprint: str):
+    tracker = g.get('_nplusone')
+    if tracker is None:
+        tracker = g._nplusone = {'counts': {}, 'sites': {}}
+    tracker['counts'][fingerprint] = tracker['counts'].get(fingerprint, 0) + 1
+    sites = tracker['sites'].setdefault(fingerprint, [])
+    if len(sites) < MAX_CALL_SITES:
+        site = _call_site()
+        if site not in sites:
+            sites.append(site)
+
+
+def report_repeated_queries(context: str) -> list:
+    """
+    Logs every fingerprint run more than NPLUSONE_THRESHOLD times since tracking started
+    (the current request, or the enclosing detect_n_plus_one() job) and returns them.
+    """
+    tracker = g.get('_nplusone')
+    if not tracker:
+        return []
+    threshold = current_app.config.get('NPLUSONE_THRESHOLD', DEFAULT_NPLUSONE_THRESHOLD)
+    offenders = [(fp, count) for fp, count in tracker['counts'].items() if count > threshold]
+    for fingerprint, count in offenders:
+        current_app.logger.warning(
+            f"Possible N+1 in {context}: query ran {count} times: {fingerprint}\n"
+            f"Called from: {'; '.join(tracker['sites'][fingerprint])}"
+        )
+    return offenders
+
+
+@contextmanager
+def n_plus_one_scope(job: str):
+    """Tracks repeated queries of a job (bulk import, regeneration, report) separately and reports on exit."""
+    outer = g.pop('_nplusone', None)
+    try:
+        yield
+    finally:
+        if current_app.config.get('NPLUSONE_DETECTION'):
+            report_repeated_queries(f"job '{job}'")
+        if outer is not None:
+            g._nplusone = outer
+        else:
+            g.pop('_nplusone', None)
+
+
+def detect_n_plus_one(job: str):
+    """Decorator form of n_plus_one_scope()."""
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            with n_plus_one_scope(job):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+@contextmanager
+def count_queries():
+    """
+    Collects the fingerprint of every statement run inside the block (any request or
+    thread of this process), e.g. to enforce a query budget in tests:
+
+        with count_queries() as queries:
+            client.get('/students/list')
+        assert len(queries) <= 10
+    """
+    collected = []
+    _collectors.append(collected)
+    try:
+        yield collected
+    finally:
+        _collectors.remove(collected)
+
+
+def _explain(connection, sql, params) -> str:
+    """Returns the EXPLAIN QUERY PLAN output as indented text (best effort)."""
+    try:
+        # connection.execute() uses a plain cursor, so the EXPLAIN itself isn't instrumented.
+        plan = connection.execute(f"EXPLAIN QUERY PLAN {sql}", params).fetchall()
+    except sqlite3.Error as e:
+        return f"(EXPLAIN unavailable: {e})"
+    depth = {0: 0}
+    lines = []
+    for row in plan:
+        node_id, parent_id, detail = row[0], row[1], row[3]
+        depth[node_id] = depth.get(parent_id, 0) + 1
+        lines.append("  " * depth[node_id] + detail)
+    return "\n".join(lines)
+
+
+class InstrumentedCursor(sqlite3.Cursor):
+    """
+    sqlite3 cursor that times each statement, including the fetches that step through
+    its rows. A statement is recorded when the next one starts or the cursor is closed.
+    """
+
+    _pending = None # [sql, params, elapsed_seconds, rows]
+
+    def execute(self, sql, parameters=()):
+        self._finish_pending()
+        started = time.perf_counter()
+        try:
+            return super().execute(sql, parameters)
+        finally:
+            self._pending = [sql, parameters, time.perf_counter() - started, 0]
+
+    def executemany(self, sql, seq_of_parameters):
+        self._finish_pending()
+        started = time.perf_counter()
+        try:
+            return super().executemany(sql, seq_of_parameters)
+        finally:
+            self._pending = [sql, None, time.perf_counter() - started, max(self.rowcount, 0)]
+
+    def _timed_fetch(self, fetch, *args):
+        started = time.perf_counter()
+        result = fetch(*args)
+        if self._pending is not None:
+            self._pending[2] += time.perf_counter() - started
+            if isinstance(result, list):
+                self._pending[3] += len(result)
+            elif result is not None:
+                self._pending[3] += 1
+        return result
+
+    def fetchone(self):
+        return self._timed_fetch(super().fetchone)
+
+    def fetchmany(self, size=None):
+        return self._timed_fetch(super().fetchmany, size if size is not None else self.arraysize)
+
+    def fetchall(self):
+        return self._timed_fetch(super().fetchall)
+
+    def __next__(self):
+        return self._timed_fetch(super().__next__)
+
+    def close(self):
+        self._finish_pending()
+        super().close()
+
+    def _finish_pending(self):
+        pending, self._pending = self._pending, None
+        if pending is None:
+            return
+        sql, params, elapsed, rows = pending
+        if rows == 0 and self.rowcount > 0:
+            rows = self.rowcount # Rows affected by INSERT/UPDATE/DELETE
+        duration_ms = elapsed * 1000
+        fingerprint = _record(sql, duration_ms, rows)
+
+        if not has_app_context():
+            return
+        threshold = current_app.config.get('SLOW_QUERY_THRESHOLD_MS', DEFAULT_SLOW_QUERY_THRESHOLD_MS)
+        if threshold is not None and duration_ms >= threshold:
+            plan = _explain(self.connection, sql, params) if params is not None else "(executemany; not explained)"
+            current_app.logger.warning(
+                f"Slow query ({duration_ms:.1f}ms, {rows} rows): {fingerprint}\n"
+                f"Args: {params}\nQuery plan:\n{plan}"
+            )
+
+
+def init_query_instrumentation(app):
+    """
+    Logs a per-request summary (query count, DB time) when LOG_REQUEST_QUERY_SUMMARY is on,
+    and repeated-query (N+1) reports when NPLUSONE_DETECTION is on.
+    """
+    if app.config.get('NPLUSONE_DETECTION'):
+        @app.after_request
+        def _report_repeated_queries(response):
+            report_repeated_queries(f"{request.method} {request.path}")
+            return response
+
+    if not app.config.get('LOG_REQUEST_QUERY_SUMMARY'):
+        return
+
+    @app.after_request
+    def _log_request_query_summary(response):
+        summary = get_request_query_summary()
+        if summary['queries']:
+            app.logger.info(
+                f"{request.method} {request.path} -> {response.status_code}: "
+                f"{summary['queries']} queries, {summary['db_time_ms']}ms DB time"
+            )
+        return response
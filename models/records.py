@@ -0,0 +1,118 @@
+# models/records.py
+"""
+Compact row records for reports.
+
+A report holds all of its rows in memory while it builds the CSV or document, and the
+report code used to turn each sqlite3.Row of `SELECT s.*` into a dict: a hash table of
+40+ columns per student, most of which the report never prints. Each class here lists
+the columns one report uses. Its query in models/queries.py selects exactly those,
+in the same order, and db_manager.fetch_records() builds the records straight from the
+cursor, with no sqlite3.Row and no dict per row. The classes are slotted dataclasses,
+so a record is a fixed array of field references with no per-instance __dict__.
+
+Records still answer record['field'] and record.get('field', default) like the dicts
+the report code used, so templates and helpers work with either.
+"""
+
+from dataclasses import dataclass
+from typing import Optional
+
+
+class Record:
+    """Base of the record classes: mapping-style access on top of the slots."""
+
+    __slots__ = ()
+
+    @classmethod
+    def fields(cls) -> tuple:
+        return cls.__slots__
+
+    @classmethod
+    def check_columns(cls, description):
+        """Raises ValueError unless a cursor's columns are this record's fields, in order."""
+        columns = tuple(column[0] for column in description)
+        if columns != cls.__slots__:
+            raise ValueError(f"{cls.__name__} expects columns {cls.__slots__}, the query returned {columns}")
+
+    def get(self, key, default=None):
+        return getattr(self, key) if key in self.__slots__ else default
+
+    def __getitem__(self, key):
+        if key not in self.__slots__:
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def keys(self):
+        return self.__slots__
+
+
+@dataclass(slots=True)
+class AdmissionRegisterRecord(Record):
+    """One student in the admission register (PDF and CSV)."""
+    admission_no: str
+    student_name: str
+    father_name: Optional[str]
+    address1: Optional[str]
+    address2: Optional[str]
+    address3: Optional[str]
+    town: Optional[str]
+    phone_no: Optional[str]
+    aadhar_no: Optional[str]
+    caste: Optional[str]
+    sub_caste: Optional[str]
+    religion: Optional[str]
+    dob: Optional[str]
+    previous_college: Optional[str]
+    old_tc_no_date: Optional[str]
+    date_of_admission: Optional[str]
+    remarks: Optional[str]
+
+
+@dataclass(slots=True)
+class FeePaymentReportRecord(Record):
+    """One payment in the fee collection report."""
+    payment_date: str
+    amount_paid: float
+    transaction_id: Optional[str]
+    payment_method: Optional[str]
+    admission_no: str
+    student_name: str
+    course_name: str
+    academic_year: str
+
+
+@dataclass(slots=True)
+class TcIssuedRecord(Record):
+    """One transfer certificate in the TC issued report."""
+    tc_number: str
+    issue_date: str
+    student_name: str
+    admission_no: str
+    date_of_leaving: Optional[str]
+    date_of_admission: Optional[str]
+    course_name: str
+    academic_year: str
+
+
+@dataclass(slots=True)
+class FeeSummaryRecord(Record):
+    """One student's fee, paid total and course in the fee summary report."""
+    student_id: int
+    student_name: str
+    surname: Optional[str]
+    admission_no: str
+    course_name: str
+    academic_year: str
+    total_fee: float
+    total_paid: float
+
+
+@dataclass(slots=True)
+class FeeHistoryRecord(Record):
+    """One payment in a student's fee history PDF, with the fee of its structure."""
+    payment_date: str
+    amount_paid: float
+    payment_method: Optional[str]
+    transaction_id: Optional[str]
+    remarks: Optional[str]
+    total_fee: Optional[float]
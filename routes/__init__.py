@@ -9,6 +9,7 @@ from .academic_years import academic_years_bp
 from .fees import fees_bp
 from .tc import tc_bp
 from .reports import reports_bp
+from .monitoring import monitoring_bp
 
 __all__ = [
     'students_bp',
@@ -16,5 +17,6 @@ __all__ = [
     'academic_years_bp',
     'fees_bp',
     'tc_bp',
-    'reports_bp'
+    'reports_bp',
+    'monitoring_bp'
 ]
@@ -3,11 +3,13 @@ from models.db_pool import db_manager, get_academic_years
 from utils.auth_helpers import admin_required
 from utils.validators import validate_academic_year_format # Import validate_academic_year_format
 from utils.caching import cache_manager, clear_cache # Import cache_manager and clear_cache
+from utils.http_caching import conditional
 
 academic_years_bp = Blueprint('academic_years', __name__)
 
 @academic_years_bp.route('/')
 @admin_required
+@conditional('academic_years')
 def list_academic_years():
     """Displays a list of all academic years."""
     years = get_academic_years()
@@ -46,7 +48,7 @@ def add_academic_year():
 @admin_required
 def edit_academic_year(year_id):
     """Handles editing an existing academic year."""
-    year = db_manager.execute_query("SELECT * FROM academic_years WHERE id = ?", (year_id,), fetch_one=True)
+    year = db_manager.academic_years.get(year_id)
     if not year:
         flash('Academic year not found.', 'danger')
         return redirect(url_for('academic_years.list_academic_years'))
@@ -3,6 +3,7 @@ from models.db_pool import db_manager, get_courses
 from utils.auth_helpers import admin_required
 from utils.validators import validate_course_data, ValidationError # Import validate_course_data, ValidationError
 from utils.caching import clear_cache # Import clear_cache (assuming cache_manager is not directly used here)
+from utils.http_caching import conditional
 
 # Helper function to flash validation errors consistently
 def _flash_validation_errors(validation_error):
@@ -13,6 +14,7 @@ courses_bp = Blueprint('courses', __name__)
 
 @courses_bp.route('/')
 @admin_required
+@conditional('courses')
 def list_courses():
     """Displays a list of all courses."""
     courses = get_courses()
@@ -64,7 +66,7 @@ def add_course():
 @admin_required
 def edit_course(course_id):
     """Handles editing an existing course."""
-    course = db_manager.execute_query("SELECT * FROM courses WHERE id = ?", (course_id,), fetch_one=True)
+    course = db_manager.courses.get(course_id)
     if not course:
         flash('Course not found.', 'danger')
         return redirect(url_for('courses.list_courses'))
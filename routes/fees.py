@@ -1,7 +1,11 @@
 from flask import Blueprint, render_template, request, redirect, url_for, flash, make_response, current_app, send_from_directory
 from models.db_pool import db_manager, get_student_by_id, get_courses, get_academic_years
+from models.queries import FEE_PAYMENTS, FEE_SUMMARY, STUDENT_FEE_PAYMENTS
+from models.query_stats import n_plus_one_scope
+from models.records import FeeHistoryRecord
 from utils.auth_helpers import admin_required
-from utils.pdf_utils import ReportGenerator # Import ReportGenerator
+from utils.caching import cached
+from utils.http_caching import conditional
 from datetime import datetime, date # Import date
 import sqlite3
 import os # For path operations
@@ -29,23 +33,8 @@ def view_student_fees(student_id):
         flash('Student not found.', 'danger')
         return redirect(url_for('students.list_students'))
 
-    query = "SELECT * FROM student_fee_payments WHERE student_id = ?"
-    params = [student_id]
-    conditions = []
-
-    if start_date_filter:
-        conditions.append("payment_date >= ?")
-        params.append(start_date_filter)
-    if end_date_filter:
-        conditions.append("payment_date <= ?")
-        params.append(end_date_filter)
-
-    if conditions:
-        query += " AND " + " AND ".join(conditions)
-    
-    query += " ORDER BY payment_date DESC"
-        
-    fee_records = db_manager.execute_query(query, tuple(params), fetch_all=True)
+    query, params = STUDENT_FEE_PAYMENTS.build(student_id, start_date=start_date_filter, end_date=end_date_filter)
+    fee_records = db_manager.execute_query(query, params, fetch_all=True)
     total_paid = sum(r['amount_paid'] for r in fee_records) if fee_records else 0
 
     return render_template('fees/view_student_fees.html', student=student, fee_records=fee_records, total_paid=total_paid,
@@ -144,27 +133,16 @@ def record_payment(student_id):
 @fees_bp.route('/select-student/record-payment', methods=['GET'])
 @admin_required
 def select_student_to_record_payment():
-    """Page to select a student to record a fee payment, with filtering."""
+    """
+    Page to select a student to record a fee payment, with filtering.
+    Students are suggested while typing (students.api_typeahead), within the chosen filters.
+    """
     selected_course_id = request.args.get('course_id', type=int)
     selected_academic_year_id = request.args.get('academic_year_id', type=int)
-    student_query = "SELECT id, student_name, surname, admission_no FROM students"
-    conditions = []
-    params = []
-    if selected_course_id:
-        conditions.append("course_id = ?")
-        params.append(selected_course_id)
-    if selected_academic_year_id:
-        conditions.append("academic_year_id = ?")
-        params.append(selected_academic_year_id)
-    if conditions:
-        student_query += " WHERE " + " AND ".join(conditions)
-    student_query += " ORDER BY student_name, surname"
-    students = db_manager.execute_query(student_query, tuple(params), fetch_all=True)
     all_courses = get_courses()
     all_academic_years = get_academic_years()
     return render_template(
         'fees/select_student.html', 
-        students=students, 
         action_url_name='fees.record_payment', 
         action_title="Record Payment For",
         courses=all_courses,
@@ -178,14 +156,9 @@ def select_student_to_record_payment():
 @fees_bp.route('/select-student/view-history', methods=['GET'])
 @admin_required
 def select_student_to_view_fees():
-    """Page to select a student to view their fee history."""
-    students = db_manager.execute_query(
-        "SELECT id, student_name, surname, admission_no FROM students ORDER BY student_name, surname",
-        fetch_all=True
-    )
+    """Page to select a student to view their fee history (suggested while typing)."""
     return render_template(
         'fees/select_student.html', 
-        students=students, 
         action_url_name='fees.view_student_fees', 
         action_title="View Fee History For",
         show_filters=False
@@ -201,37 +174,10 @@ def manage_fee_payments():
     start_date_filter = request.args.get('start_date', '').strip()
     end_date_filter = request.args.get('end_date', '').strip()
 
-    query = """SELECT p.*, s.student_name, s.admission_no, c.course_name, ay.academic_year
-           FROM student_fee_payments p
-           JOIN students s ON p.student_id = s.id
-           JOIN courses c ON s.course_id = c.id
-           JOIN academic_years ay ON s.academic_year_id = ay.id
-    """
-    conditions = []
-    params = []
-
-    if search_student:
-        conditions.append("(s.student_name LIKE ? OR s.admission_no LIKE ?)")
-        params.extend([f'%{search_student}%', f'%{search_student}%'])
-    if course_id_filter:
-        conditions.append("s.course_id = ?")
-        params.append(course_id_filter)
-    if academic_year_id_filter:
-        conditions.append("s.academic_year_id = ?")
-        params.append(academic_year_id_filter)
-    if start_date_filter:
-        conditions.append("p.payment_date >= ?")
-        params.append(start_date_filter)
-    if end_date_filter:
-        conditions.append("p.payment_date <= ?")
-        params.append(end_date_filter)
-
-    if conditions:
-        query += " WHERE " + " AND ".join(conditions)
-    
-    query += " ORDER BY p.payment_date DESC, p.id DESC"
-    
-    payments = db_manager.execute_query(query, tuple(params), fetch_all=True)
+    query, params = FEE_PAYMENTS.build(search=search_student, course_id=course_id_filter,
+                                       academic_year_id=academic_year_id_filter,
+                                       start_date=start_date_filter, end_date=end_date_filter)
+    payments = db_manager.execute_query(query, params, fetch_all=True)
     all_courses = get_courses()
     all_academic_years = get_academic_years()
 
@@ -269,7 +215,7 @@ def add_fee_structure():
         else:
             updated_students_count = 0
             try:
-                with db_manager.get_db_cursor(commit=False) as cursor:
+                with db_manager.transaction() as cursor:
                     cursor.execute(
                         "INSERT INTO fee_structure (course_id, academic_year_id, total_fee) VALUES (?, ?, ?)",
                         (course_id, academic_year_id, total_fee)
@@ -282,7 +228,6 @@ def add_fee_structure():
                             (new_structure_id, course_id, academic_year_id)
                         )
                         updated_students_count = res.rowcount if res else 0
-                    cursor.connection.commit()
                 flash(f'Fee structure added successfully! {updated_students_count} unassigned student(s) linked.', 'success')
                 return redirect(url_for('fees.list_fee_structures'))
             except sqlite3.IntegrityError:
@@ -312,7 +257,7 @@ def edit_fee_structure(structure_id):
             flash('All fields are required and total fee must be non-negative.', 'danger')
         else:
             try:
-                with db_manager.get_db_cursor(commit=False) as cursor:
+                with db_manager.transaction() as cursor:
                     cursor.execute(
                         "UPDATE fee_structure SET course_id = ?, academic_year_id = ?, total_fee = ? WHERE id = ?",
                         (course_id, academic_year_id, total_fee, structure_id)
@@ -327,7 +272,6 @@ def edit_fee_structure(structure_id):
                         (structure_id, course_id, academic_year_id)
                     )
                     updated_students_count = res.rowcount if res else 0
-                    cursor.connection.commit()
                 flash(f'Fee structure updated successfully! {updated_students_count} student(s) now linked to this structure.', 'success')
                 return redirect(url_for('fees.list_fee_structures'))
             except sqlite3.IntegrityError:
@@ -343,23 +287,20 @@ def edit_fee_structure(structure_id):
 @admin_required
 def delete_fee_structure(structure_id):
     try:
-        # Unlink students before deleting the structure
-        db_manager.execute_query(
-            "UPDATE students SET fee_structure_id = NULL WHERE fee_structure_id = ?",
-            (structure_id,),
-            commit=True
-        )
-        # Now, check for payments
-        payment_linked = db_manager.execute_query(
-            "SELECT 1 FROM student_fee_payments WHERE fee_structure_id = ? LIMIT 1",
-            (structure_id,),
-            fetch_one=True
-        )
+        with db_manager.transaction() as cursor:
+            # Unlink students before deleting the structure
+            cursor.execute("UPDATE students SET fee_structure_id = NULL WHERE fee_structure_id = ?", (structure_id,))
+            # Now, check for payments
+            payment_linked = cursor.execute(
+                "SELECT 1 FROM student_fee_payments WHERE fee_structure_id = ? LIMIT 1",
+                (structure_id,)
+            ).fetchone()
+            if not payment_linked:
+                cursor.execute("DELETE FROM fee_structure WHERE id = ?", (structure_id,))
+
         if payment_linked:
             flash('Cannot delete fee structure: Payments have been recorded against it. It has been unlinked from students, but the structure itself cannot be removed.', 'danger')
             return redirect(url_for('fees.list_fee_structures'))
-
-        db_manager.execute_query("DELETE FROM fee_structure WHERE id = ?", (structure_id,), commit=True)
         flash('Fee structure deleted successfully.', 'success')
     except sqlite3.IntegrityError as e:
         flash(f'Failed to delete fee structure. It might be in use by payments (Error: {e}).', 'danger')
@@ -426,58 +367,23 @@ def delete_fee_payment(payment_id):
 
     return redirect(url_for('fees.manage_fee_payments'))
 
+@cached(timeout=60, cache_key_prefix="fee_summary_",
+        depends_on=('students', 'courses', 'academic_years', 'fee_structure', 'student_fee_payments'))
+def _get_fee_summary_rows(course_filter, year_filter, search_student):
+    """Per-student fee totals for the summary page, cached per filter combination."""
+    query, params = FEE_SUMMARY.build(course_id=course_filter, academic_year_id=year_filter, search=search_student)
+    return db_manager.execute_query(query, params, fetch_all=True)
+
 @fees_bp.route('/summary')
 @admin_required
+@conditional('students', 'courses', 'academic_years', 'fee_structure', 'student_fee_payments')
 def fee_summary():
     """Displays a summary of fees for all students."""
     course_filter = request.args.get('course_id', type=int)
     year_filter = request.args.get('academic_year_id', type=int)
     search_student = request.args.get('search_student', '').strip()
 
-    params = []
-    where_clauses = []
-    query = """
-        SELECT
-            s.id AS student_id,
-            s.student_name,
-            s.surname,
-            s.admission_no,
-            c.course_name,
-            ay.academic_year,
-            fs.total_fee,
-            COALESCE(SUM(p.amount_paid), 0) AS total_paid
-        FROM
-            students s
-        JOIN
-            courses c ON s.course_id = c.id
-        JOIN
-            academic_years ay ON s.academic_year_id = ay.id
-        LEFT JOIN
-            fee_structure fs ON s.fee_structure_id = fs.id
-        LEFT JOIN
-            student_fee_payments p ON s.id = p.student_id
-    """
-
-    if course_filter:
-        where_clauses.append("s.course_id = ?")
-        params.append(course_filter)
-    if year_filter:
-        where_clauses.append("s.academic_year_id = ?")
-        params.append(year_filter)
-    if search_student:
-        where_clauses.append("(s.student_name LIKE ? OR s.admission_no LIKE ?)")
-        params.extend([f'%{search_student}%', f'%{search_student}%'])
-
-
-    if where_clauses:
-        query += " WHERE " + " AND ".join(where_clauses)
-
-    query += """ GROUP BY
-            s.id, s.student_name, s.surname, s.admission_no, c.course_name, ay.academic_year, fs.total_fee
-        ORDER BY
-            c.course_name, ay.academic_year, s.student_name, s.surname;
-    """
-    student_fee_summary = db_manager.execute_query(query, tuple(params), fetch_all=True)
+    student_fee_summary = _get_fee_summary_rows(course_filter, year_filter, search_student)
     
     courses = get_courses()
     academic_years = get_academic_years()
@@ -497,18 +403,16 @@ def download_fee_history(student_id):
         return redirect(url_for('students.list_students'))
 
     try:
-        payments_query_result = db_manager.execute_query(
-            """SELECT p.*, fs.total_fee
+        # Only the columns the PDF prints, as FeeHistoryRecords (models/records.py)
+        payments = db_manager.fetch_records(
+            FeeHistoryRecord,
+            """SELECT p.payment_date, p.amount_paid, p.payment_method, p.transaction_id, p.remarks, fs.total_fee
                FROM student_fee_payments p
                LEFT JOIN fee_structure fs ON p.fee_structure_id = fs.id
                WHERE p.student_id = ?
                ORDER BY p.payment_date ASC""",
-            (student_id,),
-            fetch_all=True
+            (student_id,)
         )
-        
-        # Convert sqlite3.Row objects to plain dicts for pdf_utils
-        payments = [dict(p) for p in payments_query_result]
 
         total_fee_for_student = payments[0]['total_fee'] if payments and payments[0].get('total_fee') is not None else 0
         total_paid_by_student = sum(p['amount_paid'] for p in payments) if payments else 0
@@ -520,6 +424,7 @@ def download_fee_history(student_id):
             'balance_due': balance_due
         }
 
+        from utils.pdf_utils import ReportGenerator # Loads python-docx on first use, keeping worker boot fast
         report_generator = ReportGenerator()
         pdf_filepath = report_generator.generate_student_fee_history_pdf(dict(student), payments, summary_data)
         
@@ -582,12 +487,14 @@ def bulk_import_fees():
                 csv_reader = csv.DictReader(text_file)
                 payments_data = list(csv_reader)
 
-            with db_manager.get_db_cursor(commit=True) as cursor:
+            # One commit for the whole file; per-row lookups repeated past NPLUSONE_THRESHOLD are reported
+            with n_plus_one_scope('bulk_import_fees'), db_manager.transaction() as cursor:
                 for i, row in enumerate(payments_data):
                     try:
-                        _record_fee_payment_from_csv(cursor, row)
+                        with db_manager.transaction(): # Savepoint: a rejected row leaves nothing behind
+                            _record_fee_payment_from_csv(cursor, row)
                         success_count += 1
-                    except (ValueError, TypeError) as e:
+                    except (ValueError, TypeError, sqlite3.IntegrityError) as e:
                         errors.append(f"Row {i+2}: {e}")
 
             if errors:
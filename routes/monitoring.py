@@ -0,0 +1,66 @@
+# routes/monitoring.py
+"""
+Operational endpoints: Prometheus metrics for scraping and the request profile browser.
+"""
+
+import hmac
+from flask import Blueprint, Response, current_app, request, session, abort, render_template, send_from_directory
+from utils.auth_helpers import admin_required
+from utils.caching import get_cache_size
+from utils.metrics import render_prometheus, set_gauge
+from utils.profiler import list_profiles, PROFILE_HEADER
+
+monitoring_bp = Blueprint('monitoring', __name__)
+
+PROMETHEUS_CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+def _metrics_access_allowed() -> bool:
+    """
+    Scrapers authenticate with `Authorization: Bearer <METRICS_AUTH_TOKEN>`; logged-in admins
+    are always allowed. Unauthenticated requests from localhost are only let in when
+    METRICS_ALLOW_LOCALHOST is set: behind a reverse proxy on the same host every request
+    comes from localhost, so this is an explicit opt-in rather than the fallback.
+    """
+    if session.get('admin_logged_in'):
+        return True
+    token = current_app.config.get('METRICS_AUTH_TOKEN')
+    if token:
+        supplied = request.headers.get('Authorization', '').removeprefix('Bearer ').strip()
+        if hmac.compare_digest(supplied.encode(), token.encode()):
+            return True
+    return bool(current_app.config.get('METRICS_ALLOW_LOCALHOST')) and request.remote_addr in ('127.0.0.1', '::1')
+
+
+@monitoring_bp.route('/metrics')
+def metrics():
+    """Metrics of all workers in Prometheus text exposition format."""
+    if not current_app.config.get('METRICS_ENABLED', True):
+        abort(404)
+    if not _metrics_access_allowed():
+        # Plain-text reply: scrapers don't need the HTML error page.
+        return Response("Forbidden\n", status=403, content_type='text/plain; charset=utf-8')
+    set_gauge('satcms_cache_entries', get_cache_size())
+    body = render_prometheus(current_app.config.get('METRICS_DIR'))
+    return Response(body, mimetype=None, content_type=PROMETHEUS_CONTENT_TYPE,
+                    headers={'Cache-Control': 'no-store'})
+
+
+@monitoring_bp.route('/monitoring/profiles')
+@admin_required
+def list_request_profiles():
+    """Lists saved request profiles (see utils/profiler.py)."""
+    return render_template('monitoring/profiles.html',
+                           profiles=list_profiles(current_app.config.get('PROFILE_DIR')),
+                           profiler_enabled=current_app.config.get('PROFILER_ENABLED'),
+                           sample_rate=current_app.config.get('PROFILER_SAMPLE_RATE', 0.0),
+                           profile_header=PROFILE_HEADER)
+
+
+@monitoring_bp.route('/monitoring/profiles/<path:filename>')
+@admin_required
+def download_request_profile(filename):
+    """Serves a saved profile file (speedscope JSON or folded stacks)."""
+    if not filename.endswith(('.speedscope.json', '.folded')):
+        abort(404)
+    return send_from_directory(current_app.config['PROFILE_DIR'], filename, as_attachment=True)
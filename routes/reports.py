@@ -1,13 +1,20 @@
 import os
-from flask import Blueprint, render_template, request, flash, current_app, send_from_directory, url_for, redirect, Response, jsonify
+from flask import Blueprint, render_template, request, flash, current_app, send_from_directory, url_for, redirect, Response, jsonify, stream_with_context
 from models.db_pool import get_courses, get_academic_years, db_manager, get_students_for_admission_register
 from utils.auth_helpers import admin_required
-from utils.pdf_utils import ReportGenerator
-from utils.csv_utils import generate_csv_from_data
-from datetime import datetime
+from utils.csv_utils import iter_csv_from_data
+from utils.caching import cached
+from utils.http_caching import conditional
+from utils.fee_analytics import ANALYTICS_TABLES, DEFAULT_TOP_DEFAULTERS, SECTIONS, fee_analytics as fee_columns, get_fee_analytics
+from datetime import date, datetime
 
 reports_bp = Blueprint('reports', __name__)
 
+def _report_generator():
+    """A ReportGenerator; utils.pdf_utils (python-docx) is imported on first use, not at startup."""
+    from utils.pdf_utils import ReportGenerator
+    return ReportGenerator()
+
 @reports_bp.route('/')
 @admin_required
 def index():
@@ -35,7 +42,7 @@ def admission_register():
                                         academic_year_id=academic_year_id))
 
             # PDF generation logic remains the same
-            generator = ReportGenerator()
+            generator = _report_generator()
             report_path = generator.generate_admission_register_pdf(
                 course_id=course_id,
                 academic_year_id=academic_year_id
@@ -72,38 +79,18 @@ def download_admission_register_csv():
             flash('No students found for the selected criteria to generate CSV.', 'warning')
             return redirect(url_for('reports.admission_register'))
 
-        # Convert Row objects to dictionaries for easier processing
-        student_dicts = [dict(student) for student in students]
-
         headers = [
             'S.No', 'Adm. No', 'Student Details', 'Social Category', 
             'Education/Dates', 'TC/Adm Date', 'Remarks'
         ]
         
-        # Prepare data for CSV, matching the structure of the PDF
-        csv_data = []
-        for idx, student in enumerate(student_dicts, 1):
-            # Combine address fields
-            address_parts = [student.get(key) for key in ['address1', 'address2', 'address3', 'town'] if student.get(key)]
-            address_str = ', '.join(filter(None, address_parts))
-
-            csv_data.append({
-                'S.No': idx,
-                'Adm. No': student.get('admission_no', 'N/A'),
-                'Student Details': f"Name: {student.get('student_name', 'N/A')}, Father: {student.get('father_name', 'N/A')}, Addr: {address_str}, Phone: {student.get('phone_no', 'N/A')}, Aadhar: {student.get('aadhar_no', 'N/A')}",
-                'Social Category': f"Caste: {student.get('caste', 'N/A')}, Sub-Caste: {student.get('sub_caste', 'N/A')}, Religion: {student.get('religion', 'N/A')}",
-                'Education/Dates': f"DOB: {student.get('dob', 'N/A')}, Prev. College: {student.get('previous_college', 'N/A')}, Prev. TC: {student.get('old_tc_no_date', 'N/A')}",
-                'TC/Adm Date': f"Date of Adm: {student.get('date_of_admission', 'N/A')}",
-                'Remarks': student.get('remarks', '')
-            })
-
-        csv_content = generate_csv_from_data(csv_data, headers)
-
         timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
         filename = f"admission_register_{timestamp}.csv"
 
+        # Streamed in chunks: the whole register is never held as one string, and under the
+        # ASGI server (asgi.py) a slow download does not hold a thread between chunks
         return Response(
-            csv_content,
+            stream_with_context(iter_csv_from_data(_admission_register_csv_rows(students), headers)),
             mimetype="text/csv",
             headers={"Content-disposition": f"attachment; filename={filename}"}
         )
@@ -113,6 +100,23 @@ def download_admission_register_csv():
         current_app.logger.error(f"CSV Report Generation failed: {e}", exc_info=True)
         return redirect(url_for('reports.admission_register'))
 
+def _admission_register_csv_rows(students):
+    """CSV rows of the admission register, matching the structure of the PDF."""
+    for idx, student in enumerate(students, 1):
+        # Combine address fields
+        address_parts = [student.get(key) for key in ['address1', 'address2', 'address3', 'town'] if student.get(key)]
+        address_str = ', '.join(filter(None, address_parts))
+
+        yield {
+            'S.No': idx,
+            'Adm. No': student.get('admission_no', 'N/A'),
+            'Student Details': f"Name: {student.get('student_name', 'N/A')}, Father: {student.get('father_name', 'N/A')}, Addr: {address_str}, Phone: {student.get('phone_no', 'N/A')}, Aadhar: {student.get('aadhar_no', 'N/A')}",
+            'Social Category': f"Caste: {student.get('caste', 'N/A')}, Sub-Caste: {student.get('sub_caste', 'N/A')}, Religion: {student.get('religion', 'N/A')}",
+            'Education/Dates': f"DOB: {student.get('dob', 'N/A')}, Prev. College: {student.get('previous_college', 'N/A')}, Prev. TC: {student.get('old_tc_no_date', 'N/A')}",
+            'TC/Adm Date': f"Date of Adm: {student.get('date_of_admission', 'N/A')}",
+            'Remarks': student.get('remarks', '')
+        }
+
 @reports_bp.route('/fee-collection-report', methods=['GET', 'POST'])
 @admin_required
 def fee_collection_report():
@@ -124,7 +128,7 @@ def fee_collection_report():
             course_id = int(course_id) if course_id else None
             academic_year_id = int(academic_year_id) if academic_year_id else None
 
-            generator = ReportGenerator()
+            generator = _report_generator()
             report_path = generator.generate_fee_summary_report_pdf( # Changed to call the new summary report
                 course_id=course_id, academic_year_id=academic_year_id
             )
@@ -157,7 +161,7 @@ def tc_issued_report():
             course_id = int(course_id) if course_id else None
             academic_year_id = int(academic_year_id) if academic_year_id else None
             
-            generator = ReportGenerator()
+            generator = _report_generator()
             report_path = generator.generate_tc_issued_report_pdf(
                 course_id=course_id, 
                 academic_year_id=academic_year_id
@@ -178,7 +182,7 @@ def tc_issued_report():
 @reports_bp.route('/fee-collection-report-file/<filename>')
 @admin_required
 def fee_collection_report_file(filename):
-    generator = ReportGenerator()
+    generator = _report_generator()
     directory = generator.output_path_base
     return send_from_directory(directory, filename, as_attachment=True)
 
@@ -213,35 +217,99 @@ def admission_register_data():
 
 @reports_bp.route('/api/student-distribution/<int:academic_year_id>')
 @admin_required
+@conditional('students', 'courses', max_age=30)
 def get_student_distribution_data(academic_year_id):
     """API endpoint to get student distribution data for a specific academic year."""
     try:
-        if academic_year_id == 0: # Use 0 to signify all years
-            query = """
-                SELECT c.course_name, COUNT(s.id) as student_count
-                FROM courses c
-                LEFT JOIN students s ON c.id = s.course_id
-                GROUP BY c.course_name
-                ORDER BY student_count DESC
-            """
-            params = ()
-        else:
-            query = """
-                SELECT c.course_name, COUNT(s.id) as student_count
-                FROM courses c
-                LEFT JOIN students s ON c.id = s.course_id AND s.academic_year_id = ?
-                GROUP BY c.course_name
-                ORDER BY student_count DESC
-            """
-            params = (academic_year_id,)
-
-        dist_data = db_manager.execute_query(query, params, fetch_all=True)
-        
-        chart_data = {
-            'labels': [row['course_name'] for row in dist_data],
-            'data': [row['student_count'] for row in dist_data]
-        }
-        return jsonify(chart_data)
+        return jsonify(_get_student_distribution(academic_year_id))
     except Exception as e:
         current_app.logger.error(f"API Error for student distribution: {e}", exc_info=True)
         return jsonify({"error": "Could not retrieve chart data"}), 500
+
+@cached(timeout=60, cache_key_prefix="student_dist_", depends_on=('students', 'courses'))
+def _get_student_distribution(academic_year_id):
+    """Course-wise student counts for the dashboard chart, cached per academic year."""
+    if academic_year_id == 0: # Use 0 to signify all years
+        query = """
+            SELECT c.course_name, COUNT(s.id) as student_count
+            FROM courses c
+            LEFT JOIN students s ON c.id = s.course_id
+            GROUP BY c.course_name
+            ORDER BY student_count DESC
+        """
+        params = ()
+    else:
+        query = """
+            SELECT c.course_name, COUNT(s.id) as student_count
+            FROM courses c
+            LEFT JOIN students s ON c.id = s.course_id AND s.academic_year_id = ?
+            GROUP BY c.course_name
+            ORDER BY student_count DESC
+        """
+        params = (academic_year_id,)
+
+    dist_data = db_manager.execute_query(query, params, fetch_all=True)
+    
+    return {
+        'labels': [row['course_name'] for row in dist_data],
+        'data': [row['student_count'] for row in dist_data]
+    }
+
+def _fee_analytics_filters():
+    """Filters of the fee analytics page and endpoints from the query string (malformed values are ignored)."""
+    return {
+        'as_of': request.args.get('as_of', type=date.fromisoformat) or date.today(),
+        'course_id': request.args.get('course_id', type=int),
+        'academic_year_id': request.args.get('academic_year_id', type=int),
+        'start_date': request.args.get('start_date', type=date.fromisoformat),
+        'end_date': request.args.get('end_date', type=date.fromisoformat),
+        'top': request.args.get('top', DEFAULT_TOP_DEFAULTERS, type=int),
+    }
+
+# Not @conditional: balances age with the date, which the data-version ETag does not cover
+@cached(timeout=60, cache_key_prefix="fee_analytics_", depends_on=ANALYTICS_TABLES)
+def _get_fee_analytics(as_of, course_id, academic_year_id, start_date, end_date, top):
+    """Fee analytics (utils/fee_analytics.py), cached per filter combination and day."""
+    return get_fee_analytics(as_of=as_of, course_id=course_id, academic_year_id=academic_year_id,
+                             start_date=start_date, end_date=end_date, top=top)
+
+def _load_fee_analytics(filters: dict) -> dict:
+    """
+    Fee analytics for the request's filters. While the columns are reloading in the background
+    they still reflect an older data version than the one in the cache key, so that answer is
+    returned uncached instead of being stored for the next 60 seconds under the newer key.
+    """
+    fee_columns.ensure_current()
+    if not fee_columns.is_current():
+        return get_fee_analytics(**filters)
+    return _get_fee_analytics(**filters)
+
+@reports_bp.route('/fee-analytics')
+@admin_required
+def fee_analytics():
+    """Collection trends, collection rate per course, ageing of balances and top defaulters."""
+    filters = _fee_analytics_filters()
+    analytics = _load_fee_analytics(filters)
+    courses = get_courses()
+    academic_years = get_academic_years()
+    return render_template('reports/fee_analytics.html', analytics=analytics, filters=filters,
+                           courses=courses, academic_years=academic_years)
+
+@reports_bp.route('/api/fee-analytics')
+@reports_bp.route('/api/fee-analytics/<section>')
+@admin_required
+def get_fee_analytics_data(section=None):
+    """
+    API endpoint for the fee analytics charts: all sections, or one of totals, daily, monthly,
+    course-rates, ageing, defaulters. Same filters as the page (course_id, academic_year_id,
+    start_date, end_date, as_of, top).
+    """
+    key = section.replace('-', '_') if section else None
+    if key is not None and key not in SECTIONS:
+        return jsonify({"error": f"Unknown section '{section}'"}), 404
+    try:
+        analytics = _load_fee_analytics(_fee_analytics_filters())
+    except Exception as e:
+        current_app.logger.error(f"API Error for fee analytics: {e}", exc_info=True)
+        return jsonify({"error": "Could not retrieve fee analytics"}), 500
+    return jsonify(analytics if key is None else analytics[key])
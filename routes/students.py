@@ -4,8 +4,13 @@ import csv
 import io
 from flask import Blueprint, render_template, request, redirect, url_for, flash, jsonify, current_app, send_from_directory
 from models.db_pool import db_manager, get_courses, get_academic_years, get_student_by_id
+from models.queries import STUDENT_LIST, insert_statement, update_statement
+from models.query_stats import n_plus_one_scope
 from utils.auth_helpers import admin_required # Ensure this is imported
+from utils.http_caching import conditional
 from utils.validators import validate_student_data, ValidationError
+from utils.student_search import search_students, DEFAULT_LIMIT
+from utils.duplicate_detection import find_duplicates, DuplicateBatch, describe_duplicates
 from utils.admission_number import generate_admission_number, check_admission_number_exists, get_next_available_admission_number_preview
 from datetime import datetime
 import logging
@@ -23,6 +28,7 @@ students_bp = Blueprint('students', __name__)
 
 @students_bp.route('/list')
 @admin_required
+@conditional('students', 'courses', 'academic_years')
 def list_students():
     """Displays a paginated list of all students with search and filtering."""
     page = request.args.get('page', 1, type=int)
@@ -33,31 +39,12 @@ def list_students():
     course_filter = request.args.get('course_id', type=int)
     year_filter = request.args.get('academic_year_id', type=int)
 
-    base_query = """
-        FROM students s
-        JOIN courses c ON s.course_id = c.id
-        JOIN academic_years ay ON s.academic_year_id = ay.id
-        WHERE (s.student_name LIKE ? OR s.admission_no LIKE ?)
-    """
-    params = [f'%{search_query}%', f'%{search_query}%']
-
-    if course_filter:
-        base_query += " AND s.course_id = ?"
-        params.append(course_filter)
-    if year_filter:
-        base_query += " AND s.academic_year_id = ?"
-        params.append(year_filter)
-
-    count_row = db_manager.execute_query(f"SELECT COUNT(s.id) as count {base_query}", tuple(params), fetch_one=True)
+    filters = {'search': search_query, 'course_id': course_filter, 'academic_year_id': year_filter}
+    count_row = db_manager.execute_query(*STUDENT_LIST.build(count=True, **filters), fetch_one=True)
     total_students = count_row['count'] if count_row else 0
     
     offset = (page - 1) * per_page
-    students = db_manager.execute_query(
-        f"""SELECT s.id, s.admission_no, s.student_name,s.surname, s.father_name, c.course_code, ay.academic_year 
-            {base_query} ORDER BY s.surname ASC, s.student_name ASC LIMIT ? OFFSET ?""",
-        tuple(params + [per_page, offset]),
-        fetch_all=True
-    )
+    students = db_manager.execute_query(*STUDENT_LIST.build(limit=per_page, offset=offset, **filters), fetch_all=True)
     
     total_pages = (total_students + per_page - 1) // per_page
     
@@ -128,10 +115,7 @@ def add_student():
             validated_data = validate_student_data(form_data) 
 
             # Get academic year details for starting_year
-            ay_details = db_manager.execute_query(
-                "SELECT academic_year FROM academic_years WHERE id = ?",
-                (validated_data['academic_year_id'],), fetch_one=True
-            )
+            ay_details = db_manager.academic_years.get(validated_data['academic_year_id'])
             if not ay_details:
                 raise ValueError("Academic year details not found.")
             
@@ -141,85 +125,91 @@ def add_student():
             starting_year_str = years[0]
 
             # Get course details for course_code and is_special_format
-            course_details = db_manager.execute_query(
-                "SELECT course_code, is_special_format FROM courses WHERE id = ?",
-                (validated_data['course_id'],), fetch_one=True
-            )
+            course_details = db_manager.courses.get(validated_data['course_id'])
             if not course_details:
                 raise ValueError("Course details not found.")
             
             course_code_str = course_details['course_code'].upper()
             is_course_special = course_details['is_special_format'] == 1
 
+            # Likely re-admissions under another spelling; reported, not blocking
+            possible_duplicates = find_duplicates(validated_data)
+
             is_manual_mode = form_data.get('is_manual_admission_mode') == 'on'
             adm_no_to_check = ""
             serial_no_to_store = 0 # This will be the integer value of the serial
 
-            if is_manual_mode:
-                manual_serial_str = form_data.get('manual_serial_no', '').strip()
-                expected_len = 2 if is_course_special else 3
-                max_val = 99 if is_course_special else 999
+            # Admission number, fee structure and insert in one transaction: two admissions
+            # saved at the same time cannot both take the next serial number
+            with db_manager.transaction() as cursor:
+                if is_manual_mode:
+                    manual_serial_str = form_data.get('manual_serial_no', '').strip()
+                    expected_len = 2 if is_course_special else 3
+                    max_val = 99 if is_course_special else 999
                 
-                if not (manual_serial_str.isdigit() and len(manual_serial_str) == expected_len):
-                    errors_for_template['manual_serial_no'] = f"Manual serial must be exactly {expected_len} digits (e.g., {'01' if is_course_special else '001'})."
-                else:
-                    manual_serial_int = int(manual_serial_str)
-                    if not (0 <= manual_serial_int <= max_val):
-                        errors_for_template['manual_serial_no'] = f"Manual serial must be between 0 and {max_val}."
+                    if not (manual_serial_str.isdigit() and len(manual_serial_str) == expected_len):
+                        errors_for_template['manual_serial_no'] = f"Manual serial must be exactly {expected_len} digits (e.g., {'01' if is_course_special else '001'})."
                     else:
-                        # Construct admission number: YYYY + CourseCode + FormattedManualSerial
-                        formatted_manual_serial = f"{manual_serial_int:0{expected_len}d}"
-                        adm_no_to_check = f"{starting_year_str}{course_code_str}{formatted_manual_serial}"
-                        serial_no_to_store = manual_serial_int
-                        validated_data['is_manual_admission_no'] = 1
-            else:
-                # Automatic mode
-                adm_no_to_check, serial_no_to_store = generate_admission_number(
-                    validated_data['course_id'], validated_data['academic_year_id']
+                        manual_serial_int = int(manual_serial_str)
+                        if not (0 <= manual_serial_int <= max_val):
+                            errors_for_template['manual_serial_no'] = f"Manual serial must be between 0 and {max_val}."
+                        else:
+                            # Construct admission number: YYYY + CourseCode + FormattedManualSerial
+                            formatted_manual_serial = f"{manual_serial_int:0{expected_len}d}"
+                            adm_no_to_check = f"{starting_year_str}{course_code_str}{formatted_manual_serial}"
+                            serial_no_to_store = manual_serial_int
+                            validated_data['is_manual_admission_no'] = 1
+                else:
+                    # Automatic mode
+                    adm_no_to_check, serial_no_to_store = generate_admission_number(
+                        validated_data['course_id'], validated_data['academic_year_id']
+                    )
+                    validated_data['is_manual_admission_no'] = 0
+
+                if errors_for_template: # If manual serial validation failed
+                    raise ValidationError("Validation error", errors=errors_for_template)
+
+                if not adm_no_to_check: 
+                     raise ValueError("Admission number could not be determined.")
+
+                if check_admission_number_exists(adm_no_to_check):
+                    error_msg = f"Admission number {adm_no_to_check} already exists. Please try again."
+                    if is_manual_mode:
+                        errors_for_template['manual_serial_no'] = error_msg
+                    else: 
+                        errors_for_template['admission_no'] = error_msg # For preview field if shown
+                    raise ValidationError("Admission number conflict", errors=errors_for_template)
+
+                # Automatically assign fee_structure_id
+                fee_structure = db_manager.execute_query(
+                    "SELECT id FROM fee_structure WHERE course_id = ? AND academic_year_id = ?",
+                    (validated_data['course_id'], validated_data['academic_year_id']),
+                    fetch_one=True
                 )
-                validated_data['is_manual_admission_no'] = 0
-
-            if errors_for_template: # If manual serial validation failed
-                raise ValidationError("Validation error", errors=errors_for_template)
-
-            if not adm_no_to_check: 
-                 raise ValueError("Admission number could not be determined.")
-
-            if check_admission_number_exists(adm_no_to_check):
-                error_msg = f"Admission number {adm_no_to_check} already exists. Please try again."
-                if is_manual_mode:
-                    errors_for_template['manual_serial_no'] = error_msg
-                else: 
-                    errors_for_template['admission_no'] = error_msg # For preview field if shown
-                raise ValidationError("Admission number conflict", errors=errors_for_template)
-
-            # Automatically assign fee_structure_id
-            fee_structure = db_manager.execute_query(
-                "SELECT id FROM fee_structure WHERE course_id = ? AND academic_year_id = ?",
-                (validated_data['course_id'], validated_data['academic_year_id']),
-                fetch_one=True
-            )
-            validated_data['fee_structure_id'] = fee_structure['id'] if fee_structure else None
-
-            validated_data['admission_no'] = adm_no_to_check
-            validated_data['serial_no'] = serial_no_to_store
+                validated_data['fee_structure_id'] = fee_structure['id'] if fee_structure else None
 
-            columns = ', '.join(validated_data.keys())
-            placeholders = ', '.join(['?'] * len(validated_data))
-            values = tuple(validated_data.values())
+                validated_data['admission_no'] = adm_no_to_check
+                validated_data['serial_no'] = serial_no_to_store
 
-            with db_manager.get_db_cursor(commit=True) as cursor:
-                cursor.execute(f"INSERT INTO students ({columns}) VALUES ({placeholders})", values)
+                cursor.execute(*insert_statement('students', validated_data))
                 new_student_id = cursor.lastrowid
+
+            for duplicate in possible_duplicates:
+                duplicate['url'] = url_for('students.view_student', student_id=duplicate['id'])
+            if possible_duplicates:
+                logger.info(f"Student {new_student_id} ({adm_no_to_check}) resembles existing students: {describe_duplicates(possible_duplicates)}")
             
             if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
                 return jsonify({
                     'message': f"Student '{validated_data['student_name']}' added successfully!",
                     'admission_no': adm_no_to_check,
-                    'student_url': url_for('students.view_student', student_id=new_student_id)
+                    'student_url': url_for('students.view_student', student_id=new_student_id),
+                    'possible_duplicates': possible_duplicates
                 }), 200
 
             flash(f"Student '{validated_data['student_name']}' added successfully with admission number {adm_no_to_check}.", 'success') # Use adm_no_to_check
+            if possible_duplicates:
+                flash(f"Possible duplicate admission, please check: {describe_duplicates(possible_duplicates)}", 'warning')
             return redirect(url_for('students.list_students'))
 
         except (ValidationError, sqlite3.Error, ValueError) as e: # Added ValueError
@@ -284,25 +274,23 @@ def edit_student(student_id):
             
             # Admission number is not regenerated on edit
             # Update starting/ending year if academic year changed
-            ay_details = db_manager.execute_query("SELECT academic_year FROM academic_years WHERE id = ?", (validated_data['academic_year_id'],), fetch_one=True)
+            ay_details = db_manager.academic_years.get(validated_data['academic_year_id'])
             if ay_details:
                 years = ay_details['academic_year'].split('-')
                 validated_data['starting_year'] = int(years[0])
                 validated_data['ending_year'] = int(years[1])
                 
             
-            # Automatically assign fee_structure_id
-            fee_structure = db_manager.execute_query(
-                "SELECT id FROM fee_structure WHERE course_id = ? AND academic_year_id = ?",
-                (validated_data['course_id'], validated_data['academic_year_id']),
-                fetch_one=True
-            )
-            validated_data['fee_structure_id'] = fee_structure['id'] if fee_structure else None
+            with db_manager.transaction() as cursor:
+                # Automatically assign fee_structure_id
+                fee_structure = db_manager.execute_query(
+                    "SELECT id FROM fee_structure WHERE course_id = ? AND academic_year_id = ?",
+                    (validated_data['course_id'], validated_data['academic_year_id']),
+                    fetch_one=True
+                )
+                validated_data['fee_structure_id'] = fee_structure['id'] if fee_structure else None
 
-            update_clause = ', '.join([f"{key} = ?" for key in validated_data.keys()])
-            values = tuple(list(validated_data.values()) + [student_id])
-            
-            db_manager.execute_query(f"UPDATE students SET {update_clause} WHERE id = ?", values, commit=True)
+                cursor.execute(*update_statement('students', validated_data, student_id))
             flash(f"Student '{validated_data['student_name']}' updated successfully.", 'success')
             return redirect(url_for('students.view_student', student_id=student_id))
             
@@ -428,6 +416,50 @@ def api_next_admission_no():
     preview_no = get_next_available_admission_number_preview(course_id, academic_year_id)
     return jsonify({'next_admission_number': preview_no})
 
+@students_bp.route('/api/typeahead')
+@admin_required
+def api_typeahead():
+    """
+    Student suggestions while typing (name, surname or admission number), from the
+    in-memory index in utils/student_search.py. The response is in Select2's format:
+    {"results": [{"id": ..., "text": ..., ...}]}.
+    Optional filters: course_id, academic_year_id, without_tc=1 (students with no TC yet).
+    """
+    results = search_students(
+        request.args.get('q', ''),
+        limit=request.args.get('limit', DEFAULT_LIMIT, type=int),
+        course_id=request.args.get('course_id', type=int),
+        academic_year_id=request.args.get('academic_year_id', type=int),
+        without_tc=request.args.get('without_tc') == '1',
+    )
+    for result in results:
+        result['text'] = f"{result['name']} ({result['admission_no']}) - {result['course_name']}, {result['academic_year']}"
+    return jsonify({'results': results})
+
+@students_bp.route('/api/possible-duplicates')
+@admin_required
+def api_possible_duplicates():
+    """
+    Existing students who look like the one being entered (student_name, surname, father_name,
+    dob as DD-MM-YYYY or YYYY-MM-DD), so the registration form can warn before saving.
+    Optional exclude_id leaves out the student being edited.
+    """
+    dob = request.args.get('dob', '').strip()
+    for fmt in (current_app.config['DATE_FORMAT'], '%d/%m/%Y', '%Y-%m-%d'):
+        try:
+            dob = datetime.strptime(dob, fmt).strftime('%Y-%m-%d')
+            break
+        except ValueError:
+            continue
+    student = {field: request.args.get(field, '').strip() for field in ('student_name', 'surname', 'father_name')}
+    student['dob'] = dob
+    if not student['student_name']:
+        return jsonify({'duplicates': []})
+    duplicates = find_duplicates(student, exclude_id=request.args.get('exclude_id', type=int))
+    for duplicate in duplicates:
+        duplicate['url'] = url_for('students.view_student', student_id=duplicate['id'])
+    return jsonify({'duplicates': duplicates})
+
 @students_bp.route('/regenerate-admission-numbers', methods=['POST'])
 @admin_required
 def regenerate_admission_numbers_view():
@@ -448,11 +480,11 @@ def regenerate_admission_numbers_view():
     from utils.admission_number import regenerate_admission_numbers_for_academic_year # Import here to avoid circular dependency if any
     course_name_for_flash = ""
     try:
-        ay_details = db_manager.execute_query("SELECT academic_year FROM academic_years WHERE id = ?", (academic_year_id,), fetch_one=True)
+        ay_details = db_manager.academic_years.get(academic_year_id)
         ay_name = ay_details['academic_year'] if ay_details else f"ID {academic_year_id}"
 
         if course_id:
-            course_details = db_manager.execute_query("SELECT course_name FROM courses WHERE id = ?", (course_id,), fetch_one=True)
+            course_details = db_manager.courses.get(course_id)
             course_name_for_flash = f" for course '{course_details['course_name']}'" if course_details else f" for course ID {course_id}"
 
         updated_count = regenerate_admission_numbers_for_academic_year(academic_year_id, course_id=course_id)
@@ -465,16 +497,14 @@ def regenerate_admission_numbers_view():
     
     return redirect(url_for('students.list_students'))
 
-def _add_student_from_csv(cursor, row_data):
+def _add_student_from_csv(cursor, row_data, fee_structures=None):
+    """Validates and inserts one CSV row; fee_structures memoises {(course_id, academic_year_id): id} for the file."""
     try:
         # Basic validation of student data
         validated_data = validate_student_data(row_data)
 
         # Get academic year details for starting_year
-        ay_details = db_manager.execute_query(
-            "SELECT academic_year FROM academic_years WHERE id = ?",
-            (validated_data['academic_year_id'],), fetch_one=True
-        )
+        ay_details = db_manager.academic_years.get(validated_data['academic_year_id'])
         if not ay_details:
             raise ValueError("Academic year details not found.")
         
@@ -491,18 +521,17 @@ def _add_student_from_csv(cursor, row_data):
         validated_data['is_manual_admission_no'] = 0
 
         # Automatically assign fee_structure_id
-        fee_structure = db_manager.execute_query(
-            "SELECT id FROM fee_structure WHERE course_id = ? AND academic_year_id = ?",
-            (validated_data['course_id'], validated_data['academic_year_id']),
-            fetch_one=True
-        )
-        validated_data['fee_structure_id'] = fee_structure['id'] if fee_structure else None
-
-        columns = ', '.join(validated_data.keys())
-        placeholders = ', '.join(['?'] * len(validated_data))
-        values = tuple(validated_data.values())
+        fee_structures = {} if fee_structures is None else fee_structures
+        fee_key = (validated_data['course_id'], validated_data['academic_year_id'])
+        if fee_key not in fee_structures:
+            fee_structure = db_manager.execute_query(
+                "SELECT id FROM fee_structure WHERE course_id = ? AND academic_year_id = ?", fee_key, fetch_one=True
+            )
+            fee_structures[fee_key] = fee_structure['id'] if fee_structure else None
+        validated_data['fee_structure_id'] = fee_structures[fee_key]
 
-        cursor.execute(f"INSERT INTO students ({columns}) VALUES ({placeholders})", values)
+        cursor.execute(*insert_statement('students', validated_data))
+        return validated_data
 
     except (ValidationError, ValueError) as e:
         # Re-raise the exception to be caught in the main bulk_import function
@@ -516,6 +545,7 @@ def bulk_import():
     if form.validate_on_submit():
         csv_file = form.csv_file.data
         errors = []
+        duplicate_warnings = []
         success_count = 0
         
         try:
@@ -523,7 +553,11 @@ def bulk_import():
                 csv_reader = csv.DictReader(text_file)
                 students_data = list(csv_reader)
 
-            with db_manager.get_db_cursor(commit=True) as cursor:
+            duplicates = DuplicateBatch() # Compares each row with saved students and earlier rows of this file
+            # Names resolved once per file: {course_name: id}, {academic_year: id}, {(course, year): fee structure id}
+            course_ids, academic_year_ids, fee_structures = {}, {}, {}
+            # One commit for the whole file; per-row lookups repeated past NPLUSONE_THRESHOLD are reported
+            with n_plus_one_scope('bulk_import_students'), db_manager.transaction() as cursor:
                 for i, row in enumerate(students_data):
                     try:
                         # Map CSV columns to form fields
@@ -548,20 +582,29 @@ def bulk_import():
                         }
 
                         # Get course_id from course_name
-                        course = db_manager.execute_query("SELECT id FROM courses WHERE course_name = ?", (form_data['course_name'],), fetch_one=True)
-                        if not course:
+                        if form_data['course_name'] not in course_ids:
+                            course = db_manager.execute_query("SELECT id FROM courses WHERE course_name = ?", (form_data['course_name'],), fetch_one=True)
+                            course_ids[form_data['course_name']] = course['id'] if course else None
+                        if course_ids[form_data['course_name']] is None:
                             raise ValueError(f"Course '{form_data['course_name']}' not found.")
-                        form_data['course_id'] = course['id']
+                        form_data['course_id'] = course_ids[form_data['course_name']]
 
                         # Get academic_year_id from academic_year
-                        academic_year = db_manager.execute_query("SELECT id FROM academic_years WHERE academic_year = ?", (form_data['academic_year'],), fetch_one=True)
-                        if not academic_year:
+                        if form_data['academic_year'] not in academic_year_ids:
+                            academic_year = db_manager.execute_query("SELECT id FROM academic_years WHERE academic_year = ?", (form_data['academic_year'],), fetch_one=True)
+                            academic_year_ids[form_data['academic_year']] = academic_year['id'] if academic_year else None
+                        if academic_year_ids[form_data['academic_year']] is None:
                             raise ValueError(f"Academic year '{form_data['academic_year']}' not found.")
-                        form_data['academic_year_id'] = academic_year['id']
+                        form_data['academic_year_id'] = academic_year_ids[form_data['academic_year']]
                         
-                        _add_student_from_csv(cursor, form_data)
+                        with db_manager.transaction(): # Savepoint: a rejected row leaves nothing behind
+                            student = _add_student_from_csv(cursor, form_data, fee_structures)
+                        possible_duplicates = duplicates.check(student)
+                        if possible_duplicates:
+                            duplicate_warnings.append(f"Row {i+2} ({student['admission_no']}): {describe_duplicates(possible_duplicates)}")
+                        duplicates.add(student)
                         success_count += 1
-                    except (ValidationError, ValueError) as e:
+                    except (ValidationError, ValueError, sqlite3.IntegrityError) as e:
                         errors.append(f"Row {i+2}: {e}")
 
             if errors:
@@ -570,6 +613,12 @@ def bulk_import():
                     flash(error, 'danger')
             else:
                 flash(f'Successfully imported {success_count} students.', 'success')
+            if duplicate_warnings:
+                flash(f'{len(duplicate_warnings)} imported students look like students already on record (or earlier in the file). Please check:', 'warning')
+                for warning in duplicate_warnings[:20]:
+                    flash(warning, 'warning')
+                if len(duplicate_warnings) > 20:
+                    flash(f'... and {len(duplicate_warnings) - 20} more.', 'warning')
 
         except Exception as e:
             flash(f'An unexpected error occurred: {e}', 'danger')
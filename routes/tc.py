@@ -6,8 +6,11 @@ from flask import (
     current_app, send_from_directory, g # Import g
 )
 from models.db_pool import db_manager, get_student_by_id, get_courses, get_academic_years
+from models.queries import STUDENTS_WITHOUT_TC
 from utils.auth_helpers import admin_required
-from utils.pdf_utils import TCGenerator, generate_tc_number_for_student
+from utils.tc_number import generate_tc_number_for_student
+from utils.student_search import search_students
+from utils.metrics import PhaseTimer
 from utils.date_utils import convert_date_to_words # NEW IMPORT
 from datetime import datetime
 import logging
@@ -25,32 +28,24 @@ def select_student():
         course_id_filter = request.args.get('course_id', type=int)
         academic_year_id_filter = request.args.get('academic_year_id', type=int)
 
-        # Query to find students who DO NOT have a TC yet
-        base_query = """
-            SELECT s.id, s.student_name, s.admission_no, c.course_name, ay.academic_year
-            FROM students s
-            JOIN courses c ON s.course_id = c.id
-            JOIN academic_years ay ON s.academic_year_id = ay.id
-            WHERE s.id NOT IN (SELECT student_id FROM transfer_certificates)
-        """
-        params = []
-        conditions = []
-
         if search_query:
-            conditions.append("(s.student_name LIKE ? OR s.admission_no LIKE ?)")
-            params.extend([f'%{search_query}%', f'%{search_query}%'])
-        if course_id_filter:
-            conditions.append("s.course_id = ?")
-            params.append(course_id_filter)
-        if academic_year_id_filter:
-            conditions.append("s.academic_year_id = ?")
-            params.append(academic_year_id_filter)
-
-        if conditions:
-            base_query += " AND " + " AND ".join(conditions)
-        base_query += " ORDER BY s.student_name LIMIT 100"
-
-        students = db_manager.execute_query(base_query, tuple(params), fetch_all=True)
+            # Name/admission no. searches use the in-memory index instead of LIKE '%...%' scans
+            students = [{
+                'id': match['id'], 'student_name': match['name'], 'admission_no': match['admission_no'],
+                'course_name': match['course_name'], 'academic_year': match['academic_year'],
+            } for match in search_students(search_query, limit=100, course_id=course_id_filter,
+                                           academic_year_id=academic_year_id_filter, without_tc=True)]
+            return render_template(
+                'tc/select_student.html',
+                students=students, courses=get_courses(), academic_years=get_academic_years(),
+                search_query=search_query, course_id_filter=course_id_filter,
+                academic_year_id_filter=academic_year_id_filter
+            )
+
+        # Students who DO NOT have a TC yet
+        query, params = STUDENTS_WITHOUT_TC.build(course_id=course_id_filter, academic_year_id=academic_year_id_filter,
+                                                  limit=100)
+        students = db_manager.execute_query(query, params, fetch_all=True)
         courses = get_courses()
         academic_years = get_academic_years()
 
@@ -151,12 +146,14 @@ def generate_tc(student_id):
             logger.warning(f"Student {student_id} has no valid DOB in DB (or it's empty/whitespace). Setting DOB_WORDS to 'N/A'. Raw DOB from DB: '{student_dob_from_db}'.")
 
         try:
-            # Step 1: Generate the physical TC files
+            # Step 1: Generate the physical TC files (load/replace/save/convert phases are timed)
+            timer = PhaseTimer('tc')
+            from utils.pdf_utils import TCGenerator # Loads python-docx on first use, keeping worker boot fast
             generator = TCGenerator()
-            docx_path, _ = generator.generate_tc_files(dict(student), tc_form_input)
+            docx_path, _ = generator.generate_tc_files(dict(student), tc_form_input, timer=timer)
             
             # Step 2: Save records to database within a single transaction
-            with db_manager.get_db_cursor(commit=True) as cursor:
+            with timer.phase('db_insert'), db_manager.transaction() as cursor:
                 # Insert the new TC record
                 cursor.execute(
                     """INSERT INTO transfer_certificates
@@ -171,7 +168,7 @@ def generate_tc(student_id):
                     (tc_form_input['date_of_leaving'], tc_form_input['conduct'], student_id)
                 )
 
-            
+            timer.log(logger, student_id=student_id, tc_number=tc_form_input['tc_number'])
 
             flash(f"TC (No: {tc_form_input['tc_number']}) generated successfully for {student['student_name']}.", 'success')
             return redirect(url_for('tc.preview_tc_for_student', student_id=student_id))
@@ -284,7 +281,7 @@ def delete_tc(student_id):
         return redirect(url_for('students.list_students'))
 
     try:
-        with db_manager.get_db_cursor(commit=True) as cursor:
+        with db_manager.transaction() as cursor:
             # 1. Delete the TC record
             cursor.execute("DELETE FROM transfer_certificates WHERE student_id = ?", (student_id,))
             # 2. Reset date_of_leaving and conduct in the students table
@@ -2,11 +2,24 @@
 
 document.addEventListener('DOMContentLoaded', function () {
     // Initialize Select2 for student search dropdown
-    if (document.getElementById('student_id')) {
-        $('#student_id').select2({
+    const studentSelect = document.getElementById('student_id');
+    if (studentSelect) {
+        const select2Options = {
             theme: 'bootstrap-5',
             placeholder: 'Type to search for a student...',
-        });
+        };
+        if (studentSelect.dataset.typeaheadUrl) {
+            // Suggestions come from the server-side index (/students/api/typeahead) while typing
+            select2Options.minimumInputLength = 1;
+            select2Options.ajax = {
+                url: studentSelect.dataset.typeaheadUrl,
+                dataType: 'json',
+                delay: 150,
+                data: params => ({ q: params.term, limit: 20 }),
+                processResults: data => data,
+            };
+        }
+        $('#student_id').select2(select2Options);
     }
 
     // Initialize Flatpickr for date fields
@@ -0,0 +1,90 @@
+document.addEventListener('DOMContentLoaded', function () {
+    // Charts of the fee analytics report; all four come from one /reports/api/fee-analytics call
+    const formatAmount = (value) => `₹ ${Number(value).toLocaleString('en-IN', { minimumFractionDigits: 2, maximumFractionDigits: 2 })}`;
+    const amountTooltip = {
+        callbacks: {
+            label: function(context) {
+                return `${context.dataset.label}: ${formatAmount(context.parsed.y)}`;
+            }
+        }
+    };
+
+    const barChart = (canvasId, labels, datasets, extraOptions = {}) => {
+        const ctx = document.getElementById(canvasId);
+        if (!ctx) {
+            return;
+        }
+        new Chart(ctx, {
+            type: 'bar',
+            data: { labels: labels, datasets: datasets },
+            options: Object.assign({
+                responsive: true,
+                maintainAspectRatio: false,
+                scales: { y: { beginAtZero: true } },
+                plugins: { tooltip: amountTooltip }
+            }, extraOptions)
+        });
+    };
+
+    fetch(typeof feeAnalyticsDataUrl !== 'undefined' ? feeAnalyticsDataUrl : '/reports/api/fee-analytics')
+        .then(response => response.json())
+        .then(data => {
+            // 1. Daily collections (line)
+            const dailyCtx = document.getElementById('dailyCollectionsChart');
+            if (dailyCtx) {
+                new Chart(dailyCtx, {
+                    type: 'line',
+                    data: {
+                        labels: data.daily.labels,
+                        datasets: [{
+                            label: 'Collected',
+                            data: data.daily.data,
+                            borderColor: 'rgba(16, 185, 129, 1)',
+                            backgroundColor: 'rgba(16, 185, 129, 0.2)',
+                            fill: true,
+                            pointRadius: 0,
+                            tension: 0.2
+                        }]
+                    },
+                    options: {
+                        responsive: true,
+                        maintainAspectRatio: false,
+                        scales: { y: { beginAtZero: true } },
+                        plugins: { legend: { display: false }, tooltip: amountTooltip }
+                    }
+                });
+            }
+
+            // 2. Monthly collections
+            barChart('monthlyCollectionsChart', data.monthly.labels, [{
+                label: 'Collected',
+                data: data.monthly.data,
+                backgroundColor: 'rgba(59, 130, 246, 0.7)',
+                borderColor: 'rgba(59, 130, 246, 1)',
+                borderWidth: 1,
+                borderRadius: 5
+            }], { plugins: { legend: { display: false }, tooltip: amountTooltip } });
+
+            // 3. Fee due against collected, per course
+            barChart('courseRatesChart', data.course_rates.labels, [{
+                label: 'Fee Due',
+                data: data.course_rates.due,
+                backgroundColor: 'rgba(148, 163, 184, 0.7)'
+            }, {
+                label: 'Collected',
+                data: data.course_rates.collected,
+                backgroundColor: 'rgba(16, 185, 129, 0.7)'
+            }]);
+
+            // 4. Outstanding balance by age
+            barChart('ageingChart', data.ageing.labels, [{
+                label: 'Outstanding',
+                data: data.ageing.outstanding,
+                backgroundColor: 'rgba(239, 68, 68, 0.7)',
+                borderColor: 'rgba(239, 68, 68, 1)',
+                borderWidth: 1,
+                borderRadius: 5
+            }], { plugins: { legend: { display: false }, tooltip: amountTooltip } });
+        })
+        .catch(error => console.error('Error fetching fee analytics data:', error));
+});
@@ -89,6 +89,9 @@ document.addEventListener('DOMContentLoaded', function() {
                 document.getElementById('successMessageText').textContent = result.message;
                 document.getElementById('admissionNoDisplay').textContent = result.admission_no;
                 document.getElementById('viewStudentBtn').href = result.student_url;
+                document.getElementById('successDuplicateWarning').innerHTML = duplicatesHtml(result.possible_duplicates,
+                    'This student looks like an existing student. Please check for a duplicate admission:');
+                document.getElementById('duplicateWarning').innerHTML = '';
                 successModal.show();
                             
                 // Reset the form and update admission number after the modal is hidden
@@ -154,10 +157,65 @@ document.addEventListener('DOMContentLoaded', function() {
             .replace(/\w\S*/g, (txt) => txt.charAt(0).toUpperCase() + txt.substr(1).toLowerCase());
     }
 
+    /**
+     * Builds a warning listing students who may be the same person, or '' when there are none.
+     * @param {Array} duplicates - Items from /students/api/possible-duplicates (or the add response).
+     * @param {string} heading - Text shown above the list.
+     * @returns {string} HTML for the warning.
+     */
+    function duplicatesHtml(duplicates, heading) {
+        if (!duplicates || duplicates.length === 0) return '';
+        const escape = (text) => String(text ?? '').replace(/[&<>"']/g, (c) => `&#${c.charCodeAt(0)};`);
+        let html = `<div class="alert alert-warning" role="alert"><strong>${escape(heading)}</strong><ul class="mb-0">`;
+        for (const d of duplicates) {
+            html += `<li><a href="${escape(d.url)}" target="_blank">${escape(d.name)} (${escape(d.admission_no)})</a>`
+                  + ` - ${escape(d.course_name)}, ${escape(d.academic_year)}: ${escape(d.reasons.join(', '))}</li>`;
+        }
+        return html + '</ul></div>';
+    }
+
+    /**
+     * Warns while the form is being filled in when the name, father's name and date of birth
+     * match a student already on record (possible re-admission under another spelling).
+     * The warning does not stop the form from being submitted.
+     */
+    function initializeDuplicateCheck(form) {
+        const url = form.dataset.duplicatesUrl;
+        const warning = document.getElementById('duplicateWarning');
+        if (!url || !warning) return;
+        let timer = null;
+        const check = () => {
+            clearTimeout(timer);
+            timer = setTimeout(async () => {
+                const params = new URLSearchParams();
+                for (const field of ['student_name', 'surname', 'father_name', 'dob']) {
+                    params.set(field, form.elements[field] ? form.elements[field].value : '');
+                }
+                if (!params.get('student_name')) {
+                    warning.innerHTML = '';
+                    return;
+                }
+                try {
+                    const response = await fetch(`${url}?${params}`, { headers: { 'X-Requested-With': 'XMLHttpRequest' } });
+                    if (response.ok) {
+                        const result = await response.json();
+                        warning.innerHTML = duplicatesHtml(result.duplicates, 'Possible duplicate admission:');
+                    }
+                } catch (error) {
+                    console.error('Duplicate check failed:', error);
+                }
+            }, 300);
+        };
+        for (const field of ['student_name', 'surname', 'father_name', 'dob']) {
+            if (form.elements[field]) form.elements[field].addEventListener('change', check);
+        }
+    }
+
     // Attach the AJAX submission handler to the registration form
     const studentRegistrationForm = document.getElementById('studentRegistrationForm');
     if (studentRegistrationForm) {
         studentRegistrationForm.addEventListener('submit', handleStudentFormSubmit);
+        initializeDuplicateCheck(studentRegistrationForm);
     }
     
     // The edit form does not use AJAX by default in this setup, it uses standard form submission.
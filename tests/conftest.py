@@ -0,0 +1,60 @@
+# tests/conftest.py
+"""
+Shared fixtures: one app per test session on a temporary SQLite database, with the
+in-process SimpleCache instead of Redis, and a test client logged in as an admin.
+
+The database starts with the schema, the migrations and a course and academic year
+(COURSE_NAME, ACADEMIC_YEAR) for the tests to admit students into.
+"""
+
+import io
+
+import pytest
+
+from app import create_app
+from config import TestingConfig
+from models.db_pool import db_manager
+
+pytest_plugins = ['utils.pytest_query_budget']
+
+COURSE_NAME = 'B.Sc Computers'
+ACADEMIC_YEAR = '2024-2027'
+STUDENT_CSV_HEADER = ("student_name,surname,father_name,mother_name,dob,gender,mobile_no,email,address,"
+                      "course_name,academic_year,date_of_admission,type,nationality,religion,caste,category")
+
+
+@pytest.fixture(scope='session')
+def app(tmp_path_factory):
+    with pytest.MonkeyPatch.context() as monkeypatch:
+        monkeypatch.setattr(TestingConfig, 'DATABASE_PATH', str(tmp_path_factory.mktemp('db') / 'test_college.db'))
+        monkeypatch.setattr(TestingConfig, 'CACHE_TYPE', 'SimpleCache')
+        monkeypatch.setattr(TestingConfig, 'METRICS_DIR', None)
+        app = create_app('testing')
+        with app.app_context():
+            with db_manager.transaction():
+                db_manager.execute_query("INSERT INTO courses (course_name, course_code, type, year) VALUES (?, 'BC', 'R', 2024)",
+                                         (COURSE_NAME,), commit=True)
+                db_manager.execute_query("INSERT INTO academic_years (academic_year) VALUES (?)", (ACADEMIC_YEAR,), commit=True)
+        yield app
+
+
+@pytest.fixture
+def client(app):
+    """Test client with an admin session."""
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session['admin_logged_in'] = True
+        session['username'] = 'admin'
+        session['admin_id'] = 1
+    return client
+
+
+def student_csv(rows) -> io.BytesIO:
+    """A bulk-import CSV file of rows given as dicts (missing columns are left empty)."""
+    columns = STUDENT_CSV_HEADER.split(',')
+    lines = [STUDENT_CSV_HEADER]
+    for row in rows:
+        row = {'course_name': COURSE_NAME, 'academic_year': ACADEMIC_YEAR, 'gender': 'Male', 'date_of_admission': '01-08-2024',
+               'type': 'New Admission', 'nationality': 'Indian', 'religion': 'Hindu', 'caste': 'OC', **row}
+        lines.append(",".join(str(row.get(column, '')) for column in columns))
+    return io.BytesIO(("\n".join(lines) + "\n").encode('utf-8'))
@@ -0,0 +1,43 @@
+# tests/test_duplicate_detection.py
+"""Likely-duplicate detection (utils/duplicate_detection.py)."""
+
+import pytest
+
+from utils.duplicate_detection import WEIGHTS, DuplicateBatch, _dob_similarity, _Entry, _phonetic, _score
+
+
+def _student(name, surname, father='Venkata Rao', dob='2005-03-04'):
+    return {'student_name': name, 'surname': surname, 'father_name': father, 'dob': dob}
+
+
+@pytest.mark.parametrize('spellings, key', [
+    (('Lakshmi', 'Laxmi'), 'lxm'),
+    (('Sreenivasa', 'Srinivas'), 'srnvs'),
+])
+def test_phonetic_folds_transliteration_variants(spellings, key):
+    assert [_phonetic(word.lower()) for word in spellings] == [key, key] # Fed the lower-case words of _words()
+
+
+def test_score_ignores_name_and_surname_order():
+    score, reasons = _score(_Entry(_student('Lakshmi', 'Kolli')), _Entry(_student('Kolli', 'Lakshmi')))
+    assert score == 1.0
+    assert reasons == ['same name', "same father's name", 'same date of birth']
+
+
+def test_score_day_and_month_swapped_dob():
+    assert _dob_similarity('2005-03-04', '2005-04-03') == 0.7
+    score, reasons = _score(_Entry(_student('Lakshmi', 'Kolli', dob='2005-03-04')),
+                            _Entry(_student('Lakshmi', 'Kolli', dob='2005-04-03')))
+    assert score == pytest.approx(WEIGHTS['name'] + WEIGHTS['father_name'] + WEIGHTS['dob'] * 0.7)
+    assert 'date of birth differs by a typo' in reasons
+
+
+def test_batch_catches_duplicate_of_earlier_row_in_same_file(app):
+    with app.test_request_context():
+        batch = DuplicateBatch()
+        first = _student('Sreenivasa', 'Gorantla', father='Ramana Murthy')
+        assert batch.check(first) == []
+        batch.add(first)
+        duplicates = batch.check(_student('Srinivas', 'Gorantla', father='Ramana Murthy'))
+    assert [d['name'] for d in duplicates] == ['Sreenivasa Gorantla']
+    assert duplicates[0]['id'] is None # Not saved yet
@@ -0,0 +1,12 @@
+# tests/test_import_budget.py
+"""Start-up imports of the app (see benchmarks/import_budget.py)."""
+
+from benchmarks.import_budget import _is_deferred, measure_imports
+
+
+def test_app_import_defers_document_libraries():
+    # A fresh interpreter, so modules imported by other tests don't count
+    timings = measure_imports('app')
+    assert 'app' in timings
+    deferred = sorted(name for name in timings if _is_deferred(name))
+    assert not deferred, f"document libraries imported at start-up: {', '.join(deferred)}"
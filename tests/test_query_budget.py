@@ -0,0 +1,38 @@
+# tests/test_query_budget.py
+"""Query budgets of the student list and the bulk student import (see utils/pytest_query_budget.py)."""
+
+from models.db_pool import db_manager
+from tests.conftest import student_csv
+
+IMPORT_ROWS = 20
+
+
+def _import(client, rows):
+    return client.post('/students/bulk_import', data={'csv_file': (student_csv(rows), 'students.csv')},
+                       content_type='multipart/form-data')
+
+
+def test_student_list_query_budget(client, query_budget):
+    _import(client, [{'student_name': f'Listed{i}', 'surname': 'Rao', 'father_name': f'Father{i}', 'dob': '01-01-2005'}
+                     for i in range(5)])
+    client.get('/students/list') # Warm the per-worker lookups
+    with query_budget(5, per_query=1):
+        response = client.get('/students/list')
+    assert response.status_code == 200
+
+
+def test_bulk_import_query_budget(app, client, query_budget):
+    rows = [{'student_name': f'Imported{i}', 'surname': 'Kumar', 'father_name': f'Parent{i}',
+             'dob': f'{i % 28 + 1:02d}-03-2006'} for i in range(IMPORT_ROWS)]
+    # Per row: the admission-number serial, the insert, and the course and academic year by id
+    # (re-read because each row's savepoint write clears the request's identity maps)
+    with query_budget(4 * IMPORT_ROWS + 10, per_query=IMPORT_ROWS + 1) as queries:
+        response = _import(client, rows)
+    assert response.status_code == 302
+    with app.app_context():
+        imported = db_manager.execute_query("SELECT COUNT(*) AS n FROM students WHERE student_name LIKE 'Imported%'", fetch_one=True)
+    assert imported['n'] == IMPORT_ROWS
+    # Names and the fee structure are resolved once per file, not once per row
+    assert queries.count("select id from courses where course_name = ?") == 1
+    assert queries.count("select id from academic_years where academic_year = ?") == 1
+    assert queries.count("select id from fee_structure where course_id = ? and academic_year_id = ?") == 1
@@ -1,4 +1,5 @@
 from models.db_pool import db_manager # Assuming db_manager is initialized and available
+from models.query_stats import detect_n_plus_one
 from datetime import datetime
 import logging
 from typing import Optional
@@ -24,20 +25,12 @@ def generate_admission_number(course_id: int, academic_year_id: int):
     Raises:
         ValueError: If course or academic year not found.
     """
-    course = db_manager.execute_query(
-        "SELECT course_code, type, is_special_format FROM courses WHERE id = ?", # Fetch is_special_format
-        (course_id,),
-        fetch_one=True
-    )
+    course = db_manager.courses.get(course_id) # Memoised per request; includes is_special_format
     if not course:
         logger.error(f"Course with ID {course_id} not found for admission number generation.")
         raise ValueError(f"Course details not found for ID {course_id}.")
 
-    academic_year_details = db_manager.execute_query(
-        "SELECT academic_year FROM academic_years WHERE id = ?",
-        (academic_year_id,),
-        fetch_one=True
-    )
+    academic_year_details = db_manager.academic_years.get(academic_year_id)
     if not academic_year_details:
         logger.error(f"Academic year with ID {academic_year_id} not found for admission number generation.")
         raise ValueError(f"Academic year details not found for ID {academic_year_id}.")
@@ -262,6 +255,7 @@ def get_next_available_admission_number_preview(course_id: int, academic_year_id
         logger.warning(f"Could not generate preview admission number for course {course_id}, AY {academic_year_id}: {e}")
         return f"Error: {str(e)}"
 
+@detect_n_plus_one('regenerate_admission_numbers')
 def regenerate_admission_numbers_for_academic_year(academic_year_id: int, course_id: Optional[int] = None) -> int:
     """
     Regenerate all admission numbers for a specific academic year, grouped by course.
@@ -280,11 +274,7 @@ def regenerate_admission_numbers_for_academic_year(academic_year_id: int, course
     logger.warning(f"Starting regeneration of admission numbers for academic year ID: {academic_year_id}. THIS IS A DESTRUCTIVE OPERATION.")
     
     # Get academic year details (specifically the starting year string)
-    academic_year_details = db_manager.execute_query(
-        "SELECT academic_year FROM academic_years WHERE id = ?",
-        (academic_year_id,),
-        fetch_one=True
-    )
+    academic_year_details = db_manager.academic_years.get(academic_year_id)
     if not academic_year_details:
         logger.error(f"Cannot regenerate: Academic year with ID {academic_year_id} not found.")
         raise ValueError(f"Academic year details not found for ID {academic_year_id}, regeneration aborted.")
@@ -321,53 +311,56 @@ def regenerate_admission_numbers_for_academic_year(academic_year_id: int, course
     current_course_id = None
     current_serial = 0
 
-    for student in students_to_update:
-        if student['course_id'] != current_course_id:
-            current_course_id = student['course_id']
-            current_serial = 0  # Reset serial for new course
+    # One transaction for the whole renumbering (one commit instead of one per student);
+    # each UPDATE runs in its own savepoint, so a failed student is skipped as before
+    with db_manager.transaction():
+        for student in students_to_update:
+            if student['course_id'] != current_course_id:
+                current_course_id = student['course_id']
+                current_serial = 0  # Reset serial for new course
 
-        current_serial += 1
+            current_serial += 1
 
-        course_code_str = student['course_code'].upper()
-        is_special = student['is_special_format'] == 1
+            course_code_str = student['course_code'].upper()
+            is_special = student['is_special_format'] == 1
         
-        max_serial_for_format = 0
-        formatted_serial = ""
-
-        if is_special:
-            # 3-char course code, 2-digit serial
-            if len(course_code_str) != 3:
-                logger.error(f"Regen Error: Special format course ID {student['course_id']} (student ID {student['id']}) has code '{course_code_str}', expected 3 chars. Skipping.")
-                continue
-            max_serial_for_format = 99
-            formatted_serial = f"{current_serial:02d}"
-        else:
-            # 2-char course code, 3-digit serial
-            if len(course_code_str) != 2:
-                logger.error(f"Regen Error: Standard format course ID {student['course_id']} (student ID {student['id']}) has code '{course_code_str}', expected 2 chars. Skipping.")
-                continue
-            max_serial_for_format = 999
-            formatted_serial = f"{current_serial:03d}"
-
-        if current_serial > max_serial_for_format:
-            logger.error(f"Serial number overflow (>{max_serial_for_format}) for student ID {student['id']}, course ID {current_course_id} (special: {is_special}) during regeneration. Serial was {current_serial}. Skipping update for this student.")
-            continue 
-
-        new_admission_number = f"{starting_year_str}{course_code_str}{formatted_serial}"
+            max_serial_for_format = 0
+            formatted_serial = ""
+
+            if is_special:
+                # 3-char course code, 2-digit serial
+                if len(course_code_str) != 3:
+                    logger.error(f"Regen Error: Special format course ID {student['course_id']} (student ID {student['id']}) has code '{course_code_str}', expected 3 chars. Skipping.")
+                    continue
+                max_serial_for_format = 99
+                formatted_serial = f"{current_serial:02d}"
+            else:
+                # 2-char course code, 3-digit serial
+                if len(course_code_str) != 2:
+                    logger.error(f"Regen Error: Standard format course ID {student['course_id']} (student ID {student['id']}) has code '{course_code_str}', expected 2 chars. Skipping.")
+                    continue
+                max_serial_for_format = 999
+                formatted_serial = f"{current_serial:03d}"
+
+            if current_serial > max_serial_for_format:
+                logger.error(f"Serial number overflow (>{max_serial_for_format}) for student ID {student['id']}, course ID {current_course_id} (special: {is_special}) during regeneration. Serial was {current_serial}. Skipping update for this student.")
+                continue 
+
+            new_admission_number = f"{starting_year_str}{course_code_str}{formatted_serial}"
         
-        try:
-            # Check for potential conflicts before updating if paranoid, though ordering should prevent it
-            # if this is the sole process modifying these numbers.
-            db_manager.execute_query(
-                "UPDATE students SET admission_no = ?, serial_no = ? WHERE id = ?",
-                (new_admission_number, current_serial, student['id']),
-                commit=True 
-            )
-            updated_count += 1
-            logger.debug(f"Updated student ID {student['id']} to admission_no: {new_admission_number}, serial_no: {current_serial}")
-        except Exception as e: # Catch specific db errors if possible
-            logger.error(f"Failed to update admission number for student ID {student['id']} to {new_admission_number} (Serial: {current_serial}): {e}", exc_info=True)
-            # Potentially rollback or collect errors for summary
+            try:
+                # Check for potential conflicts before updating if paranoid, though ordering should prevent it
+                # if this is the sole process modifying these numbers.
+                db_manager.execute_query(
+                    "UPDATE students SET admission_no = ?, serial_no = ? WHERE id = ?",
+                    (new_admission_number, current_serial, student['id']),
+                    commit=True 
+                )
+                updated_count += 1
+                logger.debug(f"Updated student ID {student['id']} to admission_no: {new_admission_number}, serial_no: {current_serial}")
+            except Exception as e: # Catch specific db errors if possible
+                logger.error(f"Failed to update admission number for student ID {student['id']} to {new_admission_number} (Serial: {current_serial}): {e}", exc_info=True)
+                # Potentially rollback or collect errors for summary
 
     logger.info(f"Successfully regenerated admission numbers for {updated_count} students in academic year ID {academic_year_id}.")
     return updated_count
\ No newline at end of file
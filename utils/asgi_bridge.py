@@ -0,0 +1,181 @@
+# utils/asgi_bridge.py
+"""
+ASGI front end for the Flask app, used by asgi.py.
+
+Under gunicorn sync workers a request holds its worker for its whole life, including a
+slow client draining a CSV download. Behind an ASGI server (uvicorn) the connections
+live on the event loop instead, and the Flask app only occupies a thread while it has
+work to do:
+
+- requests run in a pool of ASGI_THREADS threads per worker process;
+- document endpoints (ASGI_DOCUMENT_ENDPOINTS: PDF/DOCX generation) run in a separate
+  pool of ASGI_DOCUMENT_THREADS, so a burst of report conversions cannot starve the
+  JSON APIs (next admission number, typeahead, chart data);
+- response bodies are pulled from the app one chunk at a time, so a streamed download
+  holds a thread while a chunk is being produced, not while the client reads it.
+
+The database layer stays synchronous (pooled read connections and one writer, see
+models/db_pool.py). Its queries take milliseconds, and an async driver (aiosqlite) would
+run each connection in a thread of its own anyway. Each request keeps one
+contextvars.Context for all of its pool calls, so Flask's request context is still in
+place when a streamed body resumes on another thread.
+"""
+
+import asyncio
+import contextvars
+import sys
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+
+from werkzeug.exceptions import HTTPException
+
+from utils.metrics import inc_counter
+
+SPOOL_MAX_BYTES = 1024 * 1024 # Request bodies above this (file uploads) are buffered on disk
+_END = object()
+
+
+class AsgiBridge:
+    """ASGI application that runs a WSGI Flask app in thread pools."""
+
+    def __init__(self, app):
+        self.app = app
+        self.threads = app.config.get('ASGI_THREADS', 8)
+        self.document_threads = app.config.get('ASGI_DOCUMENT_THREADS', 2)
+        self.document_endpoints = frozenset(app.config.get('ASGI_DOCUMENT_ENDPOINTS', ()))
+        self._pools = {} # Created on first use, i.e. in the worker process
+
+    def _pool(self, kind):
+        pool = self._pools.get(kind)
+        if pool is None:
+            size = self.document_threads if kind == 'documents' else self.threads
+            pool = self._pools[kind] = ThreadPoolExecutor(max_workers=size, thread_name_prefix=f"asgi-{kind}")
+        return pool
+
+    def _pool_kind(self, environ):
+        """'documents' for ASGI_DOCUMENT_ENDPOINTS, otherwise 'requests'."""
+        if not self.document_endpoints:
+            return 'requests'
+        try:
+            endpoint, _ = self.app.url_map.bind('localhost').match(environ['PATH_INFO'], environ['REQUEST_METHOD'])
+        except HTTPException: # 404/405/redirects: Flask answers them itself
+            return 'requests'
+        return 'documents' if endpoint in self.document_endpoints else 'requests'
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            await self._lifespan(receive, send)
+        elif scope['type'] == 'http':
+            await self._http(scope, receive, send)
+        else: # No websocket endpoints
+            await send({'type': 'websocket.close', 'code': 1000})
+
+    async def _lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                for pool in self._pools.values():
+                    pool.shutdown(wait=True)
+                self._pools.clear()
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    async def _read_body(self, receive):
+        body = tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_BYTES)
+        while True:
+            message = await receive()
+            if message['type'] == 'http.disconnect':
+                body.close()
+                return None
+            body.write(message.get('body', b''))
+            if not message.get('more_body'):
+                body.seek(0)
+                return body
+
+    def _environ(self, scope, body):
+        root_path = scope.get('root_path', '')
+        path = scope['path']
+        if root_path and path.startswith(root_path):
+            path = path[len(root_path):]
+        server = scope.get('server') or ('localhost', 80)
+        environ = {
+            'REQUEST_METHOD': scope['method'],
+            'SCRIPT_NAME': root_path.encode('utf-8').decode('latin-1'),
+            'PATH_INFO': path.encode('utf-8').decode('latin-1'), # WSGI carries the raw bytes as latin-1
+            'QUERY_STRING': scope.get('query_string', b'').decode('latin-1'),
+            'SERVER_NAME': str(server[0]),
+            'SERVER_PORT': str(server[1]),
+            'SERVER_PROTOCOL': f"HTTP/{scope.get('http_version', '1.1')}",
+            'wsgi.version': (1, 0),
+            'wsgi.url_scheme': scope.get('scheme', 'http'),
+            'wsgi.input': body,
+            'wsgi.errors': sys.stderr,
+            'wsgi.multithread': True,
+            'wsgi.multiprocess': True,
+            'wsgi.run_once': False,
+        }
+        if scope.get('client'):
+            environ['REMOTE_ADDR'], environ['REMOTE_PORT'] = scope['client'][0], str(scope['client'][1])
+        for name, value in scope.get('headers', ()):
+            name = name.decode('latin-1').upper().replace('-', '_')
+            value = value.decode('latin-1')
+            key = name if name in ('CONTENT_TYPE', 'CONTENT_LENGTH') else f"HTTP_{name}"
+            environ[key] = f"{environ[key]},{value}" if key in environ else value
+        return environ
+
+    async def _http(self, scope, receive, send):
+        body = await self._read_body(receive)
+        if body is None:
+            return # Client went away before sending the whole request
+        environ = self._environ(scope, body)
+        loop = asyncio.get_running_loop()
+        pool = self._pool(self._pool_kind(environ))
+        context = contextvars.copy_context()
+        response = {}
+
+        def run(function, *args):
+            return loop.run_in_executor(pool, context.run, function, *args)
+
+        def start_response(status, headers, exc_info=None):
+            if exc_info and 'sent' in response:
+                raise exc_info[1].with_traceback(exc_info[2])
+            response['status'] = int(status.split(' ', 1)[0])
+            response['headers'] = [(name.lower().encode('latin-1'), value.encode('latin-1')) for name, value in headers]
+            return response.setdefault('written', []).append # Legacy write() callable
+
+        def start():
+            # The first chunk is produced in the same call: apps may defer start_response until then
+            iterable = self.app(environ, start_response)
+            iterator = iter(iterable)
+            return iterable, iterator, next(iterator, _END)
+
+        disconnected = asyncio.Event()
+        async def watch_disconnect():
+            while (await receive())['type'] != 'http.disconnect':
+                pass
+            disconnected.set()
+        watcher = asyncio.ensure_future(watch_disconnect())
+
+        iterable = None
+        try:
+            iterable, iterator, chunk = await run(start)
+            response['sent'] = True
+            await send({'type': 'http.response.start', 'status': response['status'], 'headers': response['headers']})
+            pending = b''.join(response.pop('written', ()))
+            while chunk is not _END:
+                if disconnected.is_set(): # Stop producing a download nobody is reading
+                    inc_counter('satcms_asgi_client_disconnects_total')
+                    return
+                if chunk:
+                    await send({'type': 'http.response.body', 'body': pending + chunk, 'more_body': True})
+                    pending = b''
+                chunk = await run(next, iterator, _END)
+            await send({'type': 'http.response.body', 'body': pending, 'more_body': False})
+        finally:
+            watcher.cancel()
+            if iterable is not None and hasattr(iterable, 'close'):
+                # Runs the request teardown of streamed responses (e.g. returns the read connection)
+                await run(iterable.close)
+            body.close()
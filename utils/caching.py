@@ -5,38 +5,76 @@ WARNING: This is process-specific and not suitable for multi-process or multi-se
 For production environments, consider using a distributed cache like Redis or Memcached with Flask-Caching.
 """
 
+from collections import OrderedDict
 from functools import wraps
 import time
-from flask import current_app # Used for logging and app context awareness
+import math
+import random
+import threading
+from flask import current_app, g, has_request_context # Used for logging and app context awareness
 import hashlib # For more robust cache key generation
 from flask_caching import Cache
+from utils.metrics import inc_counter
 
 # Create a cache manager instance.
 # This instance will be configured and initialized with the Flask app
 # in the application factory (create_app).
 cache_manager = Cache()
 
-# Simple in-memory cache (dictionary-based)
-_cache = {} # Stores cached data: {'cache_key': data}
+# Simple in-memory cache (dictionary-based), kept in least-recently-used order
+_cache = OrderedDict() # Stores cached data: {'cache_key': data}
 _cache_expiry = {} # Stores expiry timestamps: {'cache_key': timestamp}
+_cache_stale_until = {} # Stores the end of the stale-while-revalidate window: {'cache_key': timestamp}
+_cache_compute_time = {} # Stores how long the value took to compute (seconds), used for early refresh
+_tag_index = {} # Stores the keys registered under each tag: {'tag': {'cache_key', ...}}
+# Latest key stored per call for data-versioned entries: {'key without version': 'key with version'}.
+# A write changes the version part of the key, so the entry for the old version is dropped
+# as soon as the new one is stored instead of lingering until it expires.
+_versioned_keys = {}
+_store_guard = threading.RLock() # Serialises inserts and evictions across the dicts above
+
+# Single-flight bookkeeping: one lock per cache key so only one caller recomputes a value.
+_key_locks = {}
+_key_locks_guard = threading.Lock()
 
 DEFAULT_TIMEOUT = 300  # Default cache timeout in seconds (5 minutes)
+DEFAULT_MAX_ENTRIES = 1024  # Entries kept before the least recently used are evicted (MEMORY_CACHE_MAX_ENTRIES)
+DEFAULT_STALE_TTL = 60  # How long an expired value may still be served while it is being recomputed
+DEFAULT_EARLY_REFRESH_BETA = 1.0  # XFetch beta; higher values refresh earlier, 0 disables early refresh
+SINGLE_FLIGHT_WAIT = 10  # Max seconds a caller waits for another caller's recompute before computing itself
+
+def _count_lookup(result: str):
+    """Counts a cache lookup in the metrics and, for Server-Timing, on the current request."""
+    inc_counter('satcms_cache_requests_total', {'result': result})
+    if has_request_context():
+        lookups = g.setdefault('_cache_lookups', {})
+        lookups[result] = lookups.get(result, 0) + 1
+
+
+def get_cache_lookups() -> dict:
+    """Cache lookups made by the current request, by result: {'hit': n, 'miss': n, 'stale': n}."""
+    return dict(g.get('_cache_lookups', {})) if has_request_context() else {}
+
 
 def get_from_cache(key: str):
     """
     Retrieves an item from the cache if it exists and hasn't expired.
     If the item is expired, it's removed from the cache.
     """
-    if key in _cache_expiry and _cache_expiry[key] < time.time():
-        # Item has expired
-        _cache.pop(key, None)
-        _cache_expiry.pop(key, None)
+    now = time.time()
+    if key in _cache_expiry and _cache_expiry[key] < now:
+        # Item has expired. Keep it around while it may still be served stale by cached().
+        if _cache_stale_until.get(key, 0) < now:
+            _evict(key)
         if current_app and current_app.debug:
              current_app.logger.debug(f"Cache EXPIRED for key: {key}")
+        _count_lookup('miss')
         return None
     
     cached_value = _cache.get(key)
+    _count_lookup('hit' if cached_value is not None else 'miss')
     if cached_value is not None:
+        _touch(key)
         if current_app and current_app.debug:
             current_app.logger.debug(f"Cache HIT for key: {key}")
     elif current_app and current_app.debug:
@@ -44,18 +82,70 @@ def get_from_cache(key: str):
         
     return cached_value
 
-def set_in_cache(key: str, value, timeout: int = DEFAULT_TIMEOUT):
+def _touch(key: str):
+    """Marks a key as most recently used."""
+    try:
+        _cache.move_to_end(key)
+    except KeyError: # Evicted by another thread in the meantime
+        pass
+
+def _evict(key: str):
+    """Removes every trace of a key from the in-memory cache, including its single-flight lock."""
+    with _store_guard:
+        _cache.pop(key, None)
+        _cache_expiry.pop(key, None)
+        _cache_stale_until.pop(key, None)
+        _cache_compute_time.pop(key, None)
+    _drop_key_lock(key)
+
+def _max_entries() -> int:
+    return current_app.config.get('MEMORY_CACHE_MAX_ENTRIES', DEFAULT_MAX_ENTRIES) if current_app else DEFAULT_MAX_ENTRIES
+
+def _enforce_size_limit():
+    """
+    Keeps the cache within its entry limit: entries past their stale window go first,
+    then the least recently used ones. Tag index and version entries of evicted keys are pruned too.
+    """
+    limit = _max_entries()
+    if limit <= 0 or len(_cache) <= limit:
+        return
+    with _store_guard:
+        now = time.time()
+        for key in [key for key, until in _cache_stale_until.items() if until < now]:
+            _evict(key)
+        while len(_cache) > limit:
+            _evict(next(iter(_cache)))
+        for tag in list(_tag_index):
+            keys = _tag_index[tag]
+            keys.intersection_update(_cache)
+            if not keys:
+                del _tag_index[tag]
+        for unversioned_key in [unversioned_key for unversioned_key, key in _versioned_keys.items() if key not in _cache]:
+            del _versioned_keys[unversioned_key]
+
+def set_in_cache(key: str, value, timeout: int = DEFAULT_TIMEOUT, stale_ttl: int = 0, compute_time: float = 0.0,
+                 tags=()):
     """
     Sets an item in the cache with an expiry time.
     A timeout of 0 or negative means cache indefinitely (or until cleared).
+    stale_ttl keeps the value available to cached() for that many seconds after expiry,
+    and compute_time records how expensive the value was to produce (for early refresh).
+    tags registers the key under each tag so invalidate_tags() can drop related entries together.
     """
     if timeout <= 0: # Treat 0 or negative as "no expiry" for this simple cache
         expiry_time = float('inf') 
     else:
         expiry_time = time.time() + timeout
 
-    _cache[key] = value
-    _cache_expiry[key] = expiry_time
+    with _store_guard:
+        _cache[key] = value
+        _cache.move_to_end(key)
+        _cache_expiry[key] = expiry_time
+        _cache_stale_until[key] = expiry_time + max(stale_ttl, 0)
+        _cache_compute_time[key] = compute_time
+        for tag in tags:
+            _tag_index.setdefault(tag, set()).add(key)
+    _enforce_size_limit()
     if current_app and current_app.debug:
         log_timeout = f"{timeout}s" if timeout > 0 else "indefinitely"
         current_app.logger.debug(f"Cache SET for key: {key} with timeout: {log_timeout}")
@@ -65,18 +155,36 @@ def clear_cache(key: str = None):
     """
     Clears a specific key from the cache, or the entire cache if no key is provided.
     """
-    global _cache, _cache_expiry # Needed as we are reassigning global _cache and _cache_expiry
     if key:
-        _cache.pop(key, None)
-        _cache_expiry.pop(key, None)
+        _evict(key)
         if current_app and current_app.debug:
             current_app.logger.info(f"Cache CLEARED for key: {key}")
     else:
-        _cache = {}
-        _cache_expiry = {}
+        # Clear in place so modules holding a reference to the dicts see the change
+        _cache.clear()
+        _cache_expiry.clear()
+        _cache_stale_until.clear()
+        _cache_compute_time.clear()
+        _tag_index.clear()
+        _versioned_keys.clear()
+        with _key_locks_guard:
+            for lock_key in [lock_key for lock_key, lock in _key_locks.items() if not lock.locked()]:
+                del _key_locks[lock_key]
         if current_app and current_app.debug:
             current_app.logger.info("Entire in-memory cache CLEARED.")
 
+def invalidate_tags(*tags):
+    """Removes every cache entry registered under any of the given tags."""
+    for tag in tags:
+        for key in _tag_index.pop(tag, ()):
+            _evict(key)
+    if current_app and current_app.debug:
+        current_app.logger.debug(f"Cache INVALIDATED for tags: {', '.join(map(str, tags))}")
+
+def get_cache_size() -> int:
+    """Returns the number of entries currently held (including stale ones)."""
+    return len(_cache)
+
 def _generate_cache_key(prefix: str, func_name: str, args, kwargs) -> str:
     """Helper to generate a cache key."""
     key_parts = [prefix, func_name]
@@ -97,13 +205,84 @@ def _generate_cache_key(prefix: str, func_name: str, args, kwargs) -> str:
     return prefix + hashlib.md5(serialized_parts.encode('utf-8')).hexdigest()
 
 
-def cached(timeout: int = DEFAULT_TIMEOUT, cache_key_prefix: str = "view_cache_"):
+def _get_key_lock(key: str) -> threading.Lock:
+    """Returns the single-flight lock for a cache key, creating it on first use."""
+    lock = _key_locks.get(key)
+    if lock is None:
+        with _key_locks_guard:
+            lock = _key_locks.setdefault(key, threading.Lock())
+    return lock
+
+def _drop_key_lock(key: str):
+    """
+    Forgets the single-flight lock of a key that is no longer cached. A lock someone holds
+    is kept; its holder drops it on release (see _release_key_lock) if the key is still absent.
+    """
+    with _key_locks_guard:
+        lock = _key_locks.get(key)
+        if lock is not None and not lock.locked():
+            del _key_locks[key]
+
+def _release_key_lock(key: str, lock: threading.Lock):
+    lock.release()
+    if key not in _cache: # Nothing was stored (None result or evicted meanwhile)
+        _drop_key_lock(key)
+
+def _should_refresh_early(key: str, now: float, beta: float) -> bool:
+    """
+    Probabilistic early expiration ("XFetch"). Each caller independently decides to
+    refresh a still-fresh value with a probability that grows as expiry approaches and
+    with how long the value took to compute, so refreshes are spread out instead of
+    every worker missing at the same instant.
+    """
+    if beta <= 0:
+        return False
+    expiry = _cache_expiry.get(key, float('inf'))
+    delta = _cache_compute_time.get(key, 0.0)
+    if expiry == float('inf') or delta <= 0:
+        return False
+    return now - delta * beta * math.log(1.0 - random.random()) >= expiry
+
+def _compute_and_store(key, func, args, kwargs, timeout, stale_ttl, unversioned_key=None):
+    """
+    Runs func and stores its result (if not None) along with how long it took.
+    For data-versioned keys, unversioned_key is the key without the version part; the
+    entry stored under an older version of it is superseded and dropped.
+    """
+    started = time.perf_counter()
+    result = func(*args, **kwargs)
+    if result is not None:
+        set_in_cache(key, result, timeout, stale_ttl=stale_ttl, compute_time=time.perf_counter() - started)
+        if unversioned_key is not None:
+            with _store_guard:
+                previous = _versioned_keys.get(unversioned_key)
+                _versioned_keys[unversioned_key] = key
+            if previous is not None and previous != key:
+                _evict(previous)
+    return result
+
+def cached(timeout: int = DEFAULT_TIMEOUT, cache_key_prefix: str = "view_cache_",
+           stale_ttl: int = DEFAULT_STALE_TTL, early_refresh_beta: float = DEFAULT_EARLY_REFRESH_BETA,
+           depends_on: tuple = ()):
     """
     Decorator to cache the result of a function using the simple in-memory cache.
+    The cache holds at most MEMORY_CACHE_MAX_ENTRIES entries (least recently used go first).
+
+    Expensive values are protected against cache stampedes:
+    - Single-flight: only one caller per key recomputes a missing value; concurrent
+      callers wait for it instead of running the same query.
+    - Stale-while-revalidate: for stale_ttl seconds after expiry the old value is served
+      to everyone except the one caller that is refreshing it.
+    - Probabilistic early refresh: a fresh value may be recomputed shortly before it
+      expires, so expiry rarely happens under load at all.
     
     Args:
         timeout (int): Cache timeout in seconds. Use 0 or negative for indefinite.
         cache_key_prefix (str): Prefix for the cache key.
+        stale_ttl (int): Seconds an expired value may still be served while being refreshed.
+        early_refresh_beta (float): Aggressiveness of early refresh; 0 disables it.
+        depends_on (tuple): Table names the result is built from. Their data versions are part
+                            of the key, so a write to any of them (from any worker) is a cache miss.
     """
     def decorator(func):
         @wraps(func)
@@ -111,15 +290,46 @@ def cached(timeout: int = DEFAULT_TIMEOUT, cache_key_prefix: str = "view_cache_"
             if not current_app: # Cannot cache if not in an app context (e.g. during tests without app setup)
                 return func(*args, **kwargs)
 
-            cache_key = _generate_cache_key(cache_key_prefix, func.__name__, args, kwargs)
-            
-            cached_value = get_from_cache(cache_key)
+            cache_key = unversioned_key = _generate_cache_key(cache_key_prefix, func.__name__, args, kwargs)
+            if depends_on:
+                from models.db_pool import db_manager # Imported here: models.db_pool imports this module
+                cache_key += ":" + db_manager.data_version_token(depends_on)
+            else:
+                unversioned_key = None
+            now = time.time()
+
+            cached_value = _cache.get(cache_key)
             if cached_value is not None:
-                return cached_value
-            
-            result = func(*args, **kwargs)
-            set_in_cache(cache_key, result, timeout)
-            return result
+                is_fresh = _cache_expiry.get(cache_key, 0) >= now
+                servable = is_fresh or _cache_stale_until.get(cache_key, 0) >= now
+                if is_fresh and not _should_refresh_early(cache_key, now, early_refresh_beta):
+                    get_from_cache(cache_key) # Keeps hit logging in one place
+                    return cached_value
+                if servable:
+                    # Stale (or due for early refresh): one caller refreshes, the rest get the old value.
+                    lock = _get_key_lock(cache_key)
+                    if not lock.acquire(blocking=False):
+                        _count_lookup('stale')
+                        if current_app.debug:
+                            current_app.logger.debug(f"Cache STALE served for key: {cache_key}")
+                        return cached_value
+                    try:
+                        return _compute_and_store(cache_key, func, args, kwargs, timeout, stale_ttl, unversioned_key)
+                    finally:
+                        _release_key_lock(cache_key, lock)
+
+            # Cold miss: single-flight so only one caller runs the expensive function.
+            lock = _get_key_lock(cache_key)
+            acquired = lock.acquire(timeout=SINGLE_FLIGHT_WAIT)
+            try:
+                # Another caller may have filled the cache while we were waiting.
+                cached_value = get_from_cache(cache_key)
+                if cached_value is not None:
+                    return cached_value
+                return _compute_and_store(cache_key, func, args, kwargs, timeout, stale_ttl, unversioned_key)
+            finally:
+                if acquired:
+                    _release_key_lock(cache_key, lock)
         return wrapper
     return decorator
 
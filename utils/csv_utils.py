@@ -14,3 +14,20 @@ def generate_csv_from_data(data, headers):
     output.seek(0)
     
     return output.getvalue()
+
+def iter_csv_from_data(data, headers, chunk_rows=500):
+    """
+    Generates the same CSV as generate_csv_from_data, as text chunks of chunk_rows rows,
+    for streamed downloads. data can be any iterable of dictionaries (e.g. a generator).
+    """
+    output = io.StringIO()
+    writer = csv.DictWriter(output, fieldnames=headers)
+    writer.writeheader()
+    for count, row in enumerate(data, 1):
+        writer.writerow(row)
+        if count % chunk_rows == 0:
+            yield output.getvalue()
+            output.seek(0)
+            output.truncate()
+    if output.tell():
+        yield output.getvalue()
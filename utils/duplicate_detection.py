@@ -0,0 +1,271 @@
+# utils/duplicate_detection.py
+"""
+Likely-duplicate detection for new admissions.
+
+The same student is often admitted twice under slightly different spellings
+("Sreenivas"/"Srinivas", "Laxmi"/"Lakshmi", name and surname swapped), which the
+admission-number check cannot catch. Each worker keeps an index over student name,
+father's name and date of birth:
+- blocking keys (exact DOB, phonetic key of the full name, phonetic name word + father's
+  name) narrow 50k students down to a handful of candidates with a few dict lookups;
+- only those candidates are scored, with trigram similarity on the names and a
+  typo-tolerant DOB comparison.
+
+The index follows the 'students' data version (utils/versioned_snapshot.py). When only
+inserts happened since the last refresh, the new rows are appended; any update or delete
+rebuilds it in a background thread.
+
+Matches are warnings only: add_student and the bulk importer still save the student.
+"""
+
+import re
+from functools import lru_cache
+
+from flask import current_app
+
+from models.db_pool import db_manager
+from utils.versioned_snapshot import VersionedSnapshot
+
+DEFAULT_THRESHOLD = 0.75
+DEFAULT_LIMIT = 5
+
+# Field weights in the score; fields missing on either side are left out and the rest rescaled
+WEIGHTS = {'name': 0.5, 'father_name': 0.25, 'dob': 0.25}
+
+INDEX_QUERY = """
+    SELECT id, student_name, surname, father_name, dob, admission_no, course_id, academic_year_id
+    FROM students WHERE id > ? ORDER BY id
+"""
+
+# Spelling variants common in transliterated names, folded before the phonetic key is taken
+_PHONETIC_RULES = (
+    ('ksh', 'x'), ('sh', 's'), ('th', 't'), ('dh', 'd'), ('bh', 'b'), ('kh', 'k'), ('gh', 'g'),
+    ('ph', 'f'), ('jh', 'j'), ('ck', 'k'), ('q', 'k'), ('z', 'j'), ('w', 'v'), ('y', 'i'),
+    ('ee', 'i'), ('oo', 'u'),
+)
+_NON_LETTERS_RE = re.compile(r'[^a-z]+')
+_REPEATS_RE = re.compile(r'(.)\1+')
+_VOWELS_RE = re.compile(r'[aeiou]')
+
+
+def _words(*parts) -> list:
+    """Lower-case letter-only words of the given parts, in order."""
+    return _NON_LETTERS_RE.sub(' ', " ".join(str(part or '') for part in parts).lower()).split()
+
+
+@lru_cache(maxsize=16384) # Names repeat a lot; this keeps a rebuild of 50k students around a second
+def _phonetic(word: str) -> str:
+    """Spelling-insensitive key: 'Lakshmi' and 'Laxmi' -> 'lxm', 'Sreenivasa' and 'Srinivas' -> 'srnvs'."""
+    for old, new in _PHONETIC_RULES:
+        word = word.replace(old, new)
+    word = _REPEATS_RE.sub(r'\1', word)
+    return word[:1] + _VOWELS_RE.sub('', word[1:])
+
+
+@lru_cache(maxsize=16384)
+def _trigrams(text: str) -> frozenset:
+    padded = f"  {text} "
+    return frozenset(padded[i:i + 3] for i in range(len(padded) - 2))
+
+
+def _trigram_similarity(a: str, b: str) -> float:
+    """Dice coefficient of the padded trigram sets of a and b (1.0 = same string)."""
+    if a == b:
+        return 1.0
+    grams_a, grams_b = _trigrams(a), _trigrams(b)
+    return 2 * len(grams_a & grams_b) / (len(grams_a) + len(grams_b))
+
+
+def _dob_similarity(a: str, b: str) -> float:
+    """1.0 for the same date; 0.7 for a one-digit typo or swapped day and month (YYYY-MM-DD)."""
+    if a == b:
+        return 1.0
+    if len(a) != 10 or len(b) != 10:
+        return 0.0
+    if a[:4] == b[:4] and a[5:7] == b[8:10] and a[8:10] == b[5:7]:
+        return 0.7
+    return 0.7 if sum(x != y for x, y in zip(a, b)) == 1 else 0.0
+
+
+class _Entry:
+    """What the index keeps per student: normalized fields plus what is shown in a warning."""
+
+    __slots__ = ('id', 'source', 'display_name', 'admission_no', 'father_name', 'dob', 'course_id', 'academic_year_id',
+                 'name', 'name_key', 'father', 'father_key')
+
+    def __init__(self, student: dict, student_id=None):
+        self.source = tuple(student.values()) # The row it was built from, to reuse the entry on a rebuild
+        name_words = _words(student.get('student_name'), student.get('surname'))
+        father_words = _words(student.get('father_name'))
+        self.id = student_id
+        self.display_name = " ".join(part for part in (student.get('student_name'), student.get('surname')) if part)
+        self.admission_no = student.get('admission_no')
+        self.father_name = student.get('father_name')
+        dob = student.get('dob')
+        self.dob = (dob.isoformat() if hasattr(dob, 'isoformat') else str(dob or ''))[:10] # Validated data holds a date
+        self.course_id = student.get('course_id')
+        self.academic_year_id = student.get('academic_year_id')
+        self.name = " ".join(sorted(name_words)) # Word order ignored: name and surname get swapped
+        self.name_key = " ".join(sorted(_phonetic(word) for word in name_words))
+        self.father = " ".join(sorted(father_words))
+        self.father_key = " ".join(sorted(_phonetic(word) for word in father_words))
+
+    def blocking_keys(self) -> set:
+        keys = set()
+        if self.dob:
+            keys.add('d:' + self.dob)
+        if self.name_key:
+            keys.add('n:' + self.name_key)
+        if self.father_key:
+            # One name word plus the father's name still matches when the other word or the DOB is mistyped
+            keys.update(f"p:{word_key}|{self.father_key}" for word_key in self.name_key.split() if len(word_key) > 1)
+        return keys
+
+
+def _score(probe: _Entry, entry: _Entry):
+    """Returns (score 0-1, reasons) for how likely entry is the same student as probe."""
+    name = max(_trigram_similarity(probe.name, entry.name),
+               0.9 if probe.name_key and probe.name_key == entry.name_key else 0.0)
+    parts = {'name': name}
+    reasons = ['same name' if name == 1.0 else f"similar name ({name:.0%})"]
+    if probe.father and entry.father:
+        father = max(_trigram_similarity(probe.father, entry.father),
+                     0.9 if probe.father_key == entry.father_key else 0.0)
+        parts['father_name'] = father
+        if father >= 0.6:
+            reasons.append("same father's name" if father == 1.0 else f"similar father's name ({father:.0%})")
+    if probe.dob and entry.dob:
+        dob = _dob_similarity(probe.dob, entry.dob)
+        parts['dob'] = dob
+        if dob:
+            reasons.append('same date of birth' if dob == 1.0 else 'date of birth differs by a typo')
+    total_weight = sum(WEIGHTS[field] for field in parts)
+    return sum(WEIGHTS[field] * value for field, value in parts.items()) / total_weight, reasons
+
+
+class DuplicateIndex(VersionedSnapshot):
+    """Blocking-key index over students; see the module docstring."""
+
+    TABLES = ('students',)
+    APPENDED_TABLES = ('students',)
+    NAME = 'duplicate index'
+
+    def __init__(self):
+        super().__init__()
+        self._entries = {} # {student id (or batch key): _Entry}
+        self._postings = {} # {blocking key: [entry keys]}
+        self.max_id = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def add(self, entry: _Entry, key=None):
+        """Adds one entry. The entry goes in before its postings, so readers never see a dangling key."""
+        key = entry.id if key is None else key
+        self._entries[key] = entry
+        for blocking_key in entry.blocking_keys():
+            self._postings.setdefault(blocking_key, []).append(key)
+
+    def find(self, student: dict, threshold: float = DEFAULT_THRESHOLD, limit: int = DEFAULT_LIMIT,
+             exclude_id=None) -> list:
+        """Ranked [(score, reasons, entry)] at or above threshold, best first."""
+        probe = student if isinstance(student, _Entry) else _Entry(student)
+        entries, postings = self._entries, self._postings
+        candidates = set()
+        for blocking_key in probe.blocking_keys():
+            candidates.update(postings.get(blocking_key, ()))
+        candidates.discard(exclude_id)
+        matches = []
+        for key in candidates:
+            entry = entries.get(key)
+            if entry is None:
+                continue
+            score, reasons = _score(probe, entry)
+            if score >= threshold:
+                matches.append((score, reasons, entry))
+        matches.sort(key=lambda match: (-match[0], match[2].display_name))
+        return matches[:limit]
+
+    def _append_new_rows(self, versions: dict):
+        """Appends rows inserted since the last refresh."""
+        new_rows = db_manager.execute_query(INDEX_QUERY, (self.max_id,), fetch_all=True)
+        if not self._inserts_only(versions, 'students', len(new_rows)):
+            return None
+        for row in new_rows:
+            self.add(_Entry(dict(row), row['id']))
+        if new_rows:
+            self.max_id = new_rows[-1]['id']
+        return len(new_rows)
+
+    def _build(self, versions: dict) -> int:
+        """Re-reads all students into new dicts, swapped in at the end. Entries of unchanged rows are reused."""
+        rows = db_manager.execute_query(INDEX_QUERY, (0,), fetch_all=True)
+        previous = self._entries
+        rebuilt = DuplicateIndex()
+        for row in rows:
+            entry = previous.get(row['id'])
+            rebuilt.add(entry if entry is not None and entry.source == tuple(row) else _Entry(dict(row), row['id']))
+        self._entries, self._postings = rebuilt._entries, rebuilt._postings
+        self.max_id = rows[-1]['id'] if rows else 0
+        return len(rows)
+
+
+duplicate_index = DuplicateIndex()
+
+
+def _settings(threshold, limit):
+    return (current_app.config.get('DUPLICATE_MATCH_THRESHOLD', DEFAULT_THRESHOLD) if threshold is None else threshold,
+            current_app.config.get('DUPLICATE_MAX_RESULTS', DEFAULT_LIMIT) if limit is None else limit)
+
+
+def _as_dict(score, reasons, entry) -> dict:
+    course = db_manager.courses.get(entry.course_id) if entry.course_id else None
+    academic_year = db_manager.academic_years.get(entry.academic_year_id) if entry.academic_year_id else None
+    return {
+        'id': entry.id,
+        'name': entry.display_name,
+        'admission_no': entry.admission_no,
+        'father_name': entry.father_name,
+        'dob': entry.dob,
+        'course_name': course['course_name'] if course else None,
+        'academic_year': academic_year['academic_year'] if academic_year else None,
+        'score': round(score, 2),
+        'reasons': reasons,
+    }
+
+
+def find_duplicates(student: dict, exclude_id: int = None, threshold: float = None, limit: int = None) -> list:
+    """
+    Existing students that are likely the same person as student (a dict with student_name,
+    surname, father_name, dob), best first, as dicts with a score and the reasons.
+    """
+    threshold, limit = _settings(threshold, limit)
+    duplicate_index.ensure_current()
+    return [_as_dict(*match) for match in duplicate_index.find(student, threshold, limit, exclude_id)]
+
+
+class DuplicateBatch:
+    """
+    Duplicate checks for an import: each row is compared with the students already saved and
+    with the rows imported before it in the same file (which are not committed yet, so they
+    are kept in a private index until the import finishes).
+    """
+
+    def __init__(self, threshold: float = None, limit: int = None):
+        self.threshold, self.limit = _settings(threshold, limit)
+        duplicate_index.ensure_current()
+        self._batch = DuplicateIndex()
+
+    def check(self, student: dict) -> list:
+        probe = _Entry(student)
+        matches = duplicate_index.find(probe, self.threshold, self.limit) + self._batch.find(probe, self.threshold, self.limit)
+        matches.sort(key=lambda match: -match[0])
+        return [_as_dict(*match) for match in matches[:self.limit]]
+
+    def add(self, student: dict, student_id: int = None):
+        self._batch.add(_Entry(student, student_id), key=('batch', len(self._batch)))
+
+
+def describe_duplicates(duplicates: list) -> str:
+    """One-line summary for flash messages and import reports."""
+    return "; ".join(f"{d['name']} ({d['admission_no']}, {', '.join(d['reasons'])})" for d in duplicates)
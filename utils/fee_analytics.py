@@ -0,0 +1,297 @@
+# utils/fee_analytics.py
+"""
+Fee analytics for /reports/fee-analytics and its chart endpoints: daily and monthly
+collection series, collection rate per course, ageing of outstanding balances and the
+top defaulters.
+
+Each worker keeps the fee data column-wise in typed arrays (one array per column, one
+entry per student or per payment) instead of asking SQLite for one GROUP BY per chart.
+A request filters the students into a byte mask and makes one pass over the payments
+(paid totals, last payment per student, daily sums) and one over the students (course
+totals, ageing buckets, defaulters); every chart of the page comes out of those two passes.
+
+Like the typeahead index, the columns follow the data versions of the tables they were
+loaded from (utils/versioned_snapshot.py). Students and payments inserted since the last
+refresh are appended to a copy of the columns that is swapped in; any other write reloads
+them in a background thread while requests keep answering from the current load
+(is_current() then tells the caller not to cache the answer under the new versions).
+
+Balances are measured against the student's fee structure; students without one are
+counted but owe nothing. A balance's age is the number of days since the student's
+last payment, or since admission if nothing has been paid yet.
+"""
+
+import bisect
+import heapq
+from array import array
+from datetime import date
+
+from models.db_pool import db_manager
+from utils.versioned_snapshot import VersionedSnapshot
+
+ANALYTICS_TABLES = ('students', 'courses', 'academic_years', 'fee_structure', 'student_fee_payments')
+DAILY_SERIES_DAYS = 90 # Length of the daily series when no start date is given
+DEFAULT_TOP_DEFAULTERS = 20
+MAX_TOP_DEFAULTERS = 500
+# (first day, last day or None, label) of each ageing bucket
+AGEING_BUCKETS = ((0, 30, '0-30 days'), (31, 60, '31-60 days'), (61, 90, '61-90 days'),
+                  (91, 180, '91-180 days'), (181, 365, '181-365 days'), (366, None, 'Over a year'))
+SECTIONS = ('totals', 'daily', 'monthly', 'course_rates', 'ageing', 'defaulters')
+
+STUDENTS_QUERY = """
+    SELECT s.id, s.student_name, s.surname, s.admission_no, s.course_id, s.academic_year_id,
+           s.date_of_admission, fs.total_fee
+    FROM students s
+    LEFT JOIN fee_structure fs ON s.fee_structure_id = fs.id
+    WHERE s.id > ?
+    ORDER BY s.id
+"""
+PAYMENTS_QUERY = "SELECT id, student_id, payment_date, amount_paid FROM student_fee_payments WHERE id > ? ORDER BY id"
+COURSES_QUERY = "SELECT id, course_name FROM courses ORDER BY course_name"
+ACADEMIC_YEARS_QUERY = "SELECT id, academic_year FROM academic_years"
+
+
+def _ordinal(value, parsed: dict) -> int:
+    """Day number of an ISO date (0 if missing or malformed); parsed memoises the repeated dates."""
+    day = parsed.get(value)
+    if day is None:
+        try:
+            day = date.fromisoformat(value).toordinal()
+        except (TypeError, ValueError):
+            day = 0
+        parsed[value] = day
+    return day
+
+
+class _Columns:
+    """One load of the fee data; replaced as a whole so readers never see a mix."""
+
+    __slots__ = ('student_ids', 'names', 'admission_nos', 'course_of', 'year_ids', 'fees', 'has_fee',
+                 'admitted', 'pay_student', 'pay_day', 'pay_amount', 'course_ids', 'course_names', 'year_names',
+                 'max_payment_id')
+
+    def __init__(self):
+        self.student_ids = array('q') # Per student, in id order ...
+        self.names = []
+        self.admission_nos = []
+        self.course_of = array('i') # ... position in course_ids
+        self.year_ids = array('q')
+        self.fees = array('d') # Total fee of the fee structure (0 if none)
+        self.has_fee = bytearray() # 1 if the student has a fee structure
+        self.admitted = array('i') # Admission day ordinal (0 if unknown)
+        self.pay_student = array('i') # Per payment, in id order: position of the student ...
+        self.pay_day = array('i') # ... payment day ordinal
+        self.pay_amount = array('d')
+        self.course_ids = [] # Courses sorted by name
+        self.course_names = []
+        self.year_names = {} # {academic_year_id: '2024-2026'}
+        self.max_payment_id = 0
+
+    def copy(self):
+        """A copy to append to; the arrays and lists are copied, the course and year names shared."""
+        columns = _Columns()
+        for name in self.__slots__:
+            value = getattr(self, name)
+            setattr(columns, name, value[:] if isinstance(value, (array, bytearray, list)) else value)
+        columns.course_ids, columns.course_names = self.course_ids, self.course_names
+        return columns
+
+    def add_students(self, rows, parsed: dict):
+        course_position = {course_id: position for position, course_id in enumerate(self.course_ids)}
+        for row in rows:
+            self.student_ids.append(row[0])
+            self.names.append(" ".join(part for part in (row[1], row[2]) if part))
+            self.admission_nos.append(row[3])
+            self.course_of.append(course_position.get(row[4], -1))
+            self.year_ids.append(row[5])
+            self.admitted.append(_ordinal(row[6], parsed))
+            self.fees.append(row[7] or 0.0)
+            self.has_fee.append(row[7] is not None)
+
+    def add_payments(self, rows, parsed: dict):
+        student_ids = self.student_ids
+        for row in rows:
+            self.max_payment_id = row[0]
+            position = bisect.bisect_left(student_ids, row[1])
+            if position < len(student_ids) and student_ids[position] == row[1]:
+                self.pay_student.append(position)
+                self.pay_day.append(_ordinal(row[2], parsed))
+                self.pay_amount.append(row[3])
+
+
+class FeeAnalytics(VersionedSnapshot):
+    """Column store of students, fees and payments, kept current as the underlying tables change."""
+
+    TABLES = ANALYTICS_TABLES
+    APPENDED_TABLES = ('students', 'student_fee_payments') # A write to any other table reloads the columns
+    NAME = 'fee analytics'
+
+    def __init__(self):
+        super().__init__()
+        self._columns = _Columns()
+
+    def _append_new_rows(self, versions: dict):
+        """Appends students and payments inserted since the last refresh."""
+        current = self._columns
+        max_student_id = current.student_ids[-1] if current.student_ids else 0
+        new_students = db_manager.execute_query(STUDENTS_QUERY, (max_student_id,), fetch_all=True)
+        new_payments = db_manager.execute_query(PAYMENTS_QUERY, (current.max_payment_id,), fetch_all=True)
+        if not (self._inserts_only(versions, 'students', len(new_students))
+                and self._inserts_only(versions, 'student_fee_payments', len(new_payments))):
+            return None
+        columns, parsed = current.copy(), {}
+        columns.add_students(new_students, parsed)
+        columns.add_payments(new_payments, parsed)
+        self._columns = columns
+        return len(new_students) + len(new_payments)
+
+    def _build(self, versions: dict) -> int:
+        columns = _Columns()
+        for row in db_manager.execute_query(COURSES_QUERY, fetch_all=True):
+            columns.course_ids.append(row[0])
+            columns.course_names.append(row[1])
+        columns.year_names = {row[0]: row[1] for row in db_manager.execute_query(ACADEMIC_YEARS_QUERY, fetch_all=True)}
+        parsed = {}
+        columns.add_students(db_manager.execute_query(STUDENTS_QUERY, (0,), fetch_all=True), parsed)
+        columns.add_payments(db_manager.execute_query(PAYMENTS_QUERY, (0,), fetch_all=True), parsed)
+
+        self._columns = columns
+        return len(columns.student_ids) + len(columns.pay_student)
+
+    def analyse(self, as_of: date = None, course_id: int = None, academic_year_id: int = None,
+                start_date: date = None, end_date: date = None, top: int = DEFAULT_TOP_DEFAULTERS) -> dict:
+        """
+        All analytics sections (SECTIONS) for the students matching the filters, as of a day
+        (today by default). start_date/end_date limit the collection series; balances, ageing and
+        defaulters count every payment up to as_of.
+        """
+        columns = self._columns
+        as_of = as_of or date.today()
+        today = as_of.toordinal()
+        series_end = min(end_date.toordinal(), today) if end_date else today
+        daily_start = start_date.toordinal() if start_date else series_end - DAILY_SERIES_DAYS + 1
+        monthly_start = start_date.toordinal() if start_date else 0
+        top = max(1, min(top, MAX_TOP_DEFAULTERS))
+
+        selected = bytearray(
+            (course_id is None or (course >= 0 and columns.course_ids[course] == course_id))
+            and (academic_year_id is None or year_id == academic_year_id)
+            for course, year_id in zip(columns.course_of, columns.year_ids))
+
+        # Pass 1: payments
+        count = len(columns.student_ids)
+        paid = array('d', bytes(8 * count))
+        last_paid = array('i', bytes(4 * count))
+        per_day = {}
+        for student, day, amount in zip(columns.pay_student, columns.pay_day, columns.pay_amount):
+            if not selected[student] or day > today:
+                continue
+            paid[student] += amount
+            if day > last_paid[student]:
+                last_paid[student] = day
+            if monthly_start <= day <= series_end:
+                per_day[day] = per_day.get(day, 0.0) + amount
+
+        # Pass 2: students
+        course_due = array('d', bytes(8 * len(columns.course_ids)))
+        course_paid = array('d', bytes(8 * len(columns.course_ids)))
+        bucket_students = [0] * len(AGEING_BUCKETS)
+        bucket_outstanding = [0.0] * len(AGEING_BUCKETS)
+        owing = [] # (outstanding, days outstanding, student position)
+        students = students_with_fee = 0
+        for student in range(count):
+            if not selected[student]:
+                continue
+            students += 1
+            if not columns.has_fee[student]:
+                continue
+            students_with_fee += 1
+            course = columns.course_of[student]
+            if course >= 0:
+                course_due[course] += columns.fees[student]
+                course_paid[course] += paid[student]
+            outstanding = columns.fees[student] - paid[student]
+            if outstanding < 0.005:
+                continue
+            days = today - (last_paid[student] or columns.admitted[student] or today)
+            owing.append((outstanding, days, student))
+            bucket = _ageing_bucket(days)
+            bucket_students[bucket] += 1
+            bucket_outstanding[bucket] += outstanding
+
+        due, collected = sum(course_due), sum(course_paid)
+        outstanding_total = sum(item[0] for item in owing)
+        defaulters = []
+        for outstanding, days, student in heapq.nlargest(top, owing): # Ties: longest outstanding first
+            course = columns.course_of[student]
+            defaulters.append({
+                'student_id': columns.student_ids[student],
+                'name': columns.names[student],
+                'admission_no': columns.admission_nos[student],
+                'course_name': columns.course_names[course] if course >= 0 else None,
+                'academic_year': columns.year_names.get(columns.year_ids[student]),
+                'total_fee': round(columns.fees[student], 2),
+                'total_paid': round(paid[student], 2),
+                'outstanding': round(outstanding, 2),
+                'last_payment_date': date.fromordinal(last_paid[student]).isoformat() if last_paid[student] else None,
+                'days_outstanding': days,
+            })
+
+        monthly = {}
+        for day in sorted(per_day):
+            month = date.fromordinal(day).strftime('%Y-%m')
+            monthly[month] = monthly.get(month, 0.0) + per_day[day]
+        daily_days = range(max(daily_start, 1), series_end + 1)
+        course_rows = [position for position in range(len(columns.course_ids)) if course_due[position] or course_paid[position]]
+
+        return {
+            'as_of': as_of.isoformat(),
+            'totals': {
+                'students': students,
+                'students_with_fee': students_with_fee,
+                'due': round(due, 2),
+                'collected': round(collected, 2),
+                'outstanding': round(outstanding_total, 2),
+                'collection_rate': round(100 * collected / due, 1) if due else None,
+                'students_owing': len(owing),
+            },
+            'daily': {
+                'labels': [date.fromordinal(day).isoformat() for day in daily_days],
+                'data': [round(per_day.get(day, 0.0), 2) for day in daily_days],
+            },
+            'monthly': {'labels': list(monthly), 'data': [round(amount, 2) for amount in monthly.values()]},
+            'course_rates': {
+                'labels': [columns.course_names[position] for position in course_rows],
+                'due': [round(course_due[position], 2) for position in course_rows],
+                'collected': [round(course_paid[position], 2) for position in course_rows],
+                'rate': [round(100 * course_paid[position] / course_due[position], 1) if course_due[position] else None
+                         for position in course_rows],
+            },
+            'ageing': {
+                'labels': [label for _, _, label in AGEING_BUCKETS],
+                'students': bucket_students,
+                'outstanding': [round(amount, 2) for amount in bucket_outstanding],
+            },
+            'defaulters': defaulters,
+        }
+
+
+def _ageing_bucket(days: int) -> int:
+    for position, (_, last_day, _) in enumerate(AGEING_BUCKETS):
+        if last_day is None or days <= last_day:
+            return position
+    return len(AGEING_BUCKETS) - 1
+
+
+fee_analytics = FeeAnalytics()
+
+
+def get_fee_analytics(as_of: date = None, course_id: int = None, academic_year_id: int = None,
+                      start_date: date = None, end_date: date = None, top: int = DEFAULT_TOP_DEFAULTERS) -> dict:
+    """
+    Fee analytics from this worker's columns (brought up to date first). While the columns
+    reload in the background the answer reflects the previous load; see is_current().
+    """
+    fee_analytics.ensure_current()
+    return fee_analytics.analyse(as_of=as_of, course_id=course_id, academic_year_id=academic_year_id,
+                                 start_date=start_date, end_date=end_date, top=top)
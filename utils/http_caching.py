@@ -0,0 +1,131 @@
+# utils/http_caching.py
+"""
+HTTP conditional GET support (ETag / Last-Modified) for listing pages and JSON APIs.
+
+An ETag is derived from the data versions of the tables a view reads (see
+db/migrations/0001_data_versions.sql), the request path and query string, the logged-in admin and a
+deploy token built from the template files. If the browser already holds that
+version, the view is not executed at all and a bodiless 304 is returned.
+
+HTML pages embed the session's CSRF token (base.html, delete forms), so their ETag also
+covers the session's CSRF secret and the current half of WTF_CSRF_TIME_LIMIT: a new
+session, or a page whose token is about to expire, is rendered again instead of being
+revalidated. HTML pages are validated by ETag only; Last-Modified knows nothing of the
+session and is sent for the JSON endpoints (those with max_age) alone.
+"""
+
+import hashlib
+import os
+import time
+from datetime import datetime, timezone
+from functools import wraps
+from flask import current_app, request, session, make_response
+from flask.globals import request_ctx
+
+DEFAULT_HTML_CACHE_CONTROL = "private, no-cache" # Browser may keep the page but must revalidate it
+
+
+def init_http_caching(app):
+    """Computes the deploy token used to salt ETags, so a release with new templates changes every ETag."""
+    app.config.setdefault('HTTP_ETAGS_ENABLED', True)
+    digest = hashlib.md5(app.config.get('APP_VERSION', '').encode('utf-8'))
+    templates_dir = os.path.join(app.root_path, 'templates')
+    for root, _dirs, files in os.walk(templates_dir):
+        for name in sorted(files):
+            path = os.path.join(root, name)
+            digest.update(f"{os.path.relpath(path, templates_dir)}:{os.path.getmtime(path)}".encode('utf-8'))
+    app.config['ETAG_DEPLOY_TOKEN'] = digest.hexdigest()[:12]
+
+
+def _csrf_part() -> str:
+    """Session CSRF secret and time window, for pages that embed csrf_token()."""
+    if not current_app.config.get('WTF_CSRF_ENABLED', True):
+        return ''
+    window = ''
+    time_limit = current_app.config.get('WTF_CSRF_TIME_LIMIT', 3600)
+    if time_limit:
+        # A token rendered in this window is still valid for at least half the time limit
+        window = str(int(time.time() // max(time_limit // 2, 1)))
+    return f"{session.get('csrf_token', '')}:{window}"
+
+
+def _compute_etag(tables, html=True) -> str:
+    from models.db_pool import db_manager # Imported here to avoid a circular import at module load
+    parts = [
+        current_app.config.get('ETAG_DEPLOY_TOKEN', ''),
+        request.endpoint or '',
+        request.full_path,
+        str(session.get('admin_id', '')),
+        db_manager.data_version_token(tables),
+    ]
+    if html:
+        parts.append(_csrf_part())
+    return hashlib.md5("|".join(parts).encode('utf-8')).hexdigest()
+
+
+def _last_modified(tables):
+    """Latest updated_at among the given tables, as an aware UTC datetime (or None)."""
+    from models.db_pool import db_manager
+    versions = db_manager.get_data_versions()
+    stamps = [versions[table][1] for table in tables if table in versions and versions[table][1]]
+    if not stamps:
+        return None
+    return datetime.strptime(max(stamps), '%Y-%m-%d %H:%M:%S').replace(tzinfo=timezone.utc)
+
+
+def _is_not_modified(etag, last_modified) -> bool:
+    if request.if_none_match:
+        # If-None-Match takes precedence over If-Modified-Since (RFC 9110 13.2.2)
+        return request.if_none_match.contains_weak(etag)
+    if request.if_modified_since and last_modified:
+        return last_modified <= request.if_modified_since
+    return False
+
+
+def _has_flash_messages() -> bool:
+    """Flash messages make a page one-off; such responses must not be revalidated from cache."""
+    return bool(session.get('_flashes')) or bool(getattr(request_ctx, 'flashes', None))
+
+
+def conditional(*tables, max_age=None):
+    """
+    Decorator adding ETag/Last-Modified validation to a GET view.
+
+    Args:
+        *tables: Names of the tables the view's output is built from.
+        max_age (int, optional): If given, clients may reuse the response for that many
+                                 seconds without revalidating (used for JSON chart data);
+                                 otherwise HTML pages are sent with "no-cache".
+    """
+    cache_control = f"private, max-age={max_age}" if max_age else DEFAULT_HTML_CACHE_CONTROL
+    html = not max_age
+
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            if request.method not in ('GET', 'HEAD') or not current_app.config.get('HTTP_ETAGS_ENABLED', True):
+                return view(*args, **kwargs)
+
+            if not _has_flash_messages():
+                etag = _compute_etag(tables, html)
+                last_modified = None if html else _last_modified(tables)
+                if _is_not_modified(etag, last_modified):
+                    response = current_app.response_class(status=304)
+                    response.set_etag(etag)
+                    response.headers['Cache-Control'] = cache_control
+                    return response
+
+            response = make_response(view(*args, **kwargs))
+            if response.status_code != 200 or _has_flash_messages():
+                return response
+
+            # Recomputed after the view: it may have written (e.g. auto-linking a fee structure).
+            # The CSRF secret is also created by rendering the first page of a session.
+            response.set_etag(_compute_etag(tables, html))
+            last_modified = None if html else _last_modified(tables)
+            if last_modified:
+                response.last_modified = last_modified
+            response.headers['Cache-Control'] = cache_control
+            return response
+        return wrapper
+    return decorator
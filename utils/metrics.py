@@ -0,0 +1,377 @@
+# utils/metrics.py
+"""
+Lightweight metrics registry exported in Prometheus text format (see routes/monitoring.py).
+
+Each process keeps its own counters, gauges and histograms in memory. When METRICS_DIR
+is configured, every process also writes a JSON snapshot of its values to
+METRICS_DIR/metrics_<pid>.json (at most once per METRICS_FLUSH_INTERVAL seconds), and
+the /metrics endpoint sums the snapshots of all processes, so whichever gunicorn worker
+answers the scrape reports totals for the whole deployment.
+
+Workers come and go (max_requests recycling, reloads), so the snapshot of a process that
+is no longer running is retired: its counters and histograms are added to
+METRICS_DIR/metrics_archive.json and the file is removed, keeping the totals monotonic
+without one file per PID ever started. Its gauges are dropped. gunicorn.conf.py retires
+a worker's snapshot as soon as the worker exits; a scrape retires any left over (e.g. a
+worker that was killed).
+"""
+
+import glob
+import json
+import os
+import threading
+import time
+from functools import wraps
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError: # Windows: snapshots of dead processes are kept and only their gauges ignored
+    fcntl = None
+
+# Default latency buckets (seconds), tuned for a small server-rendered app.
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+DB_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1.0)
+JOB_BUCKETS = (0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+# Metric definitions: {'name': (type, help, buckets)}
+METRICS = {
+    'satcms_http_requests_total': ('counter', 'HTTP requests handled, by endpoint, method and status.', None),
+    'satcms_http_request_duration_seconds': ('histogram', 'HTTP request latency by endpoint.', DEFAULT_BUCKETS),
+    'satcms_db_queries_total': ('counter', 'SQL statements executed, by statement type.', None),
+    'satcms_db_query_duration_seconds': ('histogram', 'SQL statement latency (execute and fetch).', DB_BUCKETS),
+    'satcms_db_connections_opened_total': ('counter', 'SQLite connections opened.', None),
+    'satcms_db_connections_open': ('gauge', 'SQLite connections currently open.', None),
+    'satcms_db_write_wait_seconds': ('histogram', 'Time a write waited for the writer connection and BEGIN IMMEDIATE.', DB_BUCKETS),
+    'satcms_db_write_busy_retries_total': ('counter', 'BEGIN IMMEDIATE attempts retried because another process held the write lock.', None),
+    'satcms_asgi_client_disconnects_total': ('counter', 'Streamed responses abandoned because the client disconnected (ASGI mode).', None),
+    'satcms_cache_requests_total': ('counter', 'In-memory cache lookups, by result (hit, miss, stale).', None),
+    'satcms_cache_entries': ('gauge', 'Entries currently held in the in-memory cache.', None),
+    'satcms_job_duration_seconds': ('histogram', 'TC and report generation time, by job.', JOB_BUCKETS),
+    'satcms_jobs_in_progress': ('gauge', 'TC and report generations currently running, by job.', None),
+    'satcms_jobs_failed_total': ('counter', 'TC and report generations that raised an error, by job.', None),
+    'satcms_job_phase_duration_seconds': ('histogram', 'Time spent in each phase of a TC/report generation, by job and phase.', DEFAULT_BUCKETS),
+}
+
+_lock = threading.Lock()
+_counters = {} # {(name, labels): value}
+_gauges = {} # {(name, labels): value}
+_histograms = {} # {(name, labels): [bucket counts..., +Inf count, sum]}
+_last_flush = 0.0
+
+ARCHIVE_FILENAME = 'metrics_archive.json' # Counters and histograms of exited processes
+ARCHIVE_LOCK_FILENAME = 'metrics_archive.lock'
+
+
+def _labels_key(labels: dict) -> tuple:
+    return tuple(sorted((labels or {}).items()))
+
+
+def inc_counter(name: str, labels: dict = None, value: float = 1):
+    """Increments a counter."""
+    key = (name, _labels_key(labels))
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + value
+
+
+def set_gauge(name: str, value: float, labels: dict = None):
+    """Sets a gauge to an absolute value."""
+    with _lock:
+        _gauges[(name, _labels_key(labels))] = value
+
+
+def inc_gauge(name: str, labels: dict = None, value: float = 1):
+    """Increments (or, with a negative value, decrements) a gauge."""
+    key = (name, _labels_key(labels))
+    with _lock:
+        _gauges[key] = _gauges.get(key, 0) + value
+
+
+def observe(name: str, value: float, labels: dict = None):
+    """Records one observation in a histogram."""
+    buckets = METRICS[name][2]
+    key = (name, _labels_key(labels))
+    with _lock:
+        state = _histograms.get(key)
+        if state is None:
+            state = _histograms[key] = [0] * (len(buckets) + 1) + [0.0]
+        for i, bound in enumerate(buckets):
+            if value <= bound:
+                state[i] += 1
+        state[len(buckets)] += 1 # +Inf bucket, i.e. the observation count
+        state[-1] += value
+
+
+def percentile(values, pct):
+    """Nearest-rank percentile of a non-empty sequence (used by the CLI timings and the benchmarks)."""
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered) + 0.5) - 1))
+    return ordered[index]
+
+
+@contextmanager
+def track_job_duration(job: str):
+    """Times a TC/report generation and counts it as in progress while it runs."""
+    labels = {'job': job}
+    inc_gauge('satcms_jobs_in_progress', labels)
+    started = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        inc_counter('satcms_jobs_failed_total', labels)
+        raise
+    finally:
+        observe('satcms_job_duration_seconds', time.perf_counter() - started, labels)
+        inc_gauge('satcms_jobs_in_progress', labels, -1)
+
+
+class PhaseTimer:
+    """
+    Times the named phases of one job run (e.g. a TC: load, replace, save, convert, db_insert).
+
+    Every phase is observed in satcms_job_phase_duration_seconds as it finishes; log()
+    then emits the whole breakdown as one structured log event.
+    """
+
+    def __init__(self, job: str):
+        self.job = job
+        self.phases = {} # {phase: seconds}, in the order the phases first ran
+
+    @contextmanager
+    def phase(self, name: str):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - started
+            self.phases[name] = self.phases.get(name, 0.0) + elapsed
+            observe('satcms_job_phase_duration_seconds', elapsed, {'job': self.job, 'phase': name})
+
+    def as_ms(self) -> dict:
+        return {name: round(seconds * 1000, 2) for name, seconds in self.phases.items()}
+
+    def log(self, logger, **context):
+        """
+        Logs the breakdown as a readable line; the same fields are attached to the record
+        as `timing` (event, job, phases_ms, total_ms plus context) for JSON log formatters.
+        """
+        phases_ms = self.as_ms()
+        total_ms = round(sum(self.phases.values()) * 1000, 2)
+        fields = {'event': 'job_timing', 'job': self.job, **context, 'phases_ms': phases_ms, 'total_ms': total_ms}
+        described = " ".join(f"{key}={value}" for key, value in context.items())
+        breakdown = " ".join(f"{name}={ms}ms" for name, ms in phases_ms.items())
+        logger.info(f"{self.job} timing {described}: {breakdown} total={total_ms}ms", extra={'timing': fields})
+
+
+def track_job(job: str):
+    """Decorator form of track_job_duration()."""
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            with track_job_duration(job):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def reset_metrics():
+    """Clears this process's values, e.g. in a worker forked from a master that has some (gunicorn.conf.py)."""
+    global _last_flush
+    with _lock:
+        _counters.clear()
+        _gauges.clear()
+        _histograms.clear()
+    _last_flush = 0.0
+
+
+# --- Multi-process snapshots ---
+
+def _snapshot() -> dict:
+    def dump(store):
+        return [[name, [list(pair) for pair in labels], value] for (name, labels), value in store.items()]
+    with _lock:
+        return {
+            'pid': os.getpid(),
+            'counters': dump(_counters),
+            'gauges': dump(_gauges),
+            'histograms': dump({key: list(state) for key, state in _histograms.items()}),
+        }
+
+
+def flush_metrics(metrics_dir: str, force: bool = False, interval: float = 5.0):
+    """Writes this process's snapshot to metrics_dir (throttled unless force is set)."""
+    global _last_flush
+    now = time.time()
+    if not metrics_dir or (not force and now - _last_flush < interval):
+        return
+    _last_flush = now
+    os.makedirs(metrics_dir, exist_ok=True)
+    _write_snapshot(os.path.join(metrics_dir, f"metrics_{os.getpid()}.json"), _snapshot())
+
+
+def _read_snapshot(path: str):
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None # Missing, being replaced or corrupt
+
+
+def _write_snapshot(path: str, snapshot: dict):
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(snapshot, f)
+    os.replace(tmp_path, path) # Atomic, so readers never see a half-written file
+
+
+def _merge_into(merged: dict, snapshot: dict, kinds=('counters', 'gauges', 'histograms')):
+    """Adds a snapshot's values to merged ({'counters': {key: value}, ...})."""
+    for kind in kinds:
+        for name, labels, value in snapshot.get(kind, []):
+            key = (name, tuple(tuple(pair) for pair in labels))
+            if kind == 'histograms':
+                current = merged[kind].get(key)
+                merged[kind][key] = value if current is None else [a + b for a, b in zip(current, value)]
+            else:
+                merged[kind][key] = merged[kind].get(key, 0) + value
+
+
+def retire_snapshots(metrics_dir: str, pids) -> int:
+    """
+    Folds the snapshots of exited processes into the archive and removes them. Runs under
+    an exclusive lock on the archive, so concurrent scrapes never count a snapshot twice.
+    Returns the number of snapshots retired.
+    """
+    if not metrics_dir or fcntl is None:
+        return 0
+    os.makedirs(metrics_dir, exist_ok=True)
+    with open(os.path.join(metrics_dir, ARCHIVE_LOCK_FILENAME), 'a') as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            retired = []
+            for pid in pids:
+                path = os.path.join(metrics_dir, f"metrics_{pid}.json")
+                snapshot = _read_snapshot(path)
+                if snapshot is not None:
+                    retired.append((path, snapshot))
+                elif os.path.exists(path):
+                    retired.append((path, {})) # Unreadable: nothing to keep
+            if not retired:
+                return 0
+
+            archive_path = os.path.join(metrics_dir, ARCHIVE_FILENAME)
+            merged = {'counters': {}, 'gauges': {}, 'histograms': {}}
+            _merge_into(merged, _read_snapshot(archive_path) or {}, ('counters', 'histograms'))
+            for _, snapshot in retired:
+                _merge_into(merged, snapshot, ('counters', 'histograms'))
+
+            def dump(store):
+                return [[name, [list(pair) for pair in labels], value] for (name, labels), value in store.items()]
+            _write_snapshot(archive_path, {'pid': None, 'archive': True, 'counters': dump(merged['counters']),
+                                           'gauges': [], 'histograms': dump(merged['histograms'])})
+            for path, _ in retired:
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+            return len(retired)
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def _process_alive(pid: int) -> bool:
+    if pid == os.getpid():
+        return True
+    if os.name == 'nt':
+        return True # os.kill(pid, 0) would send CTRL_C_EVENT on Windows; assume alive
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except OSError:
+        return True # Exists but belongs to someone else
+    return True
+
+
+def _collect(metrics_dir: str = None) -> dict:
+    """Merges the snapshots of every process (or just this one) into one snapshot-shaped dict."""
+    snapshots = []
+    if metrics_dir:
+        flush_metrics(metrics_dir, force=True) # Include this process's latest values
+        snapshots = _load_snapshots(metrics_dir)
+        dead = [snapshot.get('pid') for snapshot in snapshots
+                if not snapshot.get('archive') and not _process_alive(snapshot.get('pid', 0))]
+        if dead and retire_snapshots(metrics_dir, dead):
+            snapshots = _load_snapshots(metrics_dir) # The archive now holds their counters
+    else:
+        snapshots.append(_snapshot())
+
+    merged = {'counters': {}, 'gauges': {}, 'histograms': {}}
+    for snapshot in snapshots:
+        alive = not snapshot.get('archive') and _process_alive(snapshot.get('pid', 0))
+        _merge_into(merged, snapshot, ('counters', 'gauges', 'histograms') if alive else ('counters', 'histograms'))
+    return merged
+
+
+def _load_snapshots(metrics_dir: str) -> list:
+    snapshots = []
+    for path in glob.glob(os.path.join(metrics_dir, 'metrics_*.json')):
+        snapshot = _read_snapshot(path) # None while being replaced or if corrupt; complete on the next scrape
+        if snapshot is not None:
+            snapshots.append(snapshot)
+    return snapshots
+
+
+def _format_labels(labels, extra=()) -> str:
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ""
+    escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, value in pairs)
+    return "{" + ",".join(f'{key}="{value}"' for (key, _), value in zip(pairs, escaped)) + "}"
+
+
+def render_prometheus(metrics_dir: str = None) -> str:
+    """Renders all metrics (summed across processes when metrics_dir is given) in Prometheus text format."""
+    merged = _collect(metrics_dir)
+    lines = []
+    for name, (kind, help_text, buckets) in METRICS.items():
+        store = merged[kind + 's']
+        series = sorted((labels, value) for (metric, labels), value in store.items() if metric == name)
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} {kind}")
+        for labels, value in series:
+            if kind != 'histogram':
+                lines.append(f"{name}{_format_labels(labels)} {value}")
+                continue
+            for bound, count in zip(buckets, value):
+                lines.append(f"{name}_bucket{_format_labels(labels, [('le', bound)])} {count}")
+            lines.append(f"{name}_bucket{_format_labels(labels, [('le', '+Inf')])} {value[len(buckets)]}")
+            lines.append(f"{name}_sum{_format_labels(labels)} {value[-1]}")
+            lines.append(f"{name}_count{_format_labels(labels)} {value[len(buckets)]}")
+    return "\n".join(lines) + "\n"
+
+
+def init_metrics(app):
+    """Records request count and latency per endpoint and flushes snapshots for multi-worker export."""
+    from flask import g, request
+
+    app.config.setdefault('METRICS_ENABLED', True)
+    if not app.config['METRICS_ENABLED']:
+        return
+    metrics_dir = app.config.get('METRICS_DIR')
+    flush_interval = app.config.get('METRICS_FLUSH_INTERVAL', 5.0)
+
+    @app.before_request
+    def _start_request_timer():
+        g._request_started = time.perf_counter()
+
+    @app.after_request
+    def _record_request_metrics(response):
+        started = g.get('_request_started')
+        if started is not None:
+            # Unmatched URLs share one label so random 404 paths can't explode the series count.
+            labels = {'endpoint': request.endpoint or 'unmatched', 'method': request.method}
+            observe('satcms_http_request_duration_seconds', time.perf_counter() - started, labels)
+            inc_counter('satcms_http_requests_total', dict(labels, status=str(response.status_code)))
+        flush_metrics(metrics_dir, interval=flush_interval)
+        return response
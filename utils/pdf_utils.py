@@ -1,9 +1,10 @@
 # utils/pdf_utils.py
 
 import os
+import sys
 from docx import Document
-from docx2pdf import convert
 from flask import current_app
+from utils.metrics import track_job, PhaseTimer # TC/report duration, in-progress and per-phase metrics
 import logging
 from typing import Optional, Union
 from datetime import date, datetime
@@ -11,14 +12,34 @@ from docx.enum.text import WD_ALIGN_PARAGRAPH
 from docx.enum.table import WD_CELL_VERTICAL_ALIGNMENT, WD_ROW_HEIGHT_RULE
 from docx.enum.section import WD_ORIENT
 from docx.shared import Inches, Pt # Added Pt for font size
-from num2words import num2words # For converting numbers to words
 import docx.oxml # For page number field
 from docx.oxml.ns import qn # Import qn for qualified names
-import pythoncom # Import for CoInitialize
+# Re-exported for callers that still import it from here (it needs no document libraries)
+from utils.tc_number import generate_tc_number_for_student
+# docx2pdf (MS Word), pythoncom (Windows COM) and num2words are imported where they are
+# used, so the app, its CLI commands and gunicorn workers start without the Office stack.
 
 # Get the logger for the current module
 logger = logging.getLogger(__name__)
 
+
+def convert_docx_to_pdf(docx_path: str, pdf_path: str):
+    """
+    Converts a .docx file to PDF with docx2pdf (drives MS Word), imported on first use.
+    COM is initialised around the call on Windows, where conversion runs in request threads.
+    """
+    from docx2pdf import convert
+    if sys.platform != 'win32':
+        convert(docx_path, pdf_path)
+        return
+    import pythoncom
+    pythoncom.CoInitialize() # Initialize COM
+    try:
+        convert(docx_path, pdf_path)
+    finally:
+        pythoncom.CoUninitialize() # Uninitialize COM
+
+
 class TCGenerator:
     """Generates Transfer Certificates (TC) as Word (.docx) and PDF documents."""
 
@@ -47,13 +68,19 @@ class TCGenerator:
         """Cleans a string for use in filenames by replacing invalid characters."""
         return str(value).replace('/', '_').replace('\\', '_')
 
-    def generate_tc_files(self, student_data: dict, tc_data: dict) -> tuple[str, str]:
+    @track_job('tc')
+    def generate_tc_files(self, student_data: dict, tc_data: dict, timer: Optional[PhaseTimer] = None,
+                          convert_pdf: bool = True) -> tuple[str, Optional[str]]:
         """
         Generates TC files (.docx and .pdf) from data.
 
         Args:
             student_data (dict): Dictionary containing student information.
             tc_data (dict): Dictionary containing TC specific data.
+            timer (PhaseTimer, optional): Collects the load/replace/save/convert phase times.
+                                          When omitted, the breakdown is logged here; a caller
+                                          passing its own timer (to add further phases) logs it.
+            convert_pdf (bool): Set to False to skip the PDF conversion (pdf_path is then None).
 
         Returns:
             tuple[str, str]: A tuple containing the paths to the generated (docx_path, pdf_path).
@@ -63,22 +90,26 @@ class TCGenerator:
             RuntimeError: For other errors during document generation or conversion.
         """
         docx_path = ""
+        log_timings = timer is None
+        timer = timer or PhaseTimer('tc')
         try:
             # Step 1: Create the Word Document
-            if self.template_path and os.path.exists(self.template_path):
-                doc = Document(self.template_path)
-                section = doc.sections[0]
-                section.page_width = Inches(8.5)
-                section.page_height = Inches(14)
-                # Optionally set margins as above
-            elif self.template_path:
-                logger.error(f"TC template specified but not found: {self.template_path}")
-                raise FileNotFoundError(f"TC template not found at {self.template_path}")
-            else:
-                logger.info("No TC template path provided. A default TC will be created.")
-                doc = self._create_default_tc_template()
+            with timer.phase('load'):
+                if self.template_path and os.path.exists(self.template_path):
+                    doc = Document(self.template_path)
+                    section = doc.sections[0]
+                    section.page_width = Inches(8.5)
+                    section.page_height = Inches(14)
+                    # Optionally set margins as above
+                elif self.template_path:
+                    logger.error(f"TC template specified but not found: {self.template_path}")
+                    raise FileNotFoundError(f"TC template not found at {self.template_path}")
+                else:
+                    logger.info("No TC template path provided. A default TC will be created.")
+                    doc = self._create_default_tc_template()
 
-            self._replace_placeholders(doc, student_data, tc_data)
+            with timer.phase('replace'):
+                self._replace_placeholders(doc, student_data, tc_data)
 
             # Generate a unique and predictable filename
             clean_adm_no = self._get_safe_filename_part(student_data.get('admission_no', ''))
@@ -88,18 +119,20 @@ class TCGenerator:
             docx_path = os.path.join(self.output_path_base, f"{base_filename}.docx")
             pdf_path = os.path.join(self.output_path_base, f"{base_filename}.pdf")
 
-            doc.save(docx_path)
+            with timer.phase('save'):
+                doc.save(docx_path)
             logger.info(f"TC Word document generated successfully: {docx_path}")
 
             # Step 2: Convert Word Document to PDF
-            try:
-                pythoncom.CoInitialize() # Initialize COM
-                convert(docx_path, pdf_path)
-                logger.info(f"TC PDF generated successfully: {pdf_path}")
-            finally:
-                pythoncom.CoUninitialize() # Uninitialize COM
-
+            if not convert_pdf:
+                pdf_path = None
+            else:
+                with timer.phase('convert'):
+                    convert_docx_to_pdf(docx_path, pdf_path)
+                    logger.info(f"TC PDF generated successfully: {pdf_path}")
 
+            if log_timings:
+                timer.log(logger, tc_number=tc_data.get('tc_number'), admission_no=student_data.get('admission_no'))
             return docx_path, pdf_path
 
         except Exception as e:
@@ -170,6 +203,7 @@ class TCGenerator:
             else:
                 return str(date_value) # Fallback
 
+            from num2words import num2words # Only needed for TCs
             day_words = num2words(date_obj.day, to='ordinal').title()
             month_words = date_obj.strftime("%B")
             
@@ -282,30 +316,6 @@ class TCGenerator:
         return doc
 
 
-def generate_tc_number_for_student(student_id: int) -> str:
-    """
-    Generates a unique TC number for the given student.
-    Format: TC/YYYY/XXXX (XXXX is a 4-digit sequential number for that year).
-    """
-    from models.db_pool import db_manager
-    year_str = str(datetime.now().year)
-
-    last_tc_for_year = db_manager.execute_query(
-        "SELECT tc_number FROM transfer_certificates WHERE tc_number LIKE ? ORDER BY tc_number DESC LIMIT 1",
-        (f"TC/{year_str}/%",),
-        fetch_one=True
-    )
-
-    next_serial = 1
-    if last_tc_for_year and last_tc_for_year['tc_number']:
-        try:
-            last_serial_str = last_tc_for_year['tc_number'].split('/')[-1]
-            next_serial = int(last_serial_str) + 1
-        except (IndexError, ValueError):
-            logger.warning(f"Could not parse serial from TC number {last_tc_for_year['tc_number']}. Defaulting to 1.")
-
-    return f"TC/{year_str}/{next_serial:04d}"
-
 class ReportGenerator:
     """Generates various reports (e.g., Admission Register) as Word documents."""
 
@@ -454,6 +464,7 @@ class ReportGenerator:
             tcPr.append(shd)
         shd.set(qn("w:fill"), color_hex)
 
+    @track_job('admission_register')
     def generate_admission_register_pdf(self, course_id: Optional[int] = None, academic_year_id: Optional[int] = None) -> str:
         """
         Generates an Admission Register report as a PDF document.
@@ -491,11 +502,7 @@ class ReportGenerator:
         if course_id:
             # Fetch course name for display if possible
             from models.db_pool import db_manager
-            course_info = db_manager.execute_query(
-                "SELECT course_name, course_code, type FROM courses WHERE id = ?", 
-                (course_id,), 
-                fetch_one=True
-            )
+            course_info = db_manager.courses.get(course_id)
             if course_info:
                 filter_texts.append(f"Course: {course_info['course_name']} ({course_info['course_code']}) - Type: {course_info['type']}")
             else:
@@ -503,7 +510,7 @@ class ReportGenerator:
 
         if academic_year_id:
             from models.db_pool import db_manager
-            ay_info = db_manager.execute_query("SELECT academic_year FROM academic_years WHERE id = ?", (academic_year_id,), fetch_one=True)
+            ay_info = db_manager.academic_years.get(academic_year_id)
             filter_texts.append(f"Academic Year: {ay_info['academic_year']}" if ay_info else f"Academic Year ID: {academic_year_id}")
 
         if filter_texts:
@@ -565,8 +572,7 @@ class ReportGenerator:
             max_rows_per_page = 4 
 
             # Data rows
-            for idx, student_row_data in enumerate(students, 1):
-                student = dict(student_row_data) # Convert sqlite3.Row to dict
+            for idx, student in enumerate(students, 1):
                 row_cells = table.add_row().cells
                 
                 # Check if a page break is needed before this row (idx is 1-based for students)
@@ -662,12 +668,8 @@ class ReportGenerator:
             logger.info(f"Admission Register (DOCX) generated: {docx_filepath}")
 
             # Convert to PDF
-            try:
-                pythoncom.CoInitialize() # Initialize COM
-                convert(docx_filepath, pdf_filepath)
-                logger.info(f"Admission Register (PDF) generated: {pdf_filepath}")
-            finally:
-                pythoncom.CoUninitialize() # Uninitialize COM
+            convert_docx_to_pdf(docx_filepath, pdf_filepath)
+            logger.info(f"Admission Register (PDF) generated: {pdf_filepath}")
             
             # Clean up the DOCX file after successful PDF conversion
             if os.path.exists(docx_filepath):
@@ -679,6 +681,7 @@ class ReportGenerator:
             logger.error(f"Error during Admission Register PDF generation: {e}", exc_info=True)
             raise RuntimeError(f"Failed to generate Admission Register PDF: {e}")
 
+    @track_job('fee_collection_report')
     def generate_fee_collection_report_pdf(self, start_date: Optional[str] = None, end_date: Optional[str] = None,
                                            course_id: Optional[int] = None, academic_year_id: Optional[int] = None) -> str:
         """Generates a Fee Collection report as a PDF document."""
@@ -705,11 +708,7 @@ class ReportGenerator:
         if start_date: filter_texts.append(f"From: {self._format_report_date(start_date)}")
         if end_date: filter_texts.append(f"To: {self._format_report_date(end_date)}")
         if course_id:
-            course_info = db_manager.execute_query(
-                "SELECT course_name, course_code, type FROM courses WHERE id = ?", 
-                (course_id,), 
-                fetch_one=True
-            )
+            course_info = db_manager.courses.get(course_id)
             if course_info: 
                 course_name_val = course_info['course_name'] if 'course_name' in course_info.keys() and course_info['course_name'] else ''
                 course_code_val = course_info['course_code'] if 'course_code' in course_info.keys() and course_info['course_code'] else ''
@@ -717,7 +716,7 @@ class ReportGenerator:
                 filter_texts.append(f"Course: {course_name_val} ({course_code_val}) - Type: {course_type_val}")
 
         if academic_year_id:
-            ay_info = db_manager.execute_query("SELECT academic_year FROM academic_years WHERE id = ?", (academic_year_id,), fetch_one=True)
+            ay_info = db_manager.academic_years.get(academic_year_id)
             if ay_info and 'academic_year' in ay_info.keys() and ay_info['academic_year']:
                 filter_texts.append(f"Academic Year: {ay_info['academic_year']}")
             elif ay_info: # ay_info exists but academic_year might be missing or None
@@ -758,7 +757,6 @@ class ReportGenerator:
                 Inches(2.0)    # Transaction ID
             ]
             for idx, p_data in enumerate(payments, 1):
-                p_data = dict(p_data) # Ensure it's a dict
                 row_cells = table.add_row().cells
                 self._add_text_to_cell(row_cells[0], str(idx))
                 self._add_text_to_cell(row_cells[1], self._format_report_date(p_data.get('payment_date')))
@@ -791,11 +789,7 @@ class ReportGenerator:
 
         try:
             doc.save(docx_filepath)
-            try:
-                pythoncom.CoInitialize()
-                convert(docx_filepath, pdf_filepath)
-            finally:
-                pythoncom.CoUninitialize()
+            convert_docx_to_pdf(docx_filepath, pdf_filepath)
             if os.path.exists(docx_filepath):
                 os.remove(docx_filepath)
             return pdf_filepath
@@ -811,6 +805,7 @@ class ReportGenerator:
     # Consider applying similar try/finally for CoInitialize/CoUninitialize
     # in generate_tc_issued_report_pdf and generate_student_fee_history_pdf
 
+    @track_job('tc_issued_report')
     def generate_tc_issued_report_pdf(self, course_id: Optional[int] = None, 
                                       academic_year_id: Optional[int] = None) -> str:
         """Generates a TC Issued report as a PDF document."""
@@ -831,10 +826,10 @@ class ReportGenerator:
 
         filter_texts = []
         if course_id:
-            course_info = db_manager.execute_query("SELECT course_name FROM courses WHERE id = ?", (course_id,), fetch_one=True)
+            course_info = db_manager.courses.get(course_id)
             if course_info: filter_texts.append(f"Course: {course_info['course_name']}")
         if academic_year_id:
-            ay_info = db_manager.execute_query("SELECT academic_year FROM academic_years WHERE id = ?", (academic_year_id,), fetch_one=True)
+            ay_info = db_manager.academic_years.get(academic_year_id)
             if ay_info: filter_texts.append(f"Academic Year: {ay_info['academic_year']}")
 
         filter_info_str = f"Filters: {'; '.join(filter_texts)}" if filter_texts else None
@@ -869,7 +864,6 @@ class ReportGenerator:
             table.rows[0].header = True
 
             for idx, tc_data in enumerate(tcs_issued, 1):
-                tc_data = dict(tc_data) # Ensure it's a dict
                 row_cells = table.add_row().cells
                 self._add_text_to_cell(row_cells[0], str(idx))
                 self._add_text_to_cell(row_cells[1], tc_data.get('tc_number'))
@@ -890,11 +884,7 @@ class ReportGenerator:
         pdf_filepath = os.path.join(self.output_path_base, f"{base_filename}.pdf")
         try:
             doc.save(docx_filepath)
-            try:
-                pythoncom.CoInitialize()
-                convert(docx_filepath, pdf_filepath)
-            finally:
-                pythoncom.CoUninitialize()
+            convert_docx_to_pdf(docx_filepath, pdf_filepath)
             if os.path.exists(docx_filepath):
                 os.remove(docx_filepath)
             return pdf_filepath
@@ -908,13 +898,14 @@ class ReportGenerator:
         run = p.add_run() # Add a run to apply font size
         run.font.size = size
 
+    @track_job('fee_history')
     def generate_student_fee_history_pdf(self, student_data: dict, payments: list, summary: dict) -> str:
         """
         Generates a Fee History report for a single student as a PDF document.
 
         Args:
             student_data (dict): Dictionary containing student information.
-            payments (list): List of fee payment dictionaries for the student.
+            payments (list): Fee payments of the student (FeeHistoryRecords or dicts).
             summary (dict): Dictionary containing fee summary (total_fee, total_paid, balance_due).
 
         Returns:
@@ -1041,14 +1032,11 @@ class ReportGenerator:
         pdf_filepath = os.path.join(self.output_path_base, f"{base_filename}.pdf")
 
         doc.save(docx_filepath)
-        try:
-            pythoncom.CoInitialize()
-            convert(docx_filepath, pdf_filepath)
-        finally:
-            pythoncom.CoUninitialize() # Ensure COM is uninitialized
+        convert_docx_to_pdf(docx_filepath, pdf_filepath)
         if os.path.exists(docx_filepath): os.remove(docx_filepath)
         return pdf_filepath
 
+    @track_job('fee_summary_report')
     def generate_fee_summary_report_pdf(self, course_id: Optional[int] = None, academic_year_id: Optional[int] = None) -> str:
         """
         Generates a Fee Summary report as a PDF document.
@@ -1061,45 +1049,12 @@ class ReportGenerator:
             str: Path to the generated .pdf report.
         """
         from models.db_pool import db_manager
+        from models.queries import FEE_SUMMARY_REPORT
+        from models.records import FeeSummaryRecord
 
         # Fetch summary data
-        query = """
-        SELECT
-            s.id AS student_id,
-            s.student_name,
-            s.surname,
-            s.admission_no,
-            c.course_name,
-            ay.academic_year,
-            COALESCE(fs.total_fee, 0) AS total_fee,
-            COALESCE(SUM(p.amount_paid), 0) AS total_paid
-        FROM
-            students s
-        JOIN
-            courses c ON s.course_id = c.id
-        JOIN
-            academic_years ay ON s.academic_year_id = ay.id
-        LEFT JOIN
-            fee_structure fs ON s.fee_structure_id = fs.id
-        LEFT JOIN
-            student_fee_payments p ON s.id = p.student_id
-        WHERE 1=1
-        """
-        params = []
-
-        if course_id is not None:
-            query += " AND s.course_id = ?"
-            params.append(course_id)
-        if academic_year_id is not None:
-            query += " AND s.academic_year_id = ?"
-            params.append(academic_year_id)
-
-        query += """ GROUP BY
-            s.id, s.student_name, s.surname, s.admission_no, c.course_name, ay.academic_year, fs.total_fee
-        ORDER BY
-            c.course_name, ay.academic_year, s.student_name, s.surname;
-        """
-        summaries = db_manager.execute_query(query, params, fetch_all=True)
+        query, params = FEE_SUMMARY_REPORT.build(course_id=course_id, academic_year_id=academic_year_id)
+        summaries = db_manager.fetch_records(FeeSummaryRecord, query, params)
         
         # --- Document and Page Setup (similar to other reports) ---
         doc = Document()
@@ -1122,11 +1077,7 @@ class ReportGenerator:
         if course_id:
             # Fetch course name for display if possible
             from models.db_pool import db_manager
-            course_info = db_manager.execute_query(
-                "SELECT course_name, course_code, type FROM courses WHERE id = ?", 
-                (course_id,), 
-                fetch_one=True
-            )
+            course_info = db_manager.courses.get(course_id)
             if course_info:
                 filter_texts.append(f"Course: {course_info['course_name']} ({course_info['course_code']}) - Type: {course_info['type']}")
             else:
@@ -1134,7 +1085,7 @@ class ReportGenerator:
 
         if academic_year_id:
             from models.db_pool import db_manager
-            ay_info = db_manager.execute_query("SELECT academic_year FROM academic_years WHERE id = ?", (academic_year_id,), fetch_one=True)
+            ay_info = db_manager.academic_years.get(academic_year_id)
             filter_texts.append(f"Academic Year: {ay_info['academic_year']}" if ay_info else f"Academic Year ID: {academic_year_id}")
 
         if filter_texts:
@@ -1191,8 +1142,7 @@ class ReportGenerator:
             total_fees_due = 0.0
             total_collected = 0.0
             total_fee_applicable = 0.0
-            for idx, summary_row_data in enumerate(summaries, 1):
-                summary = dict(summary_row_data) # Convert sqlite3.Row to dict
+            for idx, summary in enumerate(summaries, 1):
                 row_cells = table.add_row().cells
                 
                 # Cell 0: S.No
@@ -1246,11 +1196,7 @@ class ReportGenerator:
 
         try:
             doc.save(docx_filepath)
-            try:
-                pythoncom.CoInitialize()
-                convert(docx_filepath, pdf_filepath)
-            finally:
-                pythoncom.CoUninitialize()
+            convert_docx_to_pdf(docx_filepath, pdf_filepath)
             if os.path.exists(docx_filepath):
                 os.remove(docx_filepath)
             return pdf_filepath
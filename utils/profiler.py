@@ -0,0 +1,204 @@
+# utils/profiler.py
+"""
+Opt-in per-request sampling profiler.
+
+A profiled request is sampled from a background thread every PROFILER_INTERVAL_MS:
+the request thread's Python stack is read with sys._current_frames(). The stacks are
+saved under PROFILE_DIR in two formats:
+
+- <id>.speedscope.json: open it at https://www.speedscope.app (flame graph / time order)
+- <id>.folded: collapsed stacks for flamegraph.pl or inferno
+
+A request is profiled when PROFILER_ENABLED is set and either a logged-in admin sends
+the `X-Profile: 1` header, or the request is picked by PROFILER_SAMPLE_RATE (0.0-1.0).
+Profiles can be browsed at /monitoring/profiles.
+"""
+
+import json
+import os
+import random
+import sys
+import threading
+import time
+from datetime import datetime
+from flask import g, request, session
+
+PROFILE_HEADER = 'X-Profile'
+DEFAULT_INTERVAL_MS = 1.0
+DEFAULT_MAX_PROFILES = 50
+
+# The sampler thread only runs when it gets the GIL, so while any profile is active the
+# interpreter's switch interval is lowered to the sampling interval (restored afterwards).
+_switch_lock = threading.Lock()
+_active_profilers = 0
+_saved_switch_interval = None
+
+
+class SamplingProfiler:
+    """Samples one thread's call stack at a fixed interval until stopped."""
+
+    def __init__(self, thread_id: int, interval: float):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.frames = [] # [(name, file, line)]
+        self._frame_index = {}
+        self.samples = [] # [(frame indices root-first, weight in seconds)]
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='request-profiler', daemon=True)
+        self.started_at = self.ended_at = None
+
+    def start(self):
+        global _active_profilers, _saved_switch_interval
+        with _switch_lock:
+            if _active_profilers == 0:
+                _saved_switch_interval = sys.getswitchinterval()
+                sys.setswitchinterval(min(_saved_switch_interval, self.interval))
+            _active_profilers += 1
+        self.started_at = time.perf_counter()
+        self._thread.start()
+
+    def stop(self):
+        global _active_profilers
+        self._stop.set()
+        self._thread.join()
+        self.ended_at = time.perf_counter()
+        with _switch_lock:
+            _active_profilers -= 1
+            if _active_profilers == 0:
+                sys.setswitchinterval(_saved_switch_interval)
+
+    def _frame_id(self, code) -> int:
+        key = (code.co_name, code.co_filename, code.co_firstlineno)
+        index = self._frame_index.get(key)
+        if index is None:
+            index = self._frame_index[key] = len(self.frames)
+            self.frames.append(key)
+        return index
+
+    def _run(self):
+        last = time.perf_counter()
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            now = time.perf_counter()
+            if frame is None:
+                break
+            stack = []
+            while frame is not None:
+                stack.append(self._frame_id(frame.f_code))
+                frame = frame.f_back
+            stack.reverse()
+            self.samples.append((stack, now - last))
+            last = now
+
+    def to_speedscope(self, name: str) -> dict:
+        """Speedscope file format, 'sampled' profile with weights in milliseconds."""
+        return {
+            '$schema': 'https://www.speedscope.app/file-format-schema.json',
+            'name': name,
+            'exporter': 'satcms-profiler',
+            'activeProfileIndex': 0,
+            'shared': {'frames': [{'name': fname, 'file': file, 'line': line} for fname, file, line in self.frames]},
+            'profiles': [{
+                'type': 'sampled',
+                'name': name,
+                'unit': 'milliseconds',
+                'startValue': 0,
+                'endValue': round(sum(weight for _, weight in self.samples) * 1000, 3),
+                'samples': [stack for stack, _ in self.samples],
+                'weights': [round(weight * 1000, 3) for _, weight in self.samples],
+            }],
+        }
+
+    def to_folded(self) -> str:
+        """Collapsed stacks ("a;b;c <microseconds>"), as consumed by flamegraph.pl."""
+        totals = {}
+        for stack, weight in self.samples:
+            key = ";".join(f"{self.frames[i][0]} ({os.path.basename(self.frames[i][1])}:{self.frames[i][2]})" for i in stack)
+            totals[key] = totals.get(key, 0) + weight
+        return "\n".join(f"{stack} {int(weight * 1_000_000)}" for stack, weight in sorted(totals.items())) + "\n"
+
+
+def list_profiles(profile_dir: str) -> list:
+    """Saved profiles, newest first, as dicts read from their metadata files."""
+    if not profile_dir or not os.path.isdir(profile_dir):
+        return []
+    profiles = []
+    for filename in os.listdir(profile_dir):
+        if not filename.endswith('.meta.json'):
+            continue
+        try:
+            with open(os.path.join(profile_dir, filename), 'r', encoding='utf-8') as f:
+                profiles.append(json.load(f))
+        except (OSError, ValueError):
+            continue
+    return sorted(profiles, key=lambda p: p['id'], reverse=True)
+
+
+def _prune(profile_dir: str, keep: int):
+    for old in list_profiles(profile_dir)[keep:]:
+        for suffix in ('.meta.json', '.speedscope.json', '.folded'):
+            try:
+                os.remove(os.path.join(profile_dir, old['id'] + suffix))
+            except OSError:
+                pass
+
+
+def _should_profile(app) -> bool:
+    if not app.config.get('PROFILER_ENABLED'):
+        return False
+    if request.headers.get(PROFILE_HEADER) == '1' and session.get('admin_logged_in'):
+        return True
+    rate = app.config.get('PROFILER_SAMPLE_RATE', 0.0)
+    return rate > 0 and random.random() < rate
+
+
+def init_profiler(app):
+    """Registers the hooks that start/stop the profiler around selected requests."""
+    app.config.setdefault('PROFILER_ENABLED', False)
+    app.config.setdefault('PROFILE_DIR', os.path.join(app.instance_path, 'profiles'))
+
+    @app.before_request
+    def _start_profiler():
+        if request.endpoint == 'static' or not _should_profile(app):
+            return
+        interval = app.config.get('PROFILER_INTERVAL_MS', DEFAULT_INTERVAL_MS) / 1000
+        g._profiler = SamplingProfiler(threading.get_ident(), interval)
+        g._profile_id = f"{datetime.now():%Y%m%d-%H%M%S-%f}-{os.getpid()}"
+        g._profiler.start()
+
+    @app.after_request
+    def _add_profile_header(response):
+        if g.get('_profiler') is not None:
+            response.headers['X-Profile-Id'] = g._profile_id
+            g._profile_status = response.status_code
+        return response
+
+    @app.teardown_request
+    def _save_profile(error=None):
+        profiler = g.pop('_profiler', None)
+        if profiler is None:
+            return
+        profiler.stop()
+        profile_dir = app.config['PROFILE_DIR']
+        profile_id = g._profile_id
+        name = f"{request.method} {request.full_path.rstrip('?')}"
+        try:
+            os.makedirs(profile_dir, exist_ok=True)
+            with open(os.path.join(profile_dir, f"{profile_id}.speedscope.json"), 'w', encoding='utf-8') as f:
+                json.dump(profiler.to_speedscope(name), f)
+            with open(os.path.join(profile_dir, f"{profile_id}.folded"), 'w', encoding='utf-8') as f:
+                f.write(profiler.to_folded())
+            with open(os.path.join(profile_dir, f"{profile_id}.meta.json"), 'w', encoding='utf-8') as f:
+                json.dump({
+                    'id': profile_id,
+                    'request': name,
+                    'endpoint': request.endpoint,
+                    'status': g.get('_profile_status', 500 if error else None),
+                    'duration_ms': round((profiler.ended_at - profiler.started_at) * 1000, 1),
+                    'samples': len(profiler.samples),
+                    'created': datetime.now().isoformat(timespec='seconds'),
+                    'user': session.get('username'),
+                }, f)
+            _prune(profile_dir, app.config.get('PROFILER_MAX_PROFILES', DEFAULT_MAX_PROFILES))
+        except OSError as e:
+            app.logger.warning(f"Could not save request profile {profile_id}: {e}")
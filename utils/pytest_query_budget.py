@@ -0,0 +1,46 @@
+# utils/pytest_query_budget.py
+"""
+pytest plugin enforcing per-endpoint query budgets.
+
+Enable it from a test module or conftest.py with:
+
+    pytest_plugins = ['utils.pytest_query_budget']
+
+and use the `query_budget` fixture around the code under test:
+
+    def test_student_list_queries(client, query_budget):
+        with query_budget(8, per_query=2):
+            client.get('/students/list')
+
+The test fails (listing the offending query fingerprints) if more statements run in
+total than `max_queries`, or any single fingerprint runs more than `per_query` times.
+"""
+
+from contextlib import contextmanager
+import pytest
+from models.query_stats import count_queries
+
+
+def _format_counts(fingerprints) -> str:
+    counts = {}
+    for fingerprint in fingerprints:
+        counts[fingerprint] = counts.get(fingerprint, 0) + 1
+    ordered = sorted(counts.items(), key=lambda item: item[1], reverse=True)
+    return "\n".join(f"  {count:>4} x {fingerprint}" for fingerprint, count in ordered)
+
+
+@pytest.fixture
+def query_budget():
+    """Returns a context manager factory: query_budget(max_queries, per_query=None)."""
+    @contextmanager
+    def budget(max_queries: int, per_query: int = None):
+        with count_queries() as queries:
+            yield queries
+        if len(queries) > max_queries:
+            pytest.fail(f"Query budget exceeded: {len(queries)} queries (budget {max_queries})\n{_format_counts(queries)}")
+        if per_query is not None:
+            repeated = [fp for fp in set(queries) if queries.count(fp) > per_query]
+            if repeated:
+                pytest.fail(f"Query repeated more than {per_query} times (possible N+1):\n"
+                            f"{_format_counts(fp for fp in queries if fp in repeated)}")
+    return budget
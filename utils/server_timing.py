@@ -0,0 +1,76 @@
+# utils/server_timing.py
+"""
+Server-Timing response header, shown in the browser devtools (Network > Timing).
+
+Example:
+    Server-Timing: db;dur=12.4;desc="7 queries", cache;desc="3 hit, 1 miss",
+                   tpl;dur=5.1;desc="Templates", total;dur=24.8;desc="Handler"
+
+- db: time spent in SQL (execute + fetch) and the number of statements (models/query_stats.py)
+- cache: in-memory cache lookups by result (utils/caching.py)
+- tpl: time spent rendering templates, measured with Flask's template signals
+- total: from the first before_request hook to the response
+
+SERVER_TIMING selects who gets the header: 'off', 'admins' (logged-in admins only,
+the production default since it reveals internals) or 'all'.
+"""
+
+import time
+from flask import g, session, before_render_template, template_rendered
+
+from models.query_stats import get_request_query_summary
+from utils.caching import get_cache_lookups
+
+
+def _enabled_for_request(app) -> bool:
+    mode = app.config.get('SERVER_TIMING', 'off')
+    if mode == 'all':
+        return True
+    return mode == 'admins' and bool(session.get('admin_logged_in'))
+
+
+def _template_started(sender, template, context, **extra):
+    g.setdefault('_template_starts', []).append(time.perf_counter())
+
+
+def _template_finished(sender, template, context, **extra):
+    starts = g.get('_template_starts')
+    if not starts:
+        return
+    elapsed_ms = (time.perf_counter() - starts.pop()) * 1000
+    if not starts: # Only count the outermost render, nested ones are included in it
+        g._template_time_ms = g.get('_template_time_ms', 0.0) + elapsed_ms
+
+
+def build_server_timing() -> str:
+    """The Server-Timing header value for the current request."""
+    queries = get_request_query_summary()
+    lookups = get_cache_lookups()
+    noun = 'query' if queries['queries'] == 1 else 'queries'
+    parts = [f'db;dur={queries["db_time_ms"]};desc="{queries["queries"]} {noun}"']
+    if lookups:
+        parts.append('cache;desc="' + ", ".join(f"{count} {result}" for result, count in sorted(lookups.items())) + '"')
+    if '_template_time_ms' in g:
+        parts.append(f'tpl;dur={round(g._template_time_ms, 2)};desc="Templates"')
+    parts.append(f'total;dur={round((time.perf_counter() - g._server_timing_start) * 1000, 2)};desc="Handler"')
+    return ", ".join(parts)
+
+
+def init_server_timing(app):
+    """Registers the hooks that measure each request and add the Server-Timing header."""
+    app.config.setdefault('SERVER_TIMING', 'off')
+    if app.config['SERVER_TIMING'] not in ('admins', 'all'):
+        return
+
+    before_render_template.connect(_template_started, app)
+    template_rendered.connect(_template_finished, app)
+
+    @app.before_request
+    def _start_server_timing():
+        g._server_timing_start = time.perf_counter()
+
+    @app.after_request
+    def _add_server_timing(response):
+        if '_server_timing_start' in g and _enabled_for_request(app):
+            response.headers['Server-Timing'] = build_server_timing()
+        return response
@@ -0,0 +1,205 @@
+# utils/student_search.py
+"""
+In-memory student lookup index for typeahead suggestions (/students/api/typeahead).
+
+Each worker keeps one index over name, surname and admission number:
+- a sorted token list, searched with bisect, for prefix matches ("rav" -> Ravi);
+- trigram postings for matches inside a word or admission number ("bc00" -> 2024BC001).
+
+The index remembers the data versions (db/migrations/0001_data_versions.sql) of the
+tables it was built from (utils/versioned_snapshot.py): students inserted since the last
+refresh are added right away (a copy of the index with the new rows, swapped in); any other
+write rebuilds the index in a background thread while lookups keep using the current one.
+"""
+
+import bisect
+import re
+from array import array
+
+from models.db_pool import db_manager
+from utils.versioned_snapshot import VersionedSnapshot
+
+INDEX_TABLES = ('students', 'transfer_certificates', 'courses', 'academic_years')
+DEFAULT_LIMIT = 10
+MAX_LIMIT = 100
+
+INDEX_QUERY = """
+    SELECT s.id, s.student_name, s.surname, s.admission_no, s.course_id, s.academic_year_id,
+           c.course_name, ay.academic_year, tc.id IS NOT NULL AS has_tc
+    FROM students s
+    JOIN courses c ON s.course_id = c.id
+    JOIN academic_years ay ON s.academic_year_id = ay.id
+    LEFT JOIN transfer_certificates tc ON tc.student_id = s.id
+    WHERE s.id > ?
+    ORDER BY s.id
+"""
+
+_WORD_RE = re.compile(r'[^\w]+', re.UNICODE)
+
+
+def _normalize(text) -> str:
+    return " ".join(_WORD_RE.sub(' ', str(text or '')).lower().split())
+
+
+def _trigrams(text: str) -> set:
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+class _IndexData:
+    """One immutable build of the index; replaced as a whole so readers never see a mix."""
+
+    __slots__ = ('rows', 'haystacks', 'row_tokens', 'tokens', 'token_rows', 'trigram_rows')
+
+    def __init__(self, rows=(), haystacks=(), row_tokens=(), tokens=(), token_rows=array('I'), trigram_rows=None):
+        self.rows = rows # [(id, display name, admission_no, course_id, academic_year_id, course, year, has_tc)]
+        self.haystacks = haystacks # Normalized "name surname admission_no" per row
+        self.row_tokens = row_tokens # Tokens per row, for multi-word queries
+        self.tokens = tokens # Sorted tokens ...
+        self.token_rows = token_rows # ... and the row each one belongs to
+        self.trigram_rows = trigram_rows or {} # {trigram: array of rows}
+
+
+class StudentSearchIndex(VersionedSnapshot):
+    """Prefix and trigram index over all students, kept current as the underlying tables change."""
+
+    TABLES = INDEX_TABLES
+    APPENDED_TABLES = ('students',)
+    NAME = 'student search index'
+
+    def __init__(self):
+        super().__init__()
+        self._data = _IndexData()
+        self.max_id = 0
+
+    def __len__(self):
+        return len(self._data.rows)
+
+    @staticmethod
+    def _entry(record):
+        """(row, haystack, tokens) of one INDEX_QUERY row."""
+        display_name = " ".join(part for part in (record['student_name'], record['surname']) if part)
+        row = (record['id'], display_name, record['admission_no'], record['course_id'],
+               record['academic_year_id'], record['course_name'], record['academic_year'], bool(record['has_tc']))
+        haystack = _normalize(f"{display_name} {record['admission_no']}")
+        return row, haystack, tuple(dict.fromkeys(haystack.split()))
+
+    def _append_new_rows(self, versions: dict):
+        """Adds students inserted since the last refresh."""
+        new_rows = db_manager.execute_query(INDEX_QUERY, (self.max_id,), fetch_all=True)
+        if not self._inserts_only(versions, 'students', len(new_rows)):
+            return None
+        data = self._data
+        # Copies, so lookups running meanwhile keep a consistent index; only the touched postings are copied
+        rows, haystacks, row_tokens = list(data.rows), list(data.haystacks), list(data.row_tokens)
+        tokens, token_rows, trigram_rows = list(data.tokens), array('I', data.token_rows), dict(data.trigram_rows)
+        copied = set()
+        for record in new_rows:
+            index = len(rows)
+            row, haystack, entry_tokens = self._entry(record)
+            rows.append(row)
+            haystacks.append(haystack)
+            row_tokens.append(entry_tokens)
+            for token_text in entry_tokens:
+                position = bisect.bisect_right(tokens, token_text)
+                tokens.insert(position, token_text)
+                token_rows.insert(position, index)
+            for trigram in _trigrams(haystack):
+                if trigram not in copied:
+                    trigram_rows[trigram] = array('I', trigram_rows.get(trigram, ()))
+                    copied.add(trigram)
+                trigram_rows[trigram].append(index)
+        self._data = _IndexData(rows, haystacks, row_tokens, tokens, token_rows, trigram_rows)
+        if new_rows:
+            self.max_id = new_rows[-1]['id']
+        return len(new_rows)
+
+    def _build(self, versions: dict) -> int:
+        rows, haystacks, row_tokens, token_pairs, trigram_rows = [], [], [], [], {}
+        records = db_manager.execute_query(INDEX_QUERY, (0,), fetch_all=True)
+        for record in records:
+            index = len(rows)
+            row, haystack, tokens = self._entry(record)
+            rows.append(row)
+            haystacks.append(haystack)
+            row_tokens.append(tokens)
+            token_pairs.extend((token_text, index) for token_text in tokens)
+            for trigram in _trigrams(haystack):
+                postings = trigram_rows.get(trigram)
+                if postings is None:
+                    postings = trigram_rows[trigram] = array('I')
+                postings.append(index)
+        token_pairs.sort()
+
+        self._data = _IndexData(rows, haystacks, row_tokens, [token_text for token_text, _ in token_pairs],
+                                array('I', (index for _, index in token_pairs)), trigram_rows)
+        self.max_id = records[-1]['id'] if records else 0
+        return len(rows)
+
+    @staticmethod
+    def _prefix_rows(data: _IndexData, prefix: str):
+        tokens, token_rows = data.tokens, data.token_rows
+        position = bisect.bisect_left(tokens, prefix)
+        while position < len(tokens) and tokens[position].startswith(prefix):
+            yield token_rows[position], tokens[position] == prefix
+            position += 1
+
+    def search(self, query: str, limit: int = DEFAULT_LIMIT, course_id: int = None,
+               academic_year_id: int = None, without_tc: bool = False) -> list:
+        """
+        Students matching query, best first: whole-word matches, then word prefixes, then
+        matches inside a word. Every word of the query must match. Returns dicts.
+        """
+        query = _normalize(query)
+        if not query:
+            return []
+        limit = max(1, min(limit, MAX_LIMIT))
+        data = self._data
+        rows, row_tokens, haystacks = data.rows, data.row_tokens, data.haystacks
+        terms = query.split()
+        lead_position = max(range(len(terms)), key=lambda i: len(terms[i])) # Longest word narrows the most
+        lead, others = terms[lead_position], terms[:lead_position] + terms[lead_position + 1:]
+
+        def allowed(index):
+            row = rows[index]
+            return ((course_id is None or row[3] == course_id)
+                    and (academic_year_id is None or row[4] == academic_year_id)
+                    and not (without_tc and row[7]))
+
+        scores = {} # {row index: score}, lower is better
+        for index, exact in self._prefix_rows(data, lead):
+            if not exact and len(scores) >= limit:
+                break # Whole-word matches sort first in the token list; enough prefix matches found
+            if index in scores or not allowed(index):
+                continue
+            if all(any(token.startswith(term) for token in row_tokens[index]) for term in others):
+                scores[index] = 0 if exact else 1
+
+        if len(scores) < limit and len(query) >= 3:
+            candidates = [data.trigram_rows.get(trigram) for trigram in _trigrams(query)]
+            if all(candidates): # A trigram nobody has means no row can contain the query
+                for index in min(candidates, key=len):
+                    if index not in scores and query in haystacks[index] and allowed(index):
+                        scores[index] = 2
+
+        ranked = sorted(scores, key=lambda index: (scores[index], rows[index][1].lower()))[:limit]
+        return [{
+            'id': rows[index][0],
+            'name': rows[index][1],
+            'admission_no': rows[index][2],
+            'course_id': rows[index][3],
+            'academic_year_id': rows[index][4],
+            'course_name': rows[index][5],
+            'academic_year': rows[index][6],
+            'has_tc': rows[index][7],
+        } for index in ranked]
+
+
+student_index = StudentSearchIndex()
+
+
+def search_students(query: str, limit: int = DEFAULT_LIMIT, course_id: int = None,
+                    academic_year_id: int = None, without_tc: bool = False) -> list:
+    """Typeahead lookup against this worker's index (brought up to date first)."""
+    student_index.ensure_current()
+    return student_index.search(query, limit=limit, course_id=course_id,
+                                academic_year_id=academic_year_id, without_tc=without_tc)
@@ -0,0 +1,28 @@
+from models.db_pool import db_manager
+from datetime import datetime
+import logging
+
+logger = logging.getLogger(__name__)
+
+def generate_tc_number_for_student(student_id: int) -> str:
+    """
+    Generates a unique TC number for the given student.
+    Format: TC/YYYY/XXXX (XXXX is a 4-digit sequential number for that year).
+    """
+    year_str = str(datetime.now().year)
+
+    last_tc_for_year = db_manager.execute_query(
+        "SELECT tc_number FROM transfer_certificates WHERE tc_number LIKE ? ORDER BY tc_number DESC LIMIT 1",
+        (f"TC/{year_str}/%",),
+        fetch_one=True
+    )
+
+    next_serial = 1
+    if last_tc_for_year and last_tc_for_year['tc_number']:
+        try:
+            last_serial_str = last_tc_for_year['tc_number'].split('/')[-1]
+            next_serial = int(last_serial_str) + 1
+        except (IndexError, ValueError):
+            logger.warning(f"Could not parse serial from TC number {last_tc_for_year['tc_number']}. Defaulting to 1.")
+
+    return f"TC/{year_str}/{next_serial:04d}"
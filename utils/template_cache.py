@@ -0,0 +1,154 @@
+# utils/template_cache.py
+"""
+Template caching: Jinja fragment caching for heavy template sections, plus a
+persistent bytecode cache and boot-time precompilation of all templates.
+
+Usage in a template:
+
+    {% cache 'course_options:' ~ course_filter, 3600, tags=['courses'] %}
+        ... expensive markup ...
+    {% endcache %}
+
+The rendered markup is stored in the in-memory app cache (utils.caching). Tags that
+name a tracked table (see db/migrations/0001_data_versions.sql) also put that table's data version
+into the key, so a write in any worker makes the fragment miss; every tag can be
+dropped explicitly with utils.caching.invalidate_tags(). Never cache a fragment that
+contains a CSRF token or anything else specific to a single request, and don't wrap
+markup whose data a view already caches (one cached copy per filter is enough).
+
+At most FRAGMENT_CACHE_MAX_ENTRIES fragment keys are kept, least recently used first out,
+and storing a fragment under new data versions drops the copy stored under the old ones.
+
+The bytecode cache stores compiled templates on disk, so a restarted worker loads them
+instead of recompiling every page on its first requests. Jinja checks each entry
+against the template source, so edited templates are recompiled automatically.
+"""
+
+import os
+import threading
+import time
+from collections import OrderedDict
+from jinja2 import nodes, FileSystemBytecodeCache
+from jinja2.ext import Extension
+from flask import current_app
+from utils.caching import clear_cache, get_from_cache, set_in_cache
+
+DEFAULT_FRAGMENT_TIMEOUT = 300 # seconds
+DEFAULT_FRAGMENT_MAX_ENTRIES = 256
+
+# Fragments stored by this worker, least recently used first: {'fragment:key': cache key incl. data versions}
+_fragment_keys = OrderedDict()
+_fragment_keys_lock = threading.Lock()
+
+
+def _remember_fragment(fragment_key: str, cache_key: str):
+    """Records a stored fragment, dropping its copy under older data versions and the least used fragments."""
+    limit = current_app.config.get('FRAGMENT_CACHE_MAX_ENTRIES', DEFAULT_FRAGMENT_MAX_ENTRIES)
+    dropped = []
+    with _fragment_keys_lock:
+        previous = _fragment_keys.pop(fragment_key, None)
+        if previous is not None and previous != cache_key:
+            dropped.append(previous)
+        _fragment_keys[fragment_key] = cache_key
+        while limit > 0 and len(_fragment_keys) > limit:
+            dropped.append(_fragment_keys.popitem(last=False)[1])
+    for key in dropped:
+        clear_cache(key)
+
+
+class FragmentCacheExtension(Extension):
+    """Adds the {% cache key[, timeout][, tags=[...]] %} ... {% endcache %} block."""
+
+    tags = {'cache'}
+
+    def parse(self, parser):
+        lineno = next(parser.stream).lineno
+        key = parser.parse_expression()
+        timeout = nodes.Const(DEFAULT_FRAGMENT_TIMEOUT)
+        cache_tags = nodes.List([])
+
+        if parser.stream.skip_if('comma'):
+            if not self._at_tags_keyword(parser):
+                timeout = parser.parse_expression()
+                parser.stream.skip_if('comma')
+            if self._at_tags_keyword(parser):
+                next(parser.stream) # 'tags'
+                next(parser.stream) # '='
+                cache_tags = parser.parse_expression()
+
+        body = parser.parse_statements(('name:endcache',), drop_needle=True)
+        call = self.call_method('_render_fragment', [key, timeout, cache_tags])
+        return nodes.CallBlock(call, [], [], body).set_lineno(lineno)
+
+    @staticmethod
+    def _at_tags_keyword(parser) -> bool:
+        return parser.stream.current.test('name:tags') and parser.stream.look().test('assign')
+
+    def _render_fragment(self, key, timeout, cache_tags, caller):
+        if not current_app.config.get('FRAGMENT_CACHE_ENABLED', True):
+            return caller()
+
+        from models.db_pool import db_manager # Imported here to avoid a circular import at module load
+        versions = db_manager.get_data_versions()
+        table_tags = [tag for tag in cache_tags if tag in versions]
+        fragment_key = cache_key = f"fragment:{key}"
+        if table_tags:
+            cache_key += ":" + db_manager.data_version_token(table_tags)
+
+        rendered = get_from_cache(cache_key)
+        if rendered is None:
+            rendered = caller()
+            set_in_cache(cache_key, rendered, timeout, tags=cache_tags)
+            _remember_fragment(fragment_key, cache_key)
+        else:
+            with _fragment_keys_lock:
+                if fragment_key in _fragment_keys:
+                    _fragment_keys.move_to_end(fragment_key)
+        return rendered
+
+
+def init_template_cache(app):
+    """Attaches the on-disk Jinja bytecode cache configured by JINJA_BYTECODE_CACHE_DIR (if any)."""
+    cache_dir = app.config.get('JINJA_BYTECODE_CACHE_DIR')
+    if not cache_dir:
+        return
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+        app.jinja_env.bytecode_cache = FileSystemBytecodeCache(cache_dir, '%s.jinja.cache')
+    except OSError as e:
+        app.logger.warning(f"Jinja bytecode cache disabled, cannot use {cache_dir}: {e}")
+
+
+def warm_templates(app, report_slowest: int = 5) -> dict:
+    """
+    Compiles every HTML template once so the first real requests don't pay for it.
+
+    Loading goes through the bytecode cache, so after the first boot this mostly reads
+    compiled code from disk. Logs a timing report and returns it as a dict.
+    """
+    started = time.perf_counter()
+    timings = []
+    failed = []
+    for name in app.jinja_env.list_templates(filter_func=lambda n: n.endswith('.html')):
+        template_started = time.perf_counter()
+        try:
+            app.jinja_env.get_template(name)
+        except Exception as e: # A broken template shouldn't stop the app from booting
+            failed.append(name)
+            app.logger.warning(f"Template warm-up failed for {name}: {e}")
+            continue
+        timings.append((name, (time.perf_counter() - template_started) * 1000))
+
+    report = {
+        'templates': len(timings),
+        'failed': failed,
+        'total_ms': round((time.perf_counter() - started) * 1000, 1),
+        'slowest': [(name, round(ms, 1)) for name, ms in sorted(timings, key=lambda t: t[1], reverse=True)[:report_slowest]],
+        'bytecode_cache': app.jinja_env.bytecode_cache is not None,
+    }
+    slowest = ", ".join(f"{name} {ms}ms" for name, ms in report['slowest'])
+    app.logger.info(
+        f"Template warm-up: {report['templates']} templates in {report['total_ms']}ms "
+        f"(bytecode cache {'on' if report['bytecode_cache'] else 'off'}, {len(failed)} failed). Slowest: {slowest}"
+    )
+    return report
@@ -0,0 +1,128 @@
+# utils/versioned_snapshot.py
+"""
+Base class for the per-worker in-memory snapshots of database tables: the typeahead
+index (utils/student_search.py), the duplicate index (utils/duplicate_detection.py) and
+the fee analytics columns (utils/fee_analytics.py).
+
+A snapshot remembers the data versions (db/migrations/0001_data_versions.sql) of the
+tables it was built from and ensure_current() compares them with the current ones (read
+once per request):
+- when only tables listed in APPENDED_TABLES changed, the subclass may append the rows
+  inserted since the last refresh (_append_new_rows) without a full build;
+- any other write rebuilds the snapshot (_build) in a background thread while requests
+  keep using the current one. Only the very first build blocks.
+
+Subclasses set TABLES, APPENDED_TABLES and NAME and implement _append_new_rows() and
+_build(); the lock, the hand-off to the background thread and the version bookkeeping
+live here.
+"""
+
+import threading
+import time
+
+from flask import current_app
+
+from models.db_pool import db_manager
+
+
+class VersionedSnapshot:
+    """An in-memory snapshot of TABLES, refreshed as their data versions change."""
+
+    TABLES = () # Tables the snapshot is built from
+    APPENDED_TABLES = () # Tables whose inserts _append_new_rows() can apply without a rebuild
+    NAME = 'snapshot' # Used in the rebuild thread's name and in log messages
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.versions = None # {table: data version} the snapshot reflects
+        self.version_token = None # The same, as db_manager.data_version_token(TABLES)
+        self.built_at = None
+        self.last_refresh = None # ('rebuild' | 'append', rows, ms)
+
+    def is_current(self) -> bool:
+        """True if the snapshot reflects the data versions this request sees."""
+        return self.version_token == db_manager.data_version_token(self.TABLES)
+
+    def ensure_current(self):
+        """
+        Brings the snapshot up to the current data versions: inserts into APPENDED_TABLES
+        are applied right away; after any other write the snapshot is rebuilt in a background
+        thread while requests use the current one (only the very first build blocks).
+        """
+        if self.is_current():
+            return
+        if not self._lock.acquire(blocking=self.versions is None):
+            return # Another request is refreshing; the snapshot is at most a few writes behind meanwhile
+        handed_off = False
+        try:
+            versions = self._current_versions()
+            if versions != self.versions and not self._append(versions):
+                if self.versions is None:
+                    self._rebuild(versions)
+                else:
+                    threading.Thread(target=self._rebuild_in_background, args=(current_app._get_current_object(),),
+                                     name=f"{self.NAME.replace(' ', '-')}-rebuild", daemon=True).start()
+                    handed_off = True # The thread releases the lock
+        finally:
+            if not handed_off:
+                self._lock.release()
+
+    def _current_versions(self) -> dict:
+        # Read fresh (not the per-request copy): an insert landing between this and the row
+        # queries only makes the counts disagree (see _inserts_only), which falls back to a rebuild
+        rows = db_manager.execute_query(
+            f"SELECT table_name, version FROM data_versions WHERE table_name IN ({', '.join('?' * len(self.TABLES))})",
+            self.TABLES, fetch_all=True)
+        versions = dict.fromkeys(self.TABLES, 0)
+        versions.update((row['table_name'], row['version']) for row in rows)
+        return versions
+
+    def _set_versions(self, versions: dict):
+        self.versions = versions
+        self.version_token = ".".join(f"{table}:{versions[table]}" for table in sorted(versions))
+
+    def _inserts_only(self, versions: dict, table: str, new_rows: int) -> bool:
+        """True if every write to table since the last refresh was one of the new_rows inserts."""
+        return new_rows == versions[table] - self.versions[table] # Each insert, update and delete bumps it once
+
+    def _append(self, versions: dict) -> bool:
+        if self.versions is None or any(versions[table] != self.versions[table] for table in self.TABLES
+                                        if table not in self.APPENDED_TABLES):
+            return False
+        started = time.perf_counter()
+        appended = self._append_new_rows(versions)
+        if appended is None:
+            return False
+        self._set_versions(versions)
+        self.last_refresh = ('append', appended, round((time.perf_counter() - started) * 1000, 1))
+        return True
+
+    def _rebuild(self, versions: dict):
+        started = time.perf_counter()
+        rows = self._build(versions)
+        self._set_versions(versions)
+        self.built_at = time.time()
+        self.last_refresh = ('rebuild', rows, round((time.perf_counter() - started) * 1000, 1))
+
+    def _rebuild_in_background(self, app):
+        try:
+            with app.app_context():
+                self._rebuild(self._current_versions())
+        except Exception as e:
+            app.logger.error(f"{self.NAME.capitalize()} rebuild failed: {e}", exc_info=True)
+        finally:
+            self._lock.release()
+
+    # --- Implemented by subclasses ---
+
+    def _append_new_rows(self, versions: dict):
+        """
+        Applies the rows inserted into APPENDED_TABLES since the last refresh and returns how
+        many were applied, or None if other writes happened too (use _inserts_only()); the
+        snapshot must be left unchanged then.
+        """
+        return None
+
+    def _build(self, versions: dict) -> int:
+        """Builds the snapshot from scratch, swapping it in at the end; returns the number of rows."""
+        raise NotImplementedError
@@ -1,13 +1,24 @@
 from app import create_app
 import socket
+import sys
 
 app = create_app()
 
+def _local_ip():
+    """This machine's LAN address, from the route to an outside address (a UDP connect sends nothing and needs no DNS)."""
+    try:
+        with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as probe:
+            probe.connect(('10.255.255.255', 1))
+            return probe.getsockname()[0]
+    except OSError:
+        return '127.0.0.1'
+
 def print_server_info():
-    hostname = socket.gethostname()
-    local_ip = socket.gethostbyname(hostname)
+    local_ip = _local_ip()
     print(f"Serving on:")
     print(f"Local:   http://127.0.0.1:8000")
     print(f"Network: http://{local_ip}:8000")
 
-print_server_info()
+# For waitress-serve (create_shortcut.bat); gunicorn logs its own bind address (gunicorn.conf.py)
+if 'gunicorn' not in sys.modules:
+    print_server_info()